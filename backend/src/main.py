@@ -6,6 +6,10 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 from flask import Flask, send_from_directory
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
+from flask_migrate import Migrate
+from sqlalchemy import inspect
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
 from src.models import db
 from src.routes.user import user_bp
 from src.routes.auth import auth_bp
@@ -19,6 +23,8 @@ from src.routes.reports import reports_bp
 from src.routes.print_export import print_export_bp
 from src.routes.dynamic_calculations import dynamic_calculations_bp
 from src.routes.dynamic_print_export import dynamic_print_export_bp
+from src.routes.commissions import commissions_bp
+from src.routes.periods import periods_bp
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
@@ -42,20 +48,61 @@ app.register_blueprint(reports_bp, url_prefix='/api/reports')
 app.register_blueprint(print_export_bp, url_prefix='/api/print_export')
 app.register_blueprint(dynamic_calculations_bp, url_prefix='/api/dynamic')
 app.register_blueprint(dynamic_print_export_bp, url_prefix='/api/print')
+app.register_blueprint(commissions_bp, url_prefix='/api/commissions')
+app.register_blueprint(periods_bp, url_prefix='/api/periods')
 
 # Database configuration (MySQL default; can be overridden by env DATABASE_URL)
 default_mysql_url = 'mysql+pymysql://acc_user:acc_pass@db:3306/acc_db'
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', default_mysql_url)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
+migrate = Migrate(app, db, directory=os.path.join(os.path.dirname(__file__), 'migrations'))
+
+def running_db_cli():
+    """True under `flask db ...`, where Alembic owns the schema changes"""
+    return os.path.basename(sys.argv[0]) in ('flask', '__main__.py') and 'db' in sys.argv[1:]
+
+def prepare_database():
+    """
+    Create an empty database from the models and stamp it at the migration head; an existing
+    database must already be upgraded (`flask db upgrade`, run by the image before gunicorn)
+    """
+    script = ScriptDirectory.from_config(migrate.get_config())
+    if not inspect(db.engine).get_table_names():
+        db.create_all()
+        with db.engine.begin() as connection:
+            MigrationContext.configure(connection).stamp(script, 'head')
+    elif running_db_cli():
+        return
+    else:
+        with db.engine.connect() as connection:
+            current = MigrationContext.configure(connection).get_current_revision()
+        if current != script.get_current_head():
+            raise RuntimeError(
+                f"Database schema is at revision {current}, expected {script.get_current_head()}: "
+                "run `flask db upgrade` before starting the app"
+            )
 
-with app.app_context():
-    db.create_all()
-    
     # Initialize default data
     from src.services.init_service import initialize_default_data
     initialize_default_data()
 
+with app.app_context():
+    prepare_database()
+
+# Periodic jobs: overdue rent and arrears hourly; rental schedules, unit statuses and recurring expenses daily
+from src.services.scheduler import Scheduler
+from src.services.rental_service import RentalService
+from src.services.occupancy_service import OccupancyService
+from src.services.recurring_expense_service import RecurringExpenseService
+scheduler = Scheduler(app)
+scheduler.add_job('rental_overdue', RentalService.run_overdue_job, interval_seconds=3600)
+scheduler.add_job('rental_schedules', RentalService.generate_missing, interval_seconds=86400)
+scheduler.add_job('unit_status', OccupancyService.run_status_job, interval_seconds=86400)
+scheduler.add_job('recurring_expenses', RecurringExpenseService.run_posting_job, interval_seconds=86400)
+if Scheduler.enabled(app):
+    scheduler.start()
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
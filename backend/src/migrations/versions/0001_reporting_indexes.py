@@ -0,0 +1,36 @@
+"""Add indexes for report date ranges and cashier reference lookups
+
+Revision ID: 0001_reporting_indexes
+Revises: 
+Create Date: 2026-10-19 09:00:00
+
+"""
+from src.utils.migration_utils import create_index_if_missing, drop_index_if_exists
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_reporting_indexes'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_sales_sale_date', 'sales', ['sale_date']),
+    ('ix_expenses_expense_date', 'expenses', ['expense_date']),
+    ('ix_expenses_category_date', 'expenses', ['category_id', 'expense_date']),
+    ('ix_rental_payments_payment_date', 'rental_payments', ['payment_date']),
+    ('ix_finishing_work_expenses_expense_date', 'finishing_work_expenses', ['expense_date']),
+    ('ix_cashier_transactions_date', 'cashier_transactions', ['transaction_date']),
+    ('ix_cashier_transactions_type_date', 'cashier_transactions', ['transaction_type', 'transaction_date']),
+    ('ix_cashier_transactions_reference', 'cashier_transactions', ['reference_id', 'transaction_type']),
+]
+
+
+def upgrade():
+    for index_name, table_name, columns in INDEXES:
+        create_index_if_missing(index_name, table_name, columns)
+
+
+def downgrade():
+    for index_name, table_name, _ in reversed(INDEXES):
+        drop_index_if_exists(index_name, table_name)
@@ -0,0 +1,24 @@
+"""Add covering index for cashier balance rollups
+
+Revision ID: 0002_cashier_rollup_index
+Revises: 0001_reporting_indexes
+Create Date: 2026-10-19 10:00:00
+
+"""
+from src.utils.migration_utils import create_index_if_missing, drop_index_if_exists
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_cashier_rollup_index'
+down_revision = '0001_reporting_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    create_index_if_missing('ix_cashier_transactions_rollup', 'cashier_transactions',
+                            ['transaction_date', 'transaction_type', 'amount'])
+
+
+def downgrade():
+    drop_index_if_exists('ix_cashier_transactions_rollup', 'cashier_transactions')
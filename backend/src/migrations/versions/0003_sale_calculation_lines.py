@@ -0,0 +1,148 @@
+"""Normalize sale calculation breakdowns into sale_calculation_lines
+
+Revision ID: 0003_sale_calculation_lines
+Revises: 0002_cashier_rollup_index
+Create Date: 2026-10-19 11:00:00
+
+"""
+import json
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+from src.utils.breakdown_codec import pack_breakdown, unpack_breakdown
+from src.utils.migration_utils import (
+    has_table, has_column, create_index_if_missing, add_column_if_missing, drop_column_if_exists
+)
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_sale_calculation_lines'
+down_revision = '0002_cashier_rollup_index'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500
+
+sales = sa.table(
+    'sales',
+    sa.column('id', sa.Integer),
+    sa.column('calculation_breakdown', sa.Text),
+    sa.column('calculation_breakdown_archive', sa.LargeBinary),
+)
+
+sale_calculation_lines = sa.table(
+    'sale_calculation_lines',
+    sa.column('sale_id', sa.Integer),
+    sa.column('line_index', sa.Integer),
+    sa.column('rule_id', sa.Integer),
+    sa.column('rule_type', sa.String),
+    sa.column('calculation_type', sa.String),
+    sa.column('value', sa.Numeric(10, 4)),
+    sa.column('base_amount', sa.Numeric(15, 2)),
+    sa.column('amount', sa.Numeric(15, 2)),
+    sa.column('created_at', sa.DateTime),
+    sa.column('updated_at', sa.DateTime),
+)
+
+
+def _breakdown_lines(sale_id, breakdown, now):
+    return [
+        {
+            'sale_id': sale_id,
+            'line_index': index,
+            'rule_id': rule.get('rule_id'),
+            'rule_type': rule['rule_type'],
+            'calculation_type': rule['calculation_type'],
+            'value': rule['value'],
+            'base_amount': rule['base_amount'],
+            'amount': rule['calculated_amount'],
+            'created_at': now,
+            'updated_at': now,
+        }
+        for index, rule in enumerate(breakdown.get('applied_rules', []))
+    ]
+
+
+def upgrade():
+    add_column_if_missing('sales', sa.Column('calculation_breakdown_archive', sa.LargeBinary))
+
+    if not has_table('sale_calculation_lines'):
+        op.create_table(
+            'sale_calculation_lines',
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('sale_id', sa.Integer, sa.ForeignKey('sales.id'), nullable=False),
+            sa.Column('line_index', sa.Integer, nullable=False),
+            sa.Column('rule_id', sa.Integer),
+            sa.Column('rule_type', sa.String(50), nullable=False),
+            sa.Column('calculation_type', sa.String(50), nullable=False),
+            sa.Column('value', sa.Numeric(10, 4), nullable=False),
+            sa.Column('base_amount', sa.Numeric(15, 2), nullable=False),
+            sa.Column('amount', sa.Numeric(15, 2), nullable=False),
+            sa.Column('created_at', sa.DateTime, nullable=False),
+            sa.Column('updated_at', sa.DateTime, nullable=False),
+        )
+    elif not has_column('sale_calculation_lines', 'rule_type'):
+        # Created by an earlier create_all() in its final shape; 0004 moves these columns into snapshots
+        with op.batch_alter_table('sale_calculation_lines') as batch_op:
+            batch_op.add_column(sa.Column('rule_type', sa.String(50), nullable=False, server_default=''))
+            batch_op.add_column(sa.Column('calculation_type', sa.String(50), nullable=False, server_default=''))
+            batch_op.add_column(sa.Column('value', sa.Numeric(10, 4), nullable=False, server_default='0'))
+    create_index_if_missing('ix_sale_calculation_lines_sale', 'sale_calculation_lines', ['sale_id', 'line_index'])
+
+    # Convert legacy JSON breakdowns in id order, one batch per round trip
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(sales.c.id, sales.c.calculation_breakdown)
+            .where(sales.c.id > last_id, sales.c.calculation_breakdown.isnot(None))
+            .order_by(sales.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        now = datetime.utcnow()
+        lines = []
+        archives = []
+        for sale_id, text in rows:
+            try:
+                breakdown = json.loads(text)
+            except ValueError:
+                continue
+            lines.extend(_breakdown_lines(sale_id, breakdown, now))
+            archives.append({'sale_id': sale_id, 'archive': pack_breakdown(breakdown)})
+        if lines:
+            connection.execute(sale_calculation_lines.insert(), lines)
+        if archives:
+            connection.execute(
+                sales.update()
+                .where(sales.c.id == sa.bindparam('sale_id'))
+                .values(calculation_breakdown=None, calculation_breakdown_archive=sa.bindparam('archive')),
+                archives
+            )
+        last_id = rows[-1][0]
+
+
+def downgrade():
+    # Restore the JSON text from the archive before dropping the normalized storage
+    if has_column('sales', 'calculation_breakdown_archive'):
+        connection = op.get_bind()
+        rows = connection.execute(
+            sa.select(sales.c.id, sales.c.calculation_breakdown_archive)
+            .where(sales.c.calculation_breakdown_archive.isnot(None))
+        ).all()
+        restored = [
+            {'sale_id': sale_id,
+             'text': json.dumps(unpack_breakdown(archive), ensure_ascii=False, indent=2)}
+            for sale_id, archive in rows
+        ]
+        if restored:
+            connection.execute(
+                sales.update()
+                .where(sales.c.id == sa.bindparam('sale_id'))
+                .values(calculation_breakdown=sa.bindparam('text')),
+                restored
+            )
+    if has_table('sale_calculation_lines'):
+        op.drop_table('sale_calculation_lines')
+    drop_column_if_exists('sales', 'calculation_breakdown_archive')
@@ -0,0 +1,218 @@
+"""Reference immutable calculation rule set snapshots from sales
+
+Revision ID: 0004_calculation_rule_sets
+Revises: 0003_sale_calculation_lines
+Create Date: 2026-10-19 12:00:00
+
+"""
+import hashlib
+import json
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+from src.utils.breakdown_codec import unpack_breakdown
+from src.utils.migration_utils import has_table, has_column, add_column_if_missing, drop_column_if_exists
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_calculation_rule_sets'
+down_revision = '0003_sale_calculation_lines'
+branch_labels = None
+depends_on = None
+
+LINE_RULE_COLUMNS = ['rule_type', 'calculation_type', 'value']
+BATCH_SIZE = 500
+RULE_SET_FK = 'fk_sales_rule_set_id'
+
+sales = sa.table(
+    'sales',
+    sa.column('id', sa.Integer),
+    sa.column('rule_set_id', sa.Integer),
+    sa.column('calculation_breakdown_archive', sa.LargeBinary),
+)
+
+calculation_rule_sets = sa.table(
+    'calculation_rule_sets',
+    sa.column('id', sa.Integer),
+    sa.column('content_hash', sa.String),
+    sa.column('applies_to', sa.String),
+    sa.column('rules_json', sa.Text),
+    sa.column('created_at', sa.DateTime),
+    sa.column('updated_at', sa.DateTime),
+)
+
+calculation_rules = sa.table(
+    'calculation_rules',
+    sa.column('id', sa.Integer),
+    sa.column('name_ar', sa.String),
+    sa.column('name_en', sa.String),
+)
+
+sale_calculation_lines = sa.table(
+    'sale_calculation_lines',
+    sa.column('sale_id', sa.Integer),
+    sa.column('line_index', sa.Integer),
+    sa.column('rule_id', sa.Integer),
+    sa.column('rule_type', sa.String),
+    sa.column('calculation_type', sa.String),
+    sa.column('value', sa.Numeric(10, 4)),
+)
+
+
+def _snapshot_id(connection, rules, known_ids):
+    """Id of the snapshot holding these rule entries, inserting it when new
+
+    The JSON and hash match CalculationRuleSet.canonical_json/hash_content as of this revision.
+    """
+    rules_json = json.dumps(rules, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    content_hash = hashlib.sha256(f"sales\n{rules_json}".encode('utf-8')).hexdigest()
+    if content_hash not in known_ids:
+        existing = connection.execute(
+            sa.select(calculation_rule_sets.c.id).where(calculation_rule_sets.c.content_hash == content_hash)
+        ).scalar()
+        if existing is None:
+            now = datetime.utcnow()
+            connection.execute(calculation_rule_sets.insert().values(
+                content_hash=content_hash, applies_to='sales', rules_json=rules_json,
+                created_at=now, updated_at=now
+            ))
+            existing = connection.execute(
+                sa.select(calculation_rule_sets.c.id).where(calculation_rule_sets.c.content_hash == content_hash)
+            ).scalar()
+        known_ids[content_hash] = existing
+    return known_ids[content_hash]
+
+
+def _sale_rules(lines, archive, rule_names):
+    """Snapshot rule entries for one sale's lines; names come from the archived breakdown, or from
+    the current rule for lines written after migration 0003"""
+    archived_names = {}
+    if archive:
+        archived_names = {
+            rule.get('rule_id'): (rule.get('rule_name_ar'), rule.get('rule_name_en'))
+            for rule in unpack_breakdown(archive).get('applied_rules', [])
+        }
+    rules = []
+    for line in lines:
+        name_ar, name_en = archived_names.get(line['rule_id']) or rule_names.get(line['rule_id'], (None, None))
+        rules.append({
+            'id': line['rule_id'],
+            'name_ar': name_ar,
+            'name_en': name_en,
+            'rule_type': line['rule_type'],
+            'calculation_type': line['calculation_type'],
+            'value': float(line['value']),
+            'unit_type_filter': [],
+            'order_index': line['line_index'],
+        })
+    return rules
+
+
+def upgrade():
+    if not has_table('calculation_rule_sets'):
+        op.create_table(
+            'calculation_rule_sets',
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('content_hash', sa.String(64), nullable=False, unique=True),
+            sa.Column('applies_to', sa.String(100), nullable=False),
+            sa.Column('rules_json', sa.Text, nullable=False),
+            sa.Column('created_at', sa.DateTime, nullable=False),
+            sa.Column('updated_at', sa.DateTime, nullable=False),
+        )
+    add_column_if_missing('sales', sa.Column(
+        'rule_set_id', sa.Integer, sa.ForeignKey('calculation_rule_sets.id', name=RULE_SET_FK)
+    ))
+
+    if has_column('sale_calculation_lines', 'rule_type'):
+        # Freeze the rules each existing sale was calculated with into snapshots, in id order,
+        # one batch of sales and their lines per round trip
+        connection = op.get_bind()
+        rule_names = {
+            rule_id: (name_ar, name_en)
+            for rule_id, name_ar, name_en in connection.execute(sa.select(
+                calculation_rules.c.id, calculation_rules.c.name_ar, calculation_rules.c.name_en
+            ))
+        }
+        known_ids = {}
+        last_id = 0
+        while True:
+            rows = connection.execute(
+                sa.select(sales.c.id, sales.c.calculation_breakdown_archive)
+                .where(sales.c.id > last_id, sales.c.rule_set_id.is_(None))
+                .order_by(sales.c.id)
+                .limit(BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            lines_by_sale = {}
+            for line in connection.execute(
+                sa.select(sale_calculation_lines)
+                .where(sale_calculation_lines.c.sale_id.in_([sale_id for sale_id, _ in rows]))
+                .order_by(sale_calculation_lines.c.sale_id, sale_calculation_lines.c.line_index)
+            ).mappings():
+                lines_by_sale.setdefault(line['sale_id'], []).append(line)
+
+            updates = [
+                {'sale_id': sale_id,
+                 'rule_set': _snapshot_id(connection, _sale_rules(lines_by_sale[sale_id], archive, rule_names),
+                                          known_ids)}
+                for sale_id, archive in rows if sale_id in lines_by_sale
+            ]
+            if updates:
+                connection.execute(
+                    sales.update().where(sales.c.id == sa.bindparam('sale_id'))
+                    .values(rule_set_id=sa.bindparam('rule_set')),
+                    updates
+                )
+            last_id = rows[-1][0]
+
+        for column_name in LINE_RULE_COLUMNS:
+            drop_column_if_exists('sale_calculation_lines', column_name)
+
+
+def downgrade():
+    if not has_column('sale_calculation_lines', 'rule_type'):
+        with op.batch_alter_table('sale_calculation_lines') as batch_op:
+            batch_op.add_column(sa.Column('rule_type', sa.String(50), nullable=False, server_default=''))
+            batch_op.add_column(sa.Column('calculation_type', sa.String(50), nullable=False, server_default=''))
+            batch_op.add_column(sa.Column('value', sa.Numeric(10, 4), nullable=False, server_default='0'))
+
+        # Copy the rule fields back from each sale's snapshot
+        connection = op.get_bind()
+        snapshots = {
+            rule_set_id: {rule['id']: rule for rule in json.loads(rules_json)}
+            for rule_set_id, rules_json in connection.execute(
+                sa.select(calculation_rule_sets.c.id, calculation_rule_sets.c.rules_json)
+            )
+        }
+        lines = sa.table('sale_calculation_lines', sa.column('id', sa.Integer), sa.column('sale_id', sa.Integer),
+                         sa.column('rule_id', sa.Integer), *[sa.column(name) for name in LINE_RULE_COLUMNS])
+        updates = []
+        for line_id, rule_id, rule_set_id in connection.execute(
+            sa.select(lines.c.id, lines.c.rule_id, sales.c.rule_set_id)
+            .join(sales, sales.c.id == lines.c.sale_id)
+            .where(sales.c.rule_set_id.isnot(None))
+        ):
+            rule = snapshots.get(rule_set_id, {}).get(rule_id)
+            if rule:
+                updates.append({'line_id': line_id, 'rule_type': rule['rule_type'],
+                                'calculation_type': rule['calculation_type'], 'rule_value': rule['value']})
+        if updates:
+            connection.execute(
+                lines.update().where(lines.c.id == sa.bindparam('line_id')).values(
+                    rule_type=sa.bindparam('rule_type'), calculation_type=sa.bindparam('calculation_type'),
+                    value=sa.bindparam('rule_value')
+                ),
+                updates
+            )
+
+    if has_column('sales', 'rule_set_id'):
+        # MySQL refuses to drop a column its foreign key still uses
+        foreign_keys = [fk['name'] for fk in sa.inspect(op.get_bind()).get_foreign_keys('sales')
+                        if fk['constrained_columns'] == ['rule_set_id'] and fk['name']]
+        with op.batch_alter_table('sales') as batch_op:
+            for name in foreign_keys:
+                batch_op.drop_constraint(name, type_='foreignkey')
+            batch_op.drop_column('rule_set_id')
+    if has_table('calculation_rule_sets'):
+        op.drop_table('calculation_rule_sets')
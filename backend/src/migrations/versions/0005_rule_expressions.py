@@ -0,0 +1,30 @@
+"""Add rule codes and expressions to calculation rules
+
+Revision ID: 0005_rule_expressions
+Revises: 0004_calculation_rule_sets
+Create Date: 2026-10-19 13:00:00
+
+"""
+import sqlalchemy as sa
+from src.utils.migration_utils import (
+    add_column_if_missing, drop_column_if_exists, create_index_if_missing, drop_index_if_exists
+)
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_rule_expressions'
+down_revision = '0004_calculation_rule_sets'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    add_column_if_missing('calculation_rules', sa.Column('code', sa.String(100)))
+    add_column_if_missing('calculation_rules', sa.Column('expression', sa.Text))
+    create_index_if_missing('ix_calculation_rules_code', 'calculation_rules', ['code'], unique=True)
+
+
+def downgrade():
+    drop_index_if_exists('ix_calculation_rules_code', 'calculation_rules')
+    drop_column_if_exists('calculation_rules', 'expression')
+    drop_column_if_exists('calculation_rules', 'code')
@@ -0,0 +1,150 @@
+"""Add commission accruals and settlement runs
+
+Revision ID: 0006_commission_accruals
+Revises: 0005_rule_expressions
+Create Date: 2026-10-19 14:00:00
+
+"""
+from datetime import date, datetime
+from alembic import op
+import sqlalchemy as sa
+from src.utils.migration_utils import has_table, create_index_if_missing
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_commission_accruals'
+down_revision = '0005_rule_expressions'
+branch_labels = None
+depends_on = None
+
+BACKFILL_CHUNK_SIZE = 1000
+
+sales = sa.table(
+    'sales',
+    sa.column('id', sa.Integer),
+    sa.column('sale_date', sa.Date),
+    sa.column('salesperson_id', sa.Integer),
+    sa.column('salesperson_commission', sa.Numeric(15, 2)),
+    sa.column('sales_manager_id', sa.Integer),
+    sa.column('sales_manager_commission', sa.Numeric(15, 2)),
+)
+
+commission_accruals = sa.table(
+    'commission_accruals',
+    sa.column('id', sa.Integer),
+    sa.column('sale_id', sa.Integer),
+    sa.column('user_id', sa.Integer),
+    sa.column('role', sa.String),
+    sa.column('amount', sa.Numeric(15, 2)),
+    sa.column('accrual_date', sa.Date),
+    sa.column('settlement_run_id', sa.Integer),
+    sa.column('created_at', sa.DateTime),
+    sa.column('updated_at', sa.DateTime),
+)
+
+commission_settlement_runs = sa.table(
+    'commission_settlement_runs',
+    sa.column('id', sa.Integer),
+    sa.column('period_end', sa.Date),
+    sa.column('status', sa.String),
+    sa.column('total_amount', sa.Numeric(18, 2)),
+    sa.column('payee_count', sa.Integer),
+    sa.column('accrual_count', sa.Integer),
+    sa.column('notes', sa.Text),
+    sa.column('created_at', sa.DateTime),
+    sa.column('updated_at', sa.DateTime),
+)
+
+
+def _backfill_opening_run(connection):
+    """Accrue the commissions of existing sales into an 'opening' run
+
+    They were paid outside the system, so the run posts no cashier transactions and none of
+    these accruals show up as unpaid.
+    """
+    # Sales without accruals; the app may already have accrued sales created after startup
+    pending = sales.c.id.notin_(
+        sa.select(commission_accruals.c.sale_id).where(commission_accruals.c.sale_id.isnot(None))
+    )
+    if connection.execute(sa.select(sa.func.count()).select_from(sales).where(pending)).scalar() == 0:
+        return
+    now = datetime.utcnow()
+    connection.execute(commission_settlement_runs.insert().values(
+        period_end=date.today(), status='opening', total_amount=0, payee_count=0, accrual_count=0,
+        notes='عمولات المبيعات السابقة لدفتر العمولات', created_at=now, updated_at=now
+    ))
+    run_id = connection.execute(
+        sa.select(sa.func.max(commission_settlement_runs.c.id)).where(commission_settlement_runs.c.status == 'opening')
+    ).scalar()
+
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(sales).where(sales.c.id > last_id, pending).order_by(sales.c.id).limit(BACKFILL_CHUNK_SIZE)
+        ).mappings().all()
+        if not rows:
+            break
+        accruals = []
+        for row in rows:
+            for role in ('salesperson', 'sales_manager'):
+                if row[f'{role}_id'] and row[f'{role}_commission']:
+                    accruals.append({
+                        'sale_id': row['id'], 'user_id': row[f'{role}_id'], 'role': role,
+                        'amount': row[f'{role}_commission'], 'accrual_date': row['sale_date'],
+                        'settlement_run_id': run_id, 'created_at': now, 'updated_at': now,
+                    })
+        if accruals:
+            connection.execute(commission_accruals.insert(), accruals)
+        last_id = rows[-1]['id']
+
+    totals = connection.execute(sa.select(
+        sa.func.coalesce(sa.func.sum(commission_accruals.c.amount), 0),
+        sa.func.count(commission_accruals.c.id),
+        sa.func.count(sa.distinct(commission_accruals.c.user_id)),
+    ).where(commission_accruals.c.settlement_run_id == run_id)).one()
+    connection.execute(commission_settlement_runs.update().where(commission_settlement_runs.c.id == run_id).values(
+        total_amount=totals[0], accrual_count=totals[1], payee_count=totals[2]
+    ))
+
+
+def upgrade():
+    if not has_table('commission_settlement_runs'):
+        op.create_table(
+            'commission_settlement_runs',
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('period_end', sa.Date, nullable=False),
+            sa.Column('status', sa.String(20), nullable=False),
+            sa.Column('total_amount', sa.Numeric(18, 2), nullable=False),
+            sa.Column('payee_count', sa.Integer, nullable=False),
+            sa.Column('accrual_count', sa.Integer, nullable=False),
+            sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id')),
+            sa.Column('notes', sa.Text),
+            sa.Column('created_at', sa.DateTime, nullable=False),
+            sa.Column('updated_at', sa.DateTime, nullable=False),
+        )
+    if not has_table('commission_accruals'):
+        op.create_table(
+            'commission_accruals',
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('sale_id', sa.Integer, sa.ForeignKey('sales.id', ondelete='SET NULL')),
+            sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('role', sa.String(20), nullable=False),
+            sa.Column('amount', sa.Numeric(15, 2), nullable=False),
+            sa.Column('accrual_date', sa.Date, nullable=False),
+            sa.Column('settlement_run_id', sa.Integer, sa.ForeignKey('commission_settlement_runs.id')),
+            sa.Column('notes', sa.Text),
+            sa.Column('created_at', sa.DateTime, nullable=False),
+            sa.Column('updated_at', sa.DateTime, nullable=False),
+        )
+    create_index_if_missing('ix_commission_accruals_unpaid', 'commission_accruals',
+                            ['settlement_run_id', 'user_id', 'role', 'accrual_date'])
+    create_index_if_missing('ix_commission_accruals_sale', 'commission_accruals', ['sale_id', 'role'])
+
+    _backfill_opening_run(op.get_bind())
+
+
+def downgrade():
+    if has_table('commission_accruals'):
+        op.drop_table('commission_accruals')
+    if has_table('commission_settlement_runs'):
+        op.drop_table('commission_settlement_runs')
@@ -0,0 +1,106 @@
+"""Add the monthly sales performance aggregate behind the leaderboard
+
+Revision ID: 0007_sales_performance_monthly
+Revises: 0006_commission_accruals
+Create Date: 2026-10-19 15:00:00
+
+"""
+from datetime import datetime
+from decimal import Decimal
+from alembic import op
+import sqlalchemy as sa
+from src.utils.migration_utils import has_table, create_index_if_missing
+
+
+# revision identifiers, used by Alembic.
+revision = '0007_sales_performance_monthly'
+down_revision = '0006_commission_accruals'
+branch_labels = None
+depends_on = None
+
+BACKFILL_CHUNK_SIZE = 5000
+
+sales = sa.table(
+    'sales',
+    sa.column('id', sa.Integer),
+    sa.column('sale_date', sa.Date),
+    sa.column('sale_price', sa.Numeric(15, 2)),
+    sa.column('salesperson_id', sa.Integer),
+    sa.column('salesperson_commission', sa.Numeric(15, 2)),
+    sa.column('sales_manager_id', sa.Integer),
+    sa.column('sales_manager_commission', sa.Numeric(15, 2)),
+)
+
+sales_performance_monthly = sa.table(
+    'sales_performance_monthly',
+    sa.column('user_id', sa.Integer),
+    sa.column('role', sa.String),
+    sa.column('month', sa.Date),
+    sa.column('sale_count', sa.Integer),
+    sa.column('sales_volume', sa.Numeric(18, 2)),
+    sa.column('commission', sa.Numeric(18, 2)),
+    sa.column('created_at', sa.DateTime),
+    sa.column('updated_at', sa.DateTime),
+)
+
+
+def _backfill(connection):
+    """Rebuild the aggregate from the sales per user, role and month
+
+    The table is fully derived, so rows the app may have written since create_all are replaced.
+    Months are bucketed in Python so the same code runs on MySQL and SQLite.
+    """
+    connection.execute(sales_performance_monthly.delete())
+    totals = {}
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(sales).where(sales.c.id > last_id).order_by(sales.c.id).limit(BACKFILL_CHUNK_SIZE)
+        ).mappings().all()
+        if not rows:
+            break
+        for row in rows:
+            month = row['sale_date'].replace(day=1)
+            for role in ('salesperson', 'sales_manager'):
+                if not row[f'{role}_id']:
+                    continue
+                key = (row[f'{role}_id'], role, month)
+                count, volume, commission = totals.get(key, (0, Decimal(0), Decimal(0)))
+                totals[key] = (count + 1, volume + Decimal(str(row['sale_price'] or 0)),
+                               commission + Decimal(str(row[f'{role}_commission'] or 0)))
+        last_id = rows[-1]['id']
+
+    now = datetime.utcnow()
+    aggregates = [
+        {'user_id': user_id, 'role': role, 'month': month, 'sale_count': count, 'sales_volume': volume,
+         'commission': commission, 'created_at': now, 'updated_at': now}
+        for (user_id, role, month), (count, volume, commission) in totals.items()
+    ]
+    for start in range(0, len(aggregates), BACKFILL_CHUNK_SIZE):
+        connection.execute(sales_performance_monthly.insert(), aggregates[start:start + BACKFILL_CHUNK_SIZE])
+
+
+def upgrade():
+    if not has_table('sales_performance_monthly'):
+        op.create_table(
+            'sales_performance_monthly',
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('role', sa.String(20), nullable=False),
+            sa.Column('month', sa.Date, nullable=False),
+            sa.Column('sale_count', sa.Integer, nullable=False),
+            sa.Column('sales_volume', sa.Numeric(18, 2), nullable=False),
+            sa.Column('commission', sa.Numeric(18, 2), nullable=False),
+            sa.Column('created_at', sa.DateTime, nullable=False),
+            sa.Column('updated_at', sa.DateTime, nullable=False),
+            sa.UniqueConstraint('user_id', 'role', 'month', name='uq_sales_performance_user_role_month'),
+        )
+    create_index_if_missing('ix_sales_performance_role_month', 'sales_performance_monthly',
+                            ['role', 'month', 'user_id'])
+
+    _backfill(op.get_bind())
+
+
+def downgrade():
+    if has_table('sales_performance_monthly'):
+        op.drop_table('sales_performance_monthly')
@@ -0,0 +1,23 @@
+"""Index rental payments by rental and date for schedule regeneration
+
+Revision ID: 0008_rental_schedule_index
+Revises: 0007_sales_performance_monthly
+Create Date: 2026-10-19 16:00:00
+
+"""
+from src.utils.migration_utils import create_index_if_missing, drop_index_if_exists
+
+
+# revision identifiers, used by Alembic.
+revision = '0008_rental_schedule_index'
+down_revision = '0007_sales_performance_monthly'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    create_index_if_missing('ix_rental_payments_rental_date', 'rental_payments', ['rental_id', 'payment_date'])
+
+
+def downgrade():
+    drop_index_if_exists('ix_rental_payments_rental_date', 'rental_payments')
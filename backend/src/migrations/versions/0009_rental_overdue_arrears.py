@@ -0,0 +1,93 @@
+"""Index rental payments by status and date, add the per-lease arrears summary
+
+Revision ID: 0009_rental_overdue_arrears
+Revises: 0008_rental_schedule_index
+Create Date: 2026-10-19 17:00:00
+
+"""
+from datetime import date, datetime
+from alembic import op
+import sqlalchemy as sa
+from src.utils.migration_utils import has_table, create_index_if_missing, drop_index_if_exists
+
+
+# revision identifiers, used by Alembic.
+revision = '0009_rental_overdue_arrears'
+down_revision = '0008_rental_schedule_index'
+branch_labels = None
+depends_on = None
+
+rentals = sa.table(
+    'rentals',
+    sa.column('id', sa.Integer),
+    sa.column('unit_id', sa.Integer),
+    sa.column('tenant_name', sa.String),
+)
+
+rental_payments = sa.table(
+    'rental_payments',
+    sa.column('id', sa.Integer),
+    sa.column('rental_id', sa.Integer),
+    sa.column('payment_date', sa.Date),
+    sa.column('amount', sa.Numeric(15, 2)),
+    sa.column('status', sa.String),
+)
+
+rental_arrears = sa.table(
+    'rental_arrears',
+    sa.column('rental_id', sa.Integer),
+    sa.column('tenant_name', sa.String),
+    sa.column('unit_id', sa.Integer),
+    sa.column('overdue_count', sa.Integer),
+    sa.column('overdue_amount', sa.Numeric(18, 2)),
+    sa.column('oldest_due_date', sa.Date),
+    sa.column('created_at', sa.DateTime),
+    sa.column('updated_at', sa.DateTime),
+)
+
+
+def _backfill(connection):
+    """Mark past-due payments overdue and rebuild the arrears summary, as the hourly job does"""
+    connection.execute(rental_payments.update().where(
+        rental_payments.c.status == 'مستحقة', rental_payments.c.payment_date < date.today()
+    ).values(status='متأخرة'))
+
+    connection.execute(rental_arrears.delete())
+    now = sa.literal(datetime.utcnow(), sa.DateTime)
+    connection.execute(rental_arrears.insert().from_select(
+        ['rental_id', 'tenant_name', 'unit_id', 'overdue_count', 'overdue_amount', 'oldest_due_date',
+         'created_at', 'updated_at'],
+        sa.select(
+            rental_payments.c.rental_id, rentals.c.tenant_name, rentals.c.unit_id,
+            sa.func.count(rental_payments.c.id), sa.func.sum(rental_payments.c.amount),
+            sa.func.min(rental_payments.c.payment_date), now, now
+        ).join(rentals, rentals.c.id == rental_payments.c.rental_id)
+        .where(rental_payments.c.status == 'متأخرة')
+        .group_by(rental_payments.c.rental_id, rentals.c.tenant_name, rentals.c.unit_id)
+    ))
+
+
+def upgrade():
+    create_index_if_missing('ix_rental_payments_status_date', 'rental_payments', ['status', 'payment_date'])
+    if not has_table('rental_arrears'):
+        op.create_table(
+            'rental_arrears',
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('rental_id', sa.Integer, sa.ForeignKey('rentals.id', ondelete='CASCADE'),
+                      nullable=False, unique=True),
+            sa.Column('tenant_name', sa.String(100), nullable=False),
+            sa.Column('unit_id', sa.Integer, sa.ForeignKey('units.id'), nullable=False),
+            sa.Column('overdue_count', sa.Integer, nullable=False),
+            sa.Column('overdue_amount', sa.Numeric(18, 2), nullable=False),
+            sa.Column('oldest_due_date', sa.Date, nullable=False),
+            sa.Column('created_at', sa.DateTime, nullable=False),
+            sa.Column('updated_at', sa.DateTime, nullable=False),
+        )
+
+    _backfill(op.get_bind())
+
+
+def downgrade():
+    if has_table('rental_arrears'):
+        op.drop_table('rental_arrears')
+    drop_index_if_exists('ix_rental_payments_status_date', 'rental_payments')
@@ -0,0 +1,89 @@
+"""Add unit occupancy intervals for sales and rentals
+
+Revision ID: 0010_unit_occupancy
+Revises: 0009_rental_overdue_arrears
+Create Date: 2026-10-19 18:00:00
+
+"""
+from datetime import date, datetime
+from alembic import op
+import sqlalchemy as sa
+from src.utils.migration_utils import has_table, create_index_if_missing
+
+
+# revision identifiers, used by Alembic.
+revision = '0010_unit_occupancy'
+down_revision = '0009_rental_overdue_arrears'
+branch_labels = None
+depends_on = None
+
+OPEN_END_DATE = date(9999, 12, 31)
+
+sales = sa.table(
+    'sales',
+    sa.column('id', sa.Integer),
+    sa.column('unit_id', sa.Integer),
+    sa.column('sale_date', sa.Date),
+)
+
+rentals = sa.table(
+    'rentals',
+    sa.column('id', sa.Integer),
+    sa.column('unit_id', sa.Integer),
+    sa.column('start_date', sa.Date),
+    sa.column('end_date', sa.Date),
+)
+
+unit_occupancy = sa.table(
+    'unit_occupancy',
+    sa.column('unit_id', sa.Integer),
+    sa.column('kind', sa.String),
+    sa.column('reference_id', sa.Integer),
+    sa.column('start_date', sa.Date),
+    sa.column('end_date', sa.Date),
+    sa.column('created_at', sa.DateTime),
+    sa.column('updated_at', sa.DateTime),
+)
+
+
+def _backfill(connection):
+    """One interval per existing sale and rental not recorded yet
+
+    Overlaps between existing records are carried over as they are; only new writes are checked.
+    """
+    now = sa.literal(datetime.utcnow(), sa.DateTime)
+    for kind, source, start, end in (
+        ('sale', sales, sales.c.sale_date, sa.literal(OPEN_END_DATE, sa.Date)),
+        ('rental', rentals, rentals.c.start_date, rentals.c.end_date),
+    ):
+        recorded = sa.select(unit_occupancy.c.reference_id).where(unit_occupancy.c.kind == kind)
+        connection.execute(unit_occupancy.insert().from_select(
+            ['unit_id', 'kind', 'reference_id', 'start_date', 'end_date', 'created_at', 'updated_at'],
+            sa.select(source.c.unit_id, sa.literal(kind, sa.String), source.c.id, start, end, now, now)
+            .where(source.c.id.notin_(recorded))
+        ))
+
+
+def upgrade():
+    if not has_table('unit_occupancy'):
+        op.create_table(
+            'unit_occupancy',
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('unit_id', sa.Integer, sa.ForeignKey('units.id', ondelete='CASCADE'), nullable=False),
+            sa.Column('kind', sa.String(20), nullable=False),
+            sa.Column('reference_id', sa.Integer, nullable=False),
+            sa.Column('start_date', sa.Date, nullable=False),
+            sa.Column('end_date', sa.Date, nullable=False),
+            sa.Column('created_at', sa.DateTime, nullable=False),
+            sa.Column('updated_at', sa.DateTime, nullable=False),
+            sa.UniqueConstraint('kind', 'reference_id', name='uq_unit_occupancy_reference'),
+        )
+    create_index_if_missing('ix_unit_occupancy_unit_dates', 'unit_occupancy', ['unit_id', 'start_date', 'end_date'])
+    create_index_if_missing('ix_unit_occupancy_dates', 'unit_occupancy', ['start_date', 'end_date'])
+
+    _backfill(op.get_bind())
+
+
+def downgrade():
+    if has_table('unit_occupancy'):
+        op.drop_table('unit_occupancy')
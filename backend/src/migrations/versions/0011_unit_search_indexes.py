@@ -0,0 +1,38 @@
+"""Index units for search: filter columns and a FULLTEXT ngram index on MySQL
+
+Revision ID: 0011_unit_search_indexes
+Revises: 0010_unit_occupancy
+Create Date: 2026-10-19 19:00:00
+
+"""
+from alembic import op
+from src.utils.migration_utils import has_index, create_index_if_missing, drop_index_if_exists
+
+
+# revision identifiers, used by Alembic.
+revision = '0011_unit_search_indexes'
+down_revision = '0010_unit_occupancy'
+branch_labels = None
+depends_on = None
+
+
+def _is_mysql():
+    return op.get_bind().dialect.name in ('mysql', 'mariadb')
+
+
+def upgrade():
+    create_index_if_missing('ix_units_type_status_price', 'units', ['type', 'status', 'price'])
+    create_index_if_missing('ix_units_price', 'units', ['price'])
+    # The ngram parser tokenizes Arabic (and codes) without word boundaries or stemming
+    if _is_mysql() and not has_index('units', 'ft_units_search'):
+        op.execute(
+            "CREATE FULLTEXT INDEX ft_units_search ON units (code, address, description_ar, description_en) "
+            "WITH PARSER ngram"
+        )
+
+
+def downgrade():
+    if _is_mysql():
+        drop_index_if_exists('ft_units_search', 'units')
+    drop_index_if_exists('ix_units_price', 'units')
+    drop_index_if_exists('ix_units_type_status_price', 'units')
@@ -0,0 +1,56 @@
+"""Add recurring expense templates and their per-period postings
+
+Revision ID: 0012_recurring_expenses
+Revises: 0011_unit_search_indexes
+Create Date: 2026-10-19 20:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from src.utils.migration_utils import has_table
+
+
+# revision identifiers, used by Alembic.
+revision = '0012_recurring_expenses'
+down_revision = '0011_unit_search_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not has_table('recurring_expenses'):
+        op.create_table(
+            'recurring_expenses',
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('description_ar', sa.Text, nullable=False),
+            sa.Column('description_en', sa.Text),
+            sa.Column('amount', sa.Numeric(15, 2), nullable=False),
+            sa.Column('category_id', sa.Integer, sa.ForeignKey('expense_categories.id'), nullable=False),
+            sa.Column('cadence', sa.String(50), nullable=False),
+            sa.Column('start_date', sa.Date, nullable=False),
+            sa.Column('end_date', sa.Date),
+            sa.Column('is_active', sa.Boolean, nullable=False),
+            sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('notes', sa.Text),
+            sa.Column('created_at', sa.DateTime, nullable=False),
+            sa.Column('updated_at', sa.DateTime, nullable=False),
+        )
+    if not has_table('recurring_expense_postings'):
+        op.create_table(
+            'recurring_expense_postings',
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('template_id', sa.Integer, sa.ForeignKey('recurring_expenses.id', ondelete='CASCADE'),
+                      nullable=False),
+            sa.Column('period_key', sa.String(7), nullable=False),
+            sa.Column('expense_id', sa.Integer, sa.ForeignKey('expenses.id', ondelete='SET NULL')),
+            sa.Column('created_at', sa.DateTime, nullable=False),
+            sa.Column('updated_at', sa.DateTime, nullable=False),
+            sa.UniqueConstraint('template_id', 'period_key', name='uq_recurring_expense_postings_period'),
+        )
+
+
+def downgrade():
+    if has_table('recurring_expense_postings'):
+        op.drop_table('recurring_expense_postings')
+    if has_table('recurring_expenses'):
+        op.drop_table('recurring_expenses')
@@ -0,0 +1,121 @@
+"""Add the general ledger: chart of accounts, journal entries and lines, monthly account balances
+
+Revision ID: 0013_general_ledger
+Revises: 0012_recurring_expenses
+Create Date: 2026-10-19 21:00:00
+
+The journal of existing documents is posted by src/scripts/backfill_ledger.py.
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+from src.utils.migration_utils import has_table, create_index_if_missing
+
+
+# revision identifiers, used by Alembic.
+revision = '0013_general_ledger'
+down_revision = '0012_recurring_expenses'
+branch_labels = None
+depends_on = None
+
+CHART_OF_ACCOUNTS = [
+    ('1000', 'الخزنة', 'Cashier', 'asset'),
+    ('2100', 'عمولات مستحقة للبائعين', 'Commissions payable', 'liability'),
+    ('3000', 'رأس المال والأرصدة الافتتاحية', 'Owner equity and opening balances', 'equity'),
+    ('4000', 'إيرادات عمولات المبيعات', 'Sales commission revenue', 'revenue'),
+    ('4010', 'خصومات مكتسبة على المبيعات', 'Sales discounts earned', 'revenue'),
+    ('4100', 'إيرادات الإيجار', 'Rental income', 'revenue'),
+    ('5000', 'المصروفات العامة', 'General expenses', 'expense'),
+    ('5100', 'تكاليف التشطيبات', 'Finishing works costs', 'expense'),
+    ('5200', 'عمولات البائعين ومديري المبيعات', 'Sales commissions expense', 'expense'),
+    ('5300', 'ضرائب المبيعات', 'Sales taxes', 'expense'),
+    ('5400', 'رسوم المبيعات', 'Sales fees', 'expense'),
+]
+
+accounts = sa.table(
+    'accounts',
+    sa.column('id', sa.Integer),
+    sa.column('code', sa.String),
+    sa.column('name_ar', sa.String),
+    sa.column('name_en', sa.String),
+    sa.column('account_type', sa.String),
+    sa.column('is_active', sa.Boolean),
+    sa.column('created_at', sa.DateTime),
+    sa.column('updated_at', sa.DateTime),
+)
+
+
+def _seed_chart(connection):
+    existing = set(connection.execute(sa.select(accounts.c.code)).scalars())
+    now = datetime.utcnow()
+    rows = [
+        {'code': code, 'name_ar': name_ar, 'name_en': name_en, 'account_type': account_type,
+         'is_active': True, 'created_at': now, 'updated_at': now}
+        for code, name_ar, name_en, account_type in CHART_OF_ACCOUNTS if code not in existing
+    ]
+    if rows:
+        connection.execute(accounts.insert(), rows)
+
+
+def upgrade():
+    if not has_table('accounts'):
+        op.create_table(
+            'accounts',
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('code', sa.String(20), nullable=False, unique=True),
+            sa.Column('name_ar', sa.String(200), nullable=False),
+            sa.Column('name_en', sa.String(200)),
+            sa.Column('account_type', sa.String(20), nullable=False),
+            sa.Column('is_active', sa.Boolean, nullable=False),
+            sa.Column('created_at', sa.DateTime, nullable=False),
+            sa.Column('updated_at', sa.DateTime, nullable=False),
+        )
+    if not has_table('journal_entries'):
+        op.create_table(
+            'journal_entries',
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('entry_date', sa.Date, nullable=False),
+            sa.Column('source_type', sa.String(50), nullable=False),
+            sa.Column('source_id', sa.Integer, nullable=False),
+            sa.Column('description', sa.Text),
+            sa.Column('created_at', sa.DateTime, nullable=False),
+            sa.Column('updated_at', sa.DateTime, nullable=False),
+            sa.UniqueConstraint('source_type', 'source_id', name='uq_journal_entries_source'),
+        )
+    create_index_if_missing('ix_journal_entries_date', 'journal_entries', ['entry_date'])
+    if not has_table('journal_lines'):
+        op.create_table(
+            'journal_lines',
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('entry_id', sa.Integer, sa.ForeignKey('journal_entries.id', ondelete='CASCADE'),
+                      nullable=False),
+            sa.Column('account_id', sa.Integer, sa.ForeignKey('accounts.id'), nullable=False),
+            sa.Column('entry_date', sa.Date, nullable=False),
+            sa.Column('debit', sa.Numeric(15, 2), nullable=False),
+            sa.Column('credit', sa.Numeric(15, 2), nullable=False),
+            sa.Column('created_at', sa.DateTime, nullable=False),
+            sa.Column('updated_at', sa.DateTime, nullable=False),
+        )
+    create_index_if_missing('ix_journal_lines_entry', 'journal_lines', ['entry_id'])
+    create_index_if_missing('ix_journal_lines_account_date', 'journal_lines', ['account_id', 'entry_date'])
+    if not has_table('account_balances_monthly'):
+        op.create_table(
+            'account_balances_monthly',
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('account_id', sa.Integer, sa.ForeignKey('accounts.id'), nullable=False),
+            sa.Column('month', sa.Date, nullable=False),
+            sa.Column('debit', sa.Numeric(18, 2), nullable=False),
+            sa.Column('credit', sa.Numeric(18, 2), nullable=False),
+            sa.Column('created_at', sa.DateTime, nullable=False),
+            sa.Column('updated_at', sa.DateTime, nullable=False),
+            sa.UniqueConstraint('account_id', 'month', name='uq_account_balances_account_month'),
+        )
+    create_index_if_missing('ix_account_balances_month', 'account_balances_monthly', ['month', 'account_id'])
+
+    _seed_chart(op.get_bind())
+
+
+def downgrade():
+    for table in ('account_balances_monthly', 'journal_lines', 'journal_entries', 'accounts'):
+        if has_table(table):
+            op.drop_table(table)
@@ -0,0 +1,60 @@
+"""Add closed accounting periods with their frozen monthly summaries
+
+Revision ID: 0014_closed_periods
+Revises: 0013_general_ledger
+Create Date: 2026-10-19 22:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from src.utils.migration_utils import has_table
+
+
+# revision identifiers, used by Alembic.
+revision = '0014_closed_periods'
+down_revision = '0013_general_ledger'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not has_table('closed_periods'):
+        op.create_table(
+            'closed_periods',
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('month', sa.Date, nullable=False, unique=True),
+            sa.Column('sale_count', sa.Integer, nullable=False),
+            sa.Column('sales_volume', sa.Numeric(18, 2), nullable=False),
+            sa.Column('company_commission', sa.Numeric(18, 2), nullable=False),
+            sa.Column('net_company_revenue', sa.Numeric(18, 2), nullable=False),
+            sa.Column('commissions', sa.Numeric(18, 2), nullable=False),
+            sa.Column('total_taxes', sa.Numeric(18, 2), nullable=False),
+            sa.Column('rental_income', sa.Numeric(18, 2), nullable=False),
+            sa.Column('expenses_total', sa.Numeric(18, 2), nullable=False),
+            sa.Column('finishing_costs', sa.Numeric(18, 2), nullable=False),
+            sa.Column('cashier_closing_balance', sa.Numeric(18, 2), nullable=False),
+            sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id')),
+            sa.Column('notes', sa.Text),
+            sa.Column('created_at', sa.DateTime, nullable=False),
+            sa.Column('updated_at', sa.DateTime, nullable=False),
+        )
+    if not has_table('closed_period_expenses'):
+        op.create_table(
+            'closed_period_expenses',
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('period_id', sa.Integer, sa.ForeignKey('closed_periods.id', ondelete='CASCADE'),
+                      nullable=False),
+            sa.Column('category_id', sa.Integer, sa.ForeignKey('expense_categories.id'), nullable=False),
+            sa.Column('total', sa.Numeric(18, 2), nullable=False),
+            sa.Column('expense_count', sa.Integer, nullable=False),
+            sa.Column('created_at', sa.DateTime, nullable=False),
+            sa.Column('updated_at', sa.DateTime, nullable=False),
+            sa.UniqueConstraint('period_id', 'category_id', name='uq_closed_period_expenses_category'),
+        )
+
+
+def downgrade():
+    if has_table('closed_period_expenses'):
+        op.drop_table('closed_period_expenses')
+    if has_table('closed_periods'):
+        op.drop_table('closed_periods')
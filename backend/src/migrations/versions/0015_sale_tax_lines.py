@@ -0,0 +1,129 @@
+"""Persist the tax lines of sales for the tax report
+
+Revision ID: 0015_sale_tax_lines
+Revises: 0014_closed_periods
+Create Date: 2026-10-19 23:00:00
+
+"""
+import json
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+from src.utils.migration_utils import has_table, create_index_if_missing
+
+
+# revision identifiers, used by Alembic.
+revision = '0015_sale_tax_lines'
+down_revision = '0014_closed_periods'
+branch_labels = None
+depends_on = None
+
+BACKFILL_CHUNK_SIZE = 1000
+
+sales = sa.table(
+    'sales',
+    sa.column('id', sa.Integer),
+    sa.column('rule_set_id', sa.Integer),
+)
+
+sale_calculation_lines = sa.table(
+    'sale_calculation_lines',
+    sa.column('sale_id', sa.Integer),
+    sa.column('line_index', sa.Integer),
+    sa.column('rule_id', sa.Integer),
+    sa.column('base_amount', sa.Numeric(15, 2)),
+    sa.column('amount', sa.Numeric(15, 2)),
+)
+
+calculation_rule_sets = sa.table(
+    'calculation_rule_sets',
+    sa.column('id', sa.Integer),
+    sa.column('rules_json', sa.Text),
+)
+
+sale_tax_lines = sa.table(
+    'sale_tax_lines',
+    sa.column('sale_id', sa.Integer),
+    sa.column('rule_id', sa.Integer),
+    sa.column('rule_name_ar', sa.String),
+    sa.column('rule_name_en', sa.String),
+    sa.column('calculation_type', sa.String),
+    sa.column('rate', sa.Numeric(15, 4)),
+    sa.column('base_amount', sa.Numeric(15, 2)),
+    sa.column('amount', sa.Numeric(15, 2)),
+    sa.column('created_at', sa.DateTime),
+    sa.column('updated_at', sa.DateTime),
+)
+
+
+def _backfill_tax_lines(connection):
+    """Write the tax lines of existing sales from their calculation lines and rule set snapshots
+
+    Sales that already have tax lines (written by the app since the table was created) are skipped.
+    """
+    pending = sales.c.id.notin_(sa.select(sale_tax_lines.c.sale_id))
+    tax_rules = {}  # rule set id -> {rule id: rule entry} of its tax rules
+    now = datetime.utcnow()
+    last_id = 0
+    while True:
+        chunk = connection.execute(
+            sa.select(sales.c.id, sales.c.rule_set_id)
+            .where(sales.c.id > last_id, sales.c.rule_set_id.isnot(None), pending)
+            .order_by(sales.c.id).limit(BACKFILL_CHUNK_SIZE)
+        ).all()
+        if not chunk:
+            break
+        rule_set_ids = {rule_set_id for _, rule_set_id in chunk} - set(tax_rules)
+        if rule_set_ids:
+            for rule_set_id, rules_json in connection.execute(
+                sa.select(calculation_rule_sets.c.id, calculation_rule_sets.c.rules_json)
+                .where(calculation_rule_sets.c.id.in_(rule_set_ids))
+            ):
+                tax_rules[rule_set_id] = {rule.get('id'): rule for rule in json.loads(rules_json)
+                                          if rule.get('rule_type') == 'tax'}
+
+        rule_set_of = dict(chunk)
+        rows = []
+        for sale_id, rule_id, base_amount, amount in connection.execute(
+            sa.select(sale_calculation_lines.c.sale_id, sale_calculation_lines.c.rule_id,
+                      sale_calculation_lines.c.base_amount, sale_calculation_lines.c.amount)
+            .where(sale_calculation_lines.c.sale_id.in_(list(rule_set_of)))
+            .order_by(sale_calculation_lines.c.sale_id, sale_calculation_lines.c.line_index)
+        ):
+            rule = tax_rules.get(rule_set_of[sale_id], {}).get(rule_id)
+            if rule:
+                rows.append({
+                    'sale_id': sale_id, 'rule_id': rule_id, 'rule_name_ar': rule.get('name_ar'),
+                    'rule_name_en': rule.get('name_en'), 'calculation_type': rule['calculation_type'],
+                    'rate': rule['value'], 'base_amount': base_amount, 'amount': amount,
+                    'created_at': now, 'updated_at': now,
+                })
+        if rows:
+            connection.execute(sale_tax_lines.insert(), rows)
+        last_id = chunk[-1][0]
+
+
+def upgrade():
+    if not has_table('sale_tax_lines'):
+        op.create_table(
+            'sale_tax_lines',
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('sale_id', sa.Integer, sa.ForeignKey('sales.id'), nullable=False),
+            sa.Column('rule_id', sa.Integer),
+            sa.Column('rule_name_ar', sa.String(200)),
+            sa.Column('rule_name_en', sa.String(200)),
+            sa.Column('calculation_type', sa.String(50), nullable=False),
+            sa.Column('rate', sa.Numeric(15, 4), nullable=False),
+            sa.Column('base_amount', sa.Numeric(15, 2), nullable=False),
+            sa.Column('amount', sa.Numeric(15, 2), nullable=False),
+            sa.Column('created_at', sa.DateTime, nullable=False),
+            sa.Column('updated_at', sa.DateTime, nullable=False),
+        )
+    create_index_if_missing('ix_sale_tax_lines_sale', 'sale_tax_lines', ['sale_id', 'rule_id'])
+
+    _backfill_tax_lines(op.get_bind())
+
+
+def downgrade():
+    if has_table('sale_tax_lines'):
+        op.drop_table('sale_tax_lines')
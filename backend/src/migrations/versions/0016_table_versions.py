@@ -0,0 +1,55 @@
+"""Add the per-table change counters read by conditional GETs and the calculation plan cache
+
+Revision ID: 0016_table_versions
+Revises: 0015_sale_tax_lines
+Create Date: 2026-10-20 10:00:00
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+from src.utils.migration_utils import has_table
+
+
+# revision identifiers, used by Alembic.
+revision = '0016_table_versions'
+down_revision = '0015_sale_tax_lines'
+branch_labels = None
+depends_on = None
+
+table_versions = sa.table(
+    'table_versions',
+    sa.column('table_name', sa.String),
+    sa.column('version', sa.BigInteger),
+    sa.column('created_at', sa.DateTime),
+    sa.column('updated_at', sa.DateTime),
+)
+
+
+def upgrade():
+    if not has_table('table_versions'):
+        op.create_table(
+            'table_versions',
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('table_name', sa.String(100), nullable=False, unique=True),
+            sa.Column('version', sa.BigInteger, nullable=False),
+            sa.Column('created_at', sa.DateTime, nullable=False),
+            sa.Column('updated_at', sa.DateTime, nullable=False),
+        )
+
+    # The ORM listeners bump these rows on every write, so each existing table needs one
+    connection = op.get_bind()
+    registered = set(connection.execute(sa.select(table_versions.c.table_name)).scalars())
+    now = datetime.utcnow()
+    rows = [
+        {'table_name': table_name, 'version': 1, 'created_at': now, 'updated_at': now}
+        for table_name in sa.inspect(connection).get_table_names()
+        if table_name not in registered and table_name not in ('table_versions', 'alembic_version')
+    ]
+    if rows:
+        connection.execute(table_versions.insert(), rows)
+
+
+def downgrade():
+    if has_table('table_versions'):
+        op.drop_table('table_versions')
@@ -1,12 +1,16 @@
 from .base import db, BaseModel
 from .auth import User, Role, Permission, RolePermission
-from .units import Unit
-from .sales import Sale
-from .expenses import Expense, ExpenseCategory
-from .rentals import Rental, RentalPayment
+from .units import Unit, UnitOccupancy
+from .sales import Sale, SaleCalculationLine, SaleTaxLine, SalesPerformanceMonthly
+from .expenses import Expense, ExpenseCategory, RecurringExpense, RecurringExpensePosting
+from .rentals import Rental, RentalPayment, RentalArrears
 from .finishing_works import FinishingWork, FinishingWorkExpense
 from .settings import FinancialSetting, Template, CashierBalance, CashierTransaction
-from .dynamic_calculations import CalculationRule, CustomField, CustomFieldValue, PrintTemplate, ReportConfiguration
+from .dynamic_calculations import CalculationRule, CalculationRuleSet, CustomField, CustomFieldValue, PrintTemplate, ReportConfiguration
+from .commissions import CommissionAccrual, CommissionSettlementRun
+from .ledger import Account, JournalEntry, JournalLine, AccountBalanceMonthly
+from .periods import ClosedPeriod, ClosedPeriodExpense
+from .versioning import TableVersion
 
 # Import the User model for backward compatibility with the template
 from .auth import User
@@ -14,11 +18,15 @@ from .auth import User
 __all__ = [
     'db', 'BaseModel',
     'User', 'Role', 'Permission', 'RolePermission',
-    'Unit', 'Sale', 
-    'Expense', 'ExpenseCategory',
-    'Rental', 'RentalPayment',
+    'Unit', 'UnitOccupancy', 'Sale', 'SaleCalculationLine', 'SaleTaxLine', 'SalesPerformanceMonthly',
+    'Expense', 'ExpenseCategory', 'RecurringExpense', 'RecurringExpensePosting',
+    'Rental', 'RentalPayment', 'RentalArrears',
     'FinishingWork', 'FinishingWorkExpense',
     'FinancialSetting', 'Template', 'CashierBalance', 'CashierTransaction',
-    'CalculationRule', 'CustomField', 'CustomFieldValue', 'PrintTemplate', 'ReportConfiguration'
+    'CalculationRule', 'CalculationRuleSet', 'CustomField', 'CustomFieldValue', 'PrintTemplate', 'ReportConfiguration',
+    'CommissionAccrual', 'CommissionSettlementRun',
+    'Account', 'JournalEntry', 'JournalLine', 'AccountBalanceMonthly',
+    'ClosedPeriod', 'ClosedPeriodExpense',
+    'TableVersion'
 ]
 
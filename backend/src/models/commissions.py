@@ -0,0 +1,63 @@
+from .base import db, BaseModel
+
+# Commission roles and the cashier transaction type their payouts are posted as
+COMMISSION_PAYMENT_TYPES = {
+    'salesperson': 'salesperson_commission_payment',
+    'sales_manager': 'sales_manager_commission_payment',
+}
+
+class CommissionSettlementRun(BaseModel):
+    """دفعة تسوية عمولات: تصرف كل الاستحقاقات غير المدفوعة حتى تاريخ معين"""
+    __tablename__ = 'commission_settlement_runs'
+
+    period_end = db.Column(db.Date, nullable=False)  # الاستحقاقات حتى هذا التاريخ
+    status = db.Column(db.String(20), nullable=False, default='completed')  # completed, opening
+    total_amount = db.Column(db.Numeric(18, 2), nullable=False, default=0)
+    payee_count = db.Column(db.Integer, nullable=False, default=0)
+    accrual_count = db.Column(db.Integer, nullable=False, default=0)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    notes = db.Column(db.Text)
+
+    # Relationships
+    user = db.relationship('User', backref=db.backref('commission_settlement_runs', lazy=True))
+
+    def to_dict(self):
+        """Convert to dictionary with proper decimal handling"""
+        data = super().to_dict()
+        data['total_amount'] = float(self.total_amount or 0)
+        if data.get('period_end'):
+            data['period_end'] = data['period_end'].isoformat()
+        data['user_name'] = f"{self.user.first_name} {self.user.last_name}" if self.user else None
+        return data
+
+class CommissionAccrual(BaseModel):
+    """عمولة مستحقة لبائع أو مدير مبيعات عن بيع؛ تبقى غير مدفوعة حتى تدخل في دفعة تسوية
+
+    تعديل البيع بعد التسوية لا يغير الصفوف المسددة، بل يضيف صف فرق (قد يكون سالباً).
+    """
+    __tablename__ = 'commission_accruals'
+    __table_args__ = (
+        # Unpaid balances per payee: WHERE settlement_run_id IS NULL GROUP BY user_id, role
+        db.Index('ix_commission_accruals_unpaid', 'settlement_run_id', 'user_id', 'role', 'accrual_date'),
+        db.Index('ix_commission_accruals_sale', 'sale_id', 'role'),
+    )
+
+    sale_id = db.Column(db.Integer, db.ForeignKey('sales.id', ondelete='SET NULL'))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    role = db.Column(db.String(20), nullable=False)  # salesperson, sales_manager
+    amount = db.Column(db.Numeric(15, 2), nullable=False)
+    accrual_date = db.Column(db.Date, nullable=False)
+    settlement_run_id = db.Column(db.Integer, db.ForeignKey('commission_settlement_runs.id'))
+    notes = db.Column(db.Text)
+
+    # Relationships
+    user = db.relationship('User', backref=db.backref('commission_accruals', lazy=True))
+    settlement_run = db.relationship('CommissionSettlementRun', backref=db.backref('accruals', lazy=True))
+
+    def to_dict(self):
+        """Convert to dictionary with proper decimal handling"""
+        data = super().to_dict()
+        data['amount'] = float(self.amount or 0)
+        if data.get('accrual_date'):
+            data['accrual_date'] = data['accrual_date'].isoformat()
+        return data
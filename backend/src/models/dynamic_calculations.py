@@ -1,15 +1,26 @@
 from .base import db, BaseModel
+from sqlalchemy.exc import IntegrityError
+import hashlib
 import json
+from decimal import Decimal
+
+# Compiled rule sets by snapshot id; snapshots never change, so entries are never invalidated
+_compiled_rule_sets = {}
 
 class CalculationRule(BaseModel):
     """نموذج لقواعد الحساب القابلة للتخصيص (عمولات، ضرائب، خصومات)"""
     __tablename__ = 'calculation_rules'
+    __table_args__ = (
+        db.Index('ix_calculation_rules_code', 'code', unique=True),
+    )
     
+    code = db.Column(db.String(100))  # كود القاعدة للإشارة إليها من تعبيرات القواعد الأخرى
     name_ar = db.Column(db.String(200), nullable=False)  # اسم القاعدة بالعربية
     name_en = db.Column(db.String(200), nullable=False)  # اسم القاعدة بالإنجليزية
     rule_type = db.Column(db.String(50), nullable=False)  # commission, tax, discount, fee
-    calculation_type = db.Column(db.String(50), nullable=False)  # percentage, fixed_amount
+    calculation_type = db.Column(db.String(50), nullable=False)  # percentage, fixed_amount, expression
     value = db.Column(db.Numeric(10, 4), nullable=False)  # القيمة (نسبة أو مبلغ ثابت)
+    expression = db.Column(db.Text)  # تعبير الحساب عندما يكون calculation_type = expression
     applies_to = db.Column(db.String(100), nullable=False)  # sales, rentals, finishing_works, all
     unit_type_filter = db.Column(db.Text)  # JSON array of unit types this rule applies to
     is_active = db.Column(db.Boolean, default=True, nullable=False)
@@ -31,12 +42,18 @@ class CalculationRule(BaseModel):
         self.unit_type_filter = json.dumps(unit_types, ensure_ascii=False)
     
     def calculate_amount(self, base_amount):
-        """حساب المبلغ بناءً على القاعدة"""
+        """حساب المبلغ بناءً على القاعدة (Decimal بدون تحويل إلى float)"""
+        base_amount = Decimal(str(base_amount))
+        value = Decimal(str(self.value or 0))
         if self.calculation_type == 'percentage':
-            return float(base_amount) * (float(self.value) / 100)
+            return base_amount * value / 100
         elif self.calculation_type == 'fixed_amount':
-            return float(self.value)
-        return 0
+            return value
+        elif self.calculation_type == 'expression':
+            # بدون نتائج القواعد الأخرى؛ الإشارات إليها تساوي صفراً
+            from src.services.rule_expressions import compile_expression
+            return Decimal(str(compile_expression(self.expression)({'price': float(base_amount), 'base': float(base_amount)})))
+        return Decimal(0)
     
     def to_dict(self):
         """Convert to dictionary"""
@@ -51,6 +68,103 @@ class CalculationRule(BaseModel):
         
         return data
 
+class CalculationRuleSet(BaseModel):
+    """لقطة ثابتة لمجموعة قواعد الحساب، معرّفة ببصمة محتواها"""
+    __tablename__ = 'calculation_rule_sets'
+    
+    content_hash = db.Column(db.String(64), unique=True, nullable=False)  # SHA-256 of applies_to + rules_json
+    applies_to = db.Column(db.String(100), nullable=False)
+    rules_json = db.Column(db.Text, nullable=False)  # canonical JSON array of rule entries
+    
+    @staticmethod
+    def snapshot_rule(rule):
+        """Rule entry stored in a snapshot for a CalculationRule"""
+        entry = {
+            'id': rule.id,
+            'name_ar': rule.name_ar,
+            'name_en': rule.name_en,
+            'rule_type': rule.rule_type,
+            'calculation_type': rule.calculation_type,
+            'value': float(rule.value),
+            'unit_type_filter': rule.get_unit_type_filter(),
+            'order_index': rule.order_index or 0
+        }
+        # Only stored when set, so snapshots of plain rules keep their earlier hash
+        if rule.code:
+            entry['code'] = rule.code
+        if rule.expression:
+            entry['expression'] = rule.expression
+        return entry
+    
+    @staticmethod
+    def rules_from_breakdown(breakdown):
+        """Rule entries for a breakdown that was calculated without a snapshot"""
+        return [
+            {
+                'id': rule.get('rule_id'),
+                'name_ar': rule.get('rule_name_ar'),
+                'name_en': rule.get('rule_name_en'),
+                'rule_type': rule['rule_type'],
+                'calculation_type': rule['calculation_type'],
+                'value': float(rule['value']),
+                'unit_type_filter': [],
+                'order_index': index
+            }
+            for index, rule in enumerate(breakdown.get('applied_rules', []))
+        ]
+    
+    @staticmethod
+    def canonical_json(rules):
+        """Serialize rule entries so equal rule sets always produce the same text"""
+        return json.dumps(rules, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    
+    @staticmethod
+    def hash_content(applies_to, rules_json):
+        return hashlib.sha256(f"{applies_to}\n{rules_json}".encode('utf-8')).hexdigest()
+    
+    @classmethod
+    def get_or_create(cls, rules, applies_to='sales'):
+        """Get the snapshot for these rule entries, adding it to the session if it is new"""
+        rules_json = cls.canonical_json(rules)
+        content_hash = cls.hash_content(applies_to, rules_json)
+        rule_set = cls.query.filter_by(content_hash=content_hash).first()
+        if rule_set:
+            return rule_set
+        
+        rule_set = cls(content_hash=content_hash, applies_to=applies_to, rules_json=rules_json)
+        try:
+            with db.session.begin_nested():
+                db.session.add(rule_set)
+        except IntegrityError:
+            # Another request stored the same snapshot first
+            rule_set = cls.query.filter_by(content_hash=content_hash).one()
+        return rule_set
+    
+    def get_rules(self):
+        """Get the snapshot's rule entries as a list"""
+        return json.loads(self.rules_json)
+    
+    @classmethod
+    def get_compiled(cls, rule_set_id):
+        """Get {rule id: rule entry} for a snapshot, cached per process"""
+        compiled = _compiled_rule_sets.get(rule_set_id)
+        if compiled is None:
+            rules_json = db.session.execute(
+                db.select(cls.rules_json).where(cls.id == rule_set_id)
+            ).scalar_one_or_none()
+            if rules_json is None:
+                return {}
+            compiled = {rule['id']: rule for rule in json.loads(rules_json)}
+            _compiled_rule_sets[rule_set_id] = compiled
+        return compiled
+    
+    def to_dict(self):
+        """Convert to dictionary"""
+        data = super().to_dict()
+        data['rules'] = self.get_rules()
+        data.pop('rules_json')
+        return data
+
 class CustomField(BaseModel):
     """نموذج للحقول المخصصة القابلة للإضافة من قبل المسؤول"""
     __tablename__ = 'custom_fields'
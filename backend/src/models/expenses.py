@@ -1,4 +1,8 @@
 from .base import db, BaseModel
+from .rentals import PAYMENT_FREQUENCY_MONTHS
+
+# دوريات المصروفات المتكررة، بنفس مسميات دوريات سداد الإيجار
+RECURRENCE_MONTHS = PAYMENT_FREQUENCY_MONTHS
 
 class ExpenseCategory(BaseModel):
     __tablename__ = 'expense_categories'
@@ -13,6 +17,10 @@ class ExpenseCategory(BaseModel):
 
 class Expense(BaseModel):
     __tablename__ = 'expenses'
+    __table_args__ = (
+        db.Index('ix_expenses_expense_date', 'expense_date'),
+        db.Index('ix_expenses_category_date', 'category_id', 'expense_date'),
+    )
     
     description_ar = db.Column(db.Text, nullable=False)
     description_en = db.Column(db.Text)
@@ -44,3 +52,41 @@ class Expense(BaseModel):
         
         return data
 
+class RecurringExpense(BaseModel):
+    """تعريف مصروف متكرر (إيجار، رواتب، مرافق) يُرحَّل تلقائياً في كل فترة"""
+    __tablename__ = 'recurring_expenses'
+    
+    description_ar = db.Column(db.Text, nullable=False)
+    description_en = db.Column(db.Text)
+    amount = db.Column(db.Numeric(15, 2), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('expense_categories.id'), nullable=False)
+    cadence = db.Column(db.String(50), nullable=False)  # شهري، ربع سنوي، سنوي
+    start_date = db.Column(db.Date, nullable=False)  # أول استحقاق؛ يحدد يوم الترحيل في الشهر
+    end_date = db.Column(db.Date)
+    is_active = db.Column(db.Boolean, default=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # يُسجَّل باسمه المصروف
+    notes = db.Column(db.Text)
+    
+    category = db.relationship('ExpenseCategory')
+    postings = db.relationship('RecurringExpensePosting', backref='template', lazy=True, cascade='all, delete-orphan')
+    
+    def to_dict(self):
+        """Convert to dictionary with proper decimal handling"""
+        data = super().to_dict()
+        data['amount'] = float(self.amount) if self.amount is not None else None
+        data['start_date'] = self.start_date.isoformat() if self.start_date else None
+        data['end_date'] = self.end_date.isoformat() if self.end_date else None
+        data['category_name_ar'] = self.category.name_ar if self.category else None
+        data['category_name_en'] = self.category.name_en if self.category else None
+        return data
+
+class RecurringExpensePosting(BaseModel):
+    """ترحيل فترة واحدة من مصروف متكرر؛ المفتاح (template_id, period_key) يمنع الترحيل المزدوج"""
+    __tablename__ = 'recurring_expense_postings'
+    __table_args__ = (
+        db.UniqueConstraint('template_id', 'period_key', name='uq_recurring_expense_postings_period'),
+    )
+    
+    template_id = db.Column(db.Integer, db.ForeignKey('recurring_expenses.id', ondelete='CASCADE'), nullable=False)
+    period_key = db.Column(db.String(7), nullable=False)  # YYYY-MM of the occurrence
+    expense_id = db.Column(db.Integer, db.ForeignKey('expenses.id', ondelete='SET NULL'))
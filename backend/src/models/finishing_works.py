@@ -41,6 +41,9 @@ class FinishingWork(BaseModel):
 
 class FinishingWorkExpense(BaseModel):
     __tablename__ = 'finishing_work_expenses'
+    __table_args__ = (
+        db.Index('ix_finishing_work_expenses_expense_date', 'expense_date'),
+    )
     
     finishing_work_id = db.Column(db.Integer, db.ForeignKey('finishing_works.id'), nullable=False)
     description_ar = db.Column(db.Text, nullable=False)
@@ -0,0 +1,82 @@
+from .base import db, BaseModel
+
+ACCOUNT_TYPES = ('asset', 'liability', 'equity', 'revenue', 'expense')
+# Account types whose balance is debit minus credit; the others are credit minus debit
+DEBIT_NORMAL_TYPES = ('asset', 'expense')
+
+# دليل الحسابات الافتراضي: (الكود، الاسم بالعربية، الاسم بالإنجليزية، النوع)
+CHART_OF_ACCOUNTS = [
+    ('1000', 'الخزنة', 'Cashier', 'asset'),
+    ('2100', 'عمولات مستحقة للبائعين', 'Commissions payable', 'liability'),
+    ('2200', 'مستحقات أعمال التشطيب', 'Finishing works payable', 'liability'),  # لا تمر بالخزنة
+    ('3000', 'رأس المال والأرصدة الافتتاحية', 'Owner equity and opening balances', 'equity'),
+    ('4000', 'إيرادات عمولات المبيعات', 'Sales commission revenue', 'revenue'),
+    ('4010', 'خصومات مكتسبة على المبيعات', 'Sales discounts earned', 'revenue'),
+    ('4100', 'إيرادات الإيجار', 'Rental income', 'revenue'),
+    ('5000', 'المصروفات العامة', 'General expenses', 'expense'),
+    ('5100', 'تكاليف التشطيبات', 'Finishing works costs', 'expense'),
+    ('5200', 'عمولات البائعين ومديري المبيعات', 'Sales commissions expense', 'expense'),
+    ('5300', 'ضرائب المبيعات', 'Sales taxes', 'expense'),
+    ('5400', 'رسوم المبيعات', 'Sales fees', 'expense'),
+]
+
+class Account(BaseModel):
+    """حساب في دليل الحسابات"""
+    __tablename__ = 'accounts'
+
+    code = db.Column(db.String(20), unique=True, nullable=False)
+    name_ar = db.Column(db.String(200), nullable=False)
+    name_en = db.Column(db.String(200))
+    account_type = db.Column(db.String(20), nullable=False)  # asset, liability, equity, revenue, expense
+    is_active = db.Column(db.Boolean, nullable=False, default=True)
+
+    @property
+    def debit_normal(self):
+        return self.account_type in DEBIT_NORMAL_TYPES
+
+class JournalEntry(BaseModel):
+    """قيد يومية لمستند مصدر واحد (بيع، دفعة إيجار، مصروف...)؛ يعاد بناؤه عند تعديل المستند"""
+    __tablename__ = 'journal_entries'
+    __table_args__ = (
+        db.UniqueConstraint('source_type', 'source_id', name='uq_journal_entries_source'),
+        db.Index('ix_journal_entries_date', 'entry_date'),
+    )
+
+    entry_date = db.Column(db.Date, nullable=False)
+    source_type = db.Column(db.String(50), nullable=False)  # sale, rental_payment, expense, ...
+    source_id = db.Column(db.Integer, nullable=False)
+    description = db.Column(db.Text)
+
+    lines = db.relationship('JournalLine', backref='entry', lazy=True, passive_deletes=True)
+
+class JournalLine(BaseModel):
+    """طرف مدين أو دائن في قيد؛ تاريخ القيد مكرر هنا لاستعلامات دفتر الأستاذ"""
+    __tablename__ = 'journal_lines'
+    __table_args__ = (
+        db.Index('ix_journal_lines_entry', 'entry_id'),
+        # Account ledger: WHERE account_id = ? AND entry_date BETWEEN ? AND ?
+        db.Index('ix_journal_lines_account_date', 'account_id', 'entry_date'),
+    )
+
+    entry_id = db.Column(db.Integer, db.ForeignKey('journal_entries.id', ondelete='CASCADE'), nullable=False)
+    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False)
+    entry_date = db.Column(db.Date, nullable=False)
+    debit = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    credit = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+
+class AccountBalanceMonthly(BaseModel):
+    """مجاميع المدين والدائن لكل حساب شهرياً، تحدث تزايدياً مع كل ترحيل"""
+    __tablename__ = 'account_balances_monthly'
+    __table_args__ = (
+        db.UniqueConstraint('account_id', 'month', name='uq_account_balances_account_month'),
+        # Trial balance and statements: WHERE month BETWEEN ? AND ? GROUP BY account_id
+        db.Index('ix_account_balances_month', 'month', 'account_id'),
+    )
+
+    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False)
+    month = db.Column(db.Date, nullable=False)  # أول يوم في الشهر
+    debit = db.Column(db.Numeric(18, 2), nullable=False, default=0)
+    credit = db.Column(db.Numeric(18, 2), nullable=False, default=0)
+
+    KEY_COLUMNS = ('account_id', 'month')
+    INCREMENT_COLUMNS = ('debit', 'credit')
@@ -0,0 +1,48 @@
+from .base import db, BaseModel
+
+class ClosedPeriod(BaseModel):
+    """شهر محاسبي مغلق مع لقطة ثابتة لمجاميعه؛ لا تعدل اللقطة، وإعادة فتح الشهر تحذفها"""
+    __tablename__ = 'closed_periods'
+
+    month = db.Column(db.Date, unique=True, nullable=False)  # أول يوم في الشهر
+    sale_count = db.Column(db.Integer, nullable=False, default=0)
+    sales_volume = db.Column(db.Numeric(18, 2), nullable=False, default=0)
+    company_commission = db.Column(db.Numeric(18, 2), nullable=False, default=0)
+    net_company_revenue = db.Column(db.Numeric(18, 2), nullable=False, default=0)
+    commissions = db.Column(db.Numeric(18, 2), nullable=False, default=0)  # عمولات البائعين ومديري المبيعات
+    total_taxes = db.Column(db.Numeric(18, 2), nullable=False, default=0)
+    rental_income = db.Column(db.Numeric(18, 2), nullable=False, default=0)
+    expenses_total = db.Column(db.Numeric(18, 2), nullable=False, default=0)
+    finishing_costs = db.Column(db.Numeric(18, 2), nullable=False, default=0)
+    cashier_closing_balance = db.Column(db.Numeric(18, 2), nullable=False, default=0)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    notes = db.Column(db.Text)
+
+    # Relationships
+    user = db.relationship('User', backref=db.backref('closed_periods', lazy=True))
+    expenses = db.relationship('ClosedPeriodExpense', backref='period', lazy=True, passive_deletes=True)
+
+    SUMMARY_COLUMNS = ('sale_count', 'sales_volume', 'company_commission', 'net_company_revenue', 'commissions',
+                       'total_taxes', 'rental_income', 'expenses_total', 'finishing_costs')
+
+    def to_dict(self):
+        """Convert to dictionary with proper decimal handling"""
+        data = super().to_dict()
+        for column in self.SUMMARY_COLUMNS + ('cashier_closing_balance',):
+            if column != 'sale_count':
+                data[column] = float(getattr(self, column) or 0)
+        data['month'] = self.month.strftime('%Y-%m')
+        data['user_name'] = f"{self.user.first_name} {self.user.last_name}" if self.user else None
+        return data
+
+class ClosedPeriodExpense(BaseModel):
+    """مصروفات شهر مغلق حسب الفئة"""
+    __tablename__ = 'closed_period_expenses'
+    __table_args__ = (
+        db.UniqueConstraint('period_id', 'category_id', name='uq_closed_period_expenses_category'),
+    )
+
+    period_id = db.Column(db.Integer, db.ForeignKey('closed_periods.id', ondelete='CASCADE'), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('expense_categories.id'), nullable=False)
+    total = db.Column(db.Numeric(18, 2), nullable=False, default=0)
+    expense_count = db.Column(db.Integer, nullable=False, default=0)
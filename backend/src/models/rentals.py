@@ -1,5 +1,13 @@
 from .base import db, BaseModel
 
+# حالات دفعات الإيجار؛ الدفعات المدفوعة فقط تؤثر على الخزنة والإيرادات
+PAYMENT_STATUS_PAID = 'مدفوعة'
+PAYMENT_STATUS_DUE = 'مستحقة'
+PAYMENT_STATUS_OVERDUE = 'متأخرة'
+
+# عدد الأشهر بين دفعتين لكل دورية سداد
+PAYMENT_FREQUENCY_MONTHS = {'شهري': 1, 'ربع سنوي': 3, 'سنوي': 12}
+
 class Rental(BaseModel):
     __tablename__ = 'rentals'
     
@@ -37,6 +45,13 @@ class Rental(BaseModel):
 
 class RentalPayment(BaseModel):
     __tablename__ = 'rental_payments'
+    __table_args__ = (
+        db.Index('ix_rental_payments_payment_date', 'payment_date'),
+        # Schedule regeneration: a rental's payments from a date on
+        db.Index('ix_rental_payments_rental_date', 'rental_id', 'payment_date'),
+        # Overdue detection and aging: WHERE status = ? AND payment_date < ?
+        db.Index('ix_rental_payments_status_date', 'status', 'payment_date'),
+    )
     
     rental_id = db.Column(db.Integer, db.ForeignKey('rentals.id'), nullable=False)
     payment_date = db.Column(db.Date, nullable=False)
@@ -62,3 +77,21 @@ class RentalPayment(BaseModel):
         
         return data
 
+class RentalArrears(BaseModel):
+    """ملخص المتأخرات لكل عقد إيجار (مستأجر)، يعاد بناؤه من الدفعات المتأخرة"""
+    __tablename__ = 'rental_arrears'
+    
+    rental_id = db.Column(db.Integer, db.ForeignKey('rentals.id', ondelete='CASCADE'), unique=True, nullable=False)
+    tenant_name = db.Column(db.String(100), nullable=False)
+    unit_id = db.Column(db.Integer, db.ForeignKey('units.id'), nullable=False)
+    overdue_count = db.Column(db.Integer, nullable=False, default=0)
+    overdue_amount = db.Column(db.Numeric(18, 2), nullable=False, default=0)
+    oldest_due_date = db.Column(db.Date, nullable=False)
+    
+    def to_dict(self):
+        """Convert to dictionary with proper decimal handling"""
+        data = super().to_dict()
+        data['overdue_amount'] = float(self.overdue_amount or 0)
+        if data.get('oldest_due_date'):
+            data['oldest_due_date'] = data['oldest_due_date'].isoformat()
+        return data
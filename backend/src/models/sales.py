@@ -1,8 +1,18 @@
 from .base import db, BaseModel
+from .dynamic_calculations import CalculationRuleSet
+from src.utils.breakdown_codec import unpack_breakdown
 import json
+from decimal import Decimal
+
+# Breakdown totals stored on the sale row; fees and discounts are summed from the lines
+BREAKDOWN_TOTAL_COLUMNS = ['company_commission', 'salesperson_commission', 'sales_manager_commission',
+                           'total_taxes', 'net_company_revenue']
 
 class Sale(BaseModel):
     __tablename__ = 'sales'
+    __table_args__ = (
+        db.Index('ix_sales_sale_date', 'sale_date'),
+    )
     
     unit_id = db.Column(db.Integer, db.ForeignKey('units.id'), nullable=False)
     client_name = db.Column(db.String(100), nullable=False)
@@ -18,8 +28,13 @@ class Sale(BaseModel):
     total_taxes = db.Column(db.Numeric(15, 2), default=0)
     net_company_revenue = db.Column(db.Numeric(15, 2), default=0)
     
-    # Store detailed calculation breakdown as JSON
-    calculation_breakdown = db.Column(db.Text)  # JSON object with detailed calculations
+    # Immutable snapshot of the calculation rules the breakdown was computed with
+    rule_set_id = db.Column(db.Integer, db.ForeignKey('calculation_rule_sets.id'))
+    
+    # Detailed calculation breakdown lives in sale_calculation_lines; this column only holds legacy JSON
+    calculation_breakdown = db.Column(db.Text)
+    # Packed copy of a legacy JSON breakdown, kept for audit after conversion to lines
+    calculation_breakdown_archive = db.deferred(db.Column(db.LargeBinary))
     custom_fields_data = db.Column(db.Text)  # JSON object for custom field values
     
     notes = db.Column(db.Text)
@@ -29,19 +44,46 @@ class Sale(BaseModel):
                                  backref=db.backref('sales_as_salesperson', lazy=True))
     sales_manager = db.relationship('User', foreign_keys=[sales_manager_id], 
                                    backref=db.backref('sales_as_manager', lazy=True))
+    calculation_lines = db.relationship('SaleCalculationLine', backref='sale', lazy=True,
+                                        cascade='all, delete-orphan',
+                                        order_by='SaleCalculationLine.line_index')
+    tax_lines = db.relationship('SaleTaxLine', backref='sale', lazy=True, cascade='all, delete-orphan')
     
     def get_calculation_breakdown(self):
         """Get calculation breakdown as JSON object"""
+        if self.calculation_lines:
+            rules = CalculationRuleSet.get_compiled(self.rule_set_id) if self.rule_set_id else {}
+            sale_values = {column: getattr(self, column)
+                           for column in ['sale_price', 'rule_set_id'] + BREAKDOWN_TOTAL_COLUMNS}
+            return SaleCalculationLine.build_breakdown(
+                sale_values, self.unit.type if self.unit else None,
+                [line.to_values() for line in self.calculation_lines], rules
+            )
         if self.calculation_breakdown:
             try:
                 return json.loads(self.calculation_breakdown)
             except:
                 return {}
+        if self.calculation_breakdown_archive:
+            try:
+                return unpack_breakdown(self.calculation_breakdown_archive)
+            except ValueError:
+                return {}
         return {}
     
     def set_calculation_breakdown(self, breakdown):
-        """Set calculation breakdown from dictionary"""
-        self.calculation_breakdown = json.dumps(breakdown, ensure_ascii=False, indent=2)
+        """Set calculation breakdown from dictionary, storing one line per applied rule
+
+        The rules are referenced through breakdown['rule_set_id']; breakdowns computed without
+        a snapshot get one built from their applied rules.
+        """
+        rule_set_id = breakdown.get('rule_set_id')
+        if rule_set_id is None:
+            rule_set_id = CalculationRuleSet.get_or_create(CalculationRuleSet.rules_from_breakdown(breakdown)).id
+        self.rule_set_id = rule_set_id
+        self.calculation_lines = SaleCalculationLine.from_breakdown(breakdown)
+        self.tax_lines = SaleTaxLine.from_breakdown(breakdown)
+        self.calculation_breakdown = None
     
     def get_custom_fields_data(self):
         """Get custom fields data as JSON object"""
@@ -59,6 +101,7 @@ class Sale(BaseModel):
     def to_dict(self):
         """Convert to dictionary with proper decimal handling"""
         data = super().to_dict()
+        data.pop('calculation_breakdown_archive', None)
         
         # Convert Decimal fields to float for JSON serialization
         decimal_fields = ['sale_price', 'company_commission', 'salesperson_commission', 
@@ -84,3 +127,194 @@ class Sale(BaseModel):
         
         return data
 
+
+class SaleCalculationLine(BaseModel):
+    """Amounts of one applied calculation rule of a sale; the rule itself is read from the sale's rule set snapshot"""
+    __tablename__ = 'sale_calculation_lines'
+    __table_args__ = (
+        db.Index('ix_sale_calculation_lines_sale', 'sale_id', 'line_index'),
+    )
+    
+    sale_id = db.Column(db.Integer, db.ForeignKey('sales.id'), nullable=False)
+    line_index = db.Column(db.Integer, nullable=False)
+    rule_id = db.Column(db.Integer)  # معرف القاعدة داخل لقطة القواعد
+    base_amount = db.Column(db.Numeric(15, 2), nullable=False)
+    amount = db.Column(db.Numeric(15, 2), nullable=False)
+    
+    @classmethod
+    def from_breakdown(cls, breakdown):
+        """Build line instances from a calculation breakdown's applied_rules"""
+        return [
+            cls(
+                line_index=index,
+                rule_id=rule.get('rule_id'),
+                base_amount=rule['base_amount'],
+                amount=rule['calculated_amount']
+            )
+            for index, rule in enumerate(breakdown.get('applied_rules', []))
+        ]
+    
+    def to_values(self):
+        """Line fields needed by build_breakdown"""
+        return {'rule_id': self.rule_id, 'base_amount': self.base_amount, 'amount': self.amount}
+    
+    @staticmethod
+    def build_breakdown(sale_values, unit_type, lines, rules):
+        """Rebuild the calculation breakdown API shape from a sale's columns, its lines and
+        the {rule id: rule entry} map of its rule set snapshot"""
+        applied_rules = []
+        total_fees = 0.0
+        total_discounts = 0.0
+        for line in lines:
+            rule = rules.get(line['rule_id'], {})
+            amount = float(line['amount'])
+            if rule.get('rule_type') == 'fee':
+                total_fees += amount
+            elif rule.get('rule_type') == 'discount':
+                total_discounts += amount
+            applied_rules.append({
+                'rule_id': line['rule_id'],
+                'rule_name_ar': rule.get('name_ar'),
+                'rule_name_en': rule.get('name_en'),
+                'rule_type': rule.get('rule_type'),
+                'calculation_type': rule.get('calculation_type'),
+                'value': rule.get('value'),
+                'calculated_amount': amount,
+                'base_amount': float(line['base_amount'])
+            })
+        
+        totals = {column: float(sale_values[column] or 0) for column in BREAKDOWN_TOTAL_COLUMNS}
+        totals['total_fees'] = total_fees
+        totals['total_discounts'] = total_discounts
+        
+        return {
+            'base_amount': float(sale_values['sale_price']),
+            'unit_type': unit_type,
+            'rule_set_id': sale_values['rule_set_id'],
+            'applied_rules': applied_rules,
+            'totals': totals
+        }
+    
+    @classmethod
+    def get_breakdowns(cls, sale_items):
+        """Attach rebuilt breakdowns to serialized sale dicts that have calculation lines
+
+        sale_items are dicts carrying the sale columns and unit_type, as produced by the
+        sales list serializer. Lines for all sales are read with one query per chunk and
+        each rule set snapshot is compiled once.
+        """
+        items_by_id = {item['id']: item for item in sale_items}
+        sale_ids = list(items_by_id)
+        lines_by_sale = {}
+        for start in range(0, len(sale_ids), 1000):
+            chunk = sale_ids[start:start + 1000]
+            rows = db.session.execute(
+                db.select(cls.sale_id, cls.rule_id, cls.base_amount, cls.amount)
+                .where(cls.sale_id.in_(chunk))
+                .order_by(cls.sale_id, cls.line_index)
+            ).mappings()
+            for row in rows:
+                lines_by_sale.setdefault(row['sale_id'], []).append(row)
+        
+        for sale_id, lines in lines_by_sale.items():
+            item = items_by_id[sale_id]
+            rules = CalculationRuleSet.get_compiled(item['rule_set_id']) if item['rule_set_id'] else {}
+            item['calculation_breakdown'] = cls.build_breakdown(item, item.get('unit_type'), lines, rules)
+        return sale_items
+
+
+class SaleTaxLine(BaseModel):
+    """ضريبة محسوبة على بيع بقاعدة من نوع tax، بالاسم والنسبة وقت البيع؛ مصدر تقرير الإقرار الضريبي"""
+    __tablename__ = 'sale_tax_lines'
+    __table_args__ = (
+        # Tax report: sales in a date range (ix_sales_sale_date) joined to their lines
+        db.Index('ix_sale_tax_lines_sale', 'sale_id', 'rule_id'),
+    )
+    
+    sale_id = db.Column(db.Integer, db.ForeignKey('sales.id'), nullable=False)
+    rule_id = db.Column(db.Integer)
+    rule_name_ar = db.Column(db.String(200))
+    rule_name_en = db.Column(db.String(200))
+    calculation_type = db.Column(db.String(50), nullable=False)  # percentage, fixed_amount
+    rate = db.Column(db.Numeric(15, 4), nullable=False)  # قيمة القاعدة: نسبة مئوية أو مبلغ ثابت
+    base_amount = db.Column(db.Numeric(15, 2), nullable=False)
+    amount = db.Column(db.Numeric(15, 2), nullable=False)
+    
+    @staticmethod
+    def values_from_breakdown(breakdown):
+        """Column values of the tax lines in a calculation breakdown's applied_rules"""
+        return [
+            {
+                'rule_id': rule.get('rule_id'),
+                'rule_name_ar': rule.get('rule_name_ar'),
+                'rule_name_en': rule.get('rule_name_en'),
+                'calculation_type': rule['calculation_type'],
+                'rate': rule['value'],
+                'base_amount': rule['base_amount'],
+                'amount': rule['calculated_amount'],
+            }
+            for rule in breakdown.get('applied_rules', []) if rule.get('rule_type') == 'tax'
+        ]
+    
+    @classmethod
+    def from_breakdown(cls, breakdown):
+        return [cls(**values) for values in cls.values_from_breakdown(breakdown)]
+
+class SalesPerformanceMonthly(BaseModel):
+    """أداء البائعين ومديري المبيعات شهرياً، يحدث تزايدياً مع كل إضافة أو تعديل أو حذف بيع"""
+    __tablename__ = 'sales_performance_monthly'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'role', 'month', name='uq_sales_performance_user_role_month'),
+        # Leaderboards: WHERE role = ? AND month BETWEEN ? AND ? GROUP BY user_id
+        db.Index('ix_sales_performance_role_month', 'role', 'month', 'user_id'),
+    )
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    role = db.Column(db.String(20), nullable=False)  # salesperson, sales_manager
+    month = db.Column(db.Date, nullable=False)  # أول يوم في الشهر
+    sale_count = db.Column(db.Integer, nullable=False, default=0)
+    sales_volume = db.Column(db.Numeric(18, 2), nullable=False, default=0)
+    commission = db.Column(db.Numeric(18, 2), nullable=False, default=0)
+    
+    KEY_COLUMNS = ('user_id', 'role', 'month')
+    INCREMENT_COLUMNS = ('sale_count', 'sales_volume', 'commission')
+    
+    @staticmethod
+    def contributions(sale_date, sale_price, salesperson_id, salesperson_commission,
+                      sales_manager_id, sales_manager_commission):
+        """{(user_id, role, month): (sale_count, sales_volume, commission)} a sale adds to the aggregate"""
+        if not sale_date:
+            return {}
+        month = sale_date.replace(day=1)
+        price = Decimal(str(sale_price or 0))
+        result = {}
+        for role, user_id, commission in (('salesperson', salesperson_id, salesperson_commission),
+                                          ('sales_manager', sales_manager_id, sales_manager_commission)):
+            if user_id:
+                result[(user_id, role, month)] = (1, price, Decimal(str(commission or 0)))
+        return result
+    
+    @staticmethod
+    def deltas(before, after):
+        """Rows for upsert_increment turning the before contributions into the after ones"""
+        rows = []
+        for key in before.keys() | after.keys():
+            old = before.get(key, (0, Decimal(0), Decimal(0)))
+            new = after.get(key, (0, Decimal(0), Decimal(0)))
+            change = tuple(new_value - old_value for new_value, old_value in zip(new, old))
+            if any(change):
+                user_id, role, month = key
+                rows.append({'user_id': user_id, 'role': role, 'month': month, 'sale_count': change[0],
+                             'sales_volume': change[1], 'commission': change[2]})
+        return rows
+    
+    @classmethod
+    def record_change(cls, before, after):
+        """Move the aggregate from the before contributions to the after ones, in the current transaction"""
+        from src.utils.db_utils import upsert_increment
+        upsert_increment(cls, cls.KEY_COLUMNS, cls.INCREMENT_COLUMNS, cls.deltas(before, after))
+    
+    @classmethod
+    def sale_contributions(cls, sale):
+        return cls.contributions(sale.sale_date, sale.sale_price, sale.salesperson_id, sale.salesperson_commission,
+                                 sale.sales_manager_id, sale.sales_manager_commission)
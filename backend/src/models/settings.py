@@ -1,6 +1,13 @@
 from .base import db, BaseModel
 import json
 
+# Cashier transaction types grouped by their effect on the cashier balance
+INCOME_TRANSACTION_TYPES = ['sale_revenue', 'rental_income', 'deposit']
+EXPENSE_TRANSACTION_TYPES = ['expense_payment', 'salesperson_commission_payment',
+                             'sales_manager_commission_payment', 'withdrawal']
+# Corrections whose stored amount already carries its sign
+SIGNED_TRANSACTION_TYPES = ['sale_revenue_adjustment']
+
 class FinancialSetting(BaseModel):
     __tablename__ = 'financial_settings'
     
@@ -115,6 +122,13 @@ class CashierBalance(BaseModel):
 
 class CashierTransaction(BaseModel):
     __tablename__ = 'cashier_transactions'
+    __table_args__ = (
+        db.Index('ix_cashier_transactions_date', 'transaction_date'),
+        db.Index('ix_cashier_transactions_type_date', 'transaction_type', 'transaction_date'),
+        db.Index('ix_cashier_transactions_reference', 'reference_id', 'transaction_type'),
+        # Covers balance rollups (SUM of signed amount up to a date) without touching the table rows
+        db.Index('ix_cashier_transactions_rollup', 'transaction_date', 'transaction_type', 'amount'),
+    )
     
     transaction_date = db.Column(db.DateTime, nullable=False)
     amount = db.Column(db.Numeric(15, 2), nullable=False)  # موجب للإيداع، سالب للسحب
@@ -126,6 +140,16 @@ class CashierTransaction(BaseModel):
     # Relationships
     user = db.relationship('User', backref=db.backref('cashier_transactions', lazy=True))
     
+    @classmethod
+    def signed_amount(cls):
+        """SQL expression for the transaction's effect on the cashier balance"""
+        return db.case(
+            (cls.transaction_type.in_(INCOME_TRANSACTION_TYPES), db.func.abs(cls.amount)),
+            (cls.transaction_type.in_(EXPENSE_TRANSACTION_TYPES), -db.func.abs(cls.amount)),
+            (cls.transaction_type.in_(SIGNED_TRANSACTION_TYPES), cls.amount),
+            else_=0
+        )
+    
     def to_dict(self):
         """Convert to dictionary with proper decimal handling"""
         data = super().to_dict()
@@ -1,7 +1,22 @@
+from datetime import date
 from .base import db, BaseModel
 
+# حالات الوحدة التي تُشتق من فترات الإشغال
+UNIT_STATUS_AVAILABLE = 'متاحة'
+UNIT_STATUS_SOLD = 'مباعة'
+UNIT_STATUS_RENTED = 'مؤجرة'
+
+# نهاية مفتوحة لفترات البيع، بدلاً من NULL حتى تبقى شروط التداخل قابلة للفهرسة
+OPEN_END_DATE = date(9999, 12, 31)
+
 class Unit(BaseModel):
     __tablename__ = 'units'
+    __table_args__ = (
+        # Unit search: type/status filters and facets with a price range
+        db.Index('ix_units_type_status_price', 'type', 'status', 'price'),
+        db.Index('ix_units_price', 'price'),
+        # The FULLTEXT ngram index over code/address/descriptions is MySQL-only, see migration 0011
+    )
     
     code = db.Column(db.String(50), unique=True, nullable=False)
     type = db.Column(db.String(50), nullable=False)  # شقة، تجاري، إداري، طبي
@@ -27,3 +42,25 @@ class Unit(BaseModel):
             data['price'] = float(data['price'])
         return data
 
+class UnitOccupancy(BaseModel):
+    """فترة إشغال وحدة [start_date, end_date) ناتجة عن بيع أو إيجار"""
+    __tablename__ = 'unit_occupancy'
+    __table_args__ = (
+        db.UniqueConstraint('kind', 'reference_id', name='uq_unit_occupancy_reference'),
+        # Overlap check for one unit: unit_id = ? AND start_date < ? AND end_date > ?
+        db.Index('ix_unit_occupancy_unit_dates', 'unit_id', 'start_date', 'end_date'),
+        # Point-in-time status sync and availability over all units
+        db.Index('ix_unit_occupancy_dates', 'start_date', 'end_date'),
+    )
+
+    unit_id = db.Column(db.Integer, db.ForeignKey('units.id', ondelete='CASCADE'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # sale، rental
+    reference_id = db.Column(db.Integer, nullable=False)  # sales.id أو rentals.id
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False, default=OPEN_END_DATE)
+
+    def to_dict(self):
+        data = super().to_dict()
+        data['start_date'] = self.start_date.isoformat() if self.start_date else None
+        data['end_date'] = None if self.end_date == OPEN_END_DATE else self.end_date.isoformat()
+        return data
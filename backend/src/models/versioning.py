@@ -0,0 +1,61 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from .base import db, BaseModel
+
+class TableVersion(BaseModel):
+    """Per-table change counter, bumped in the same transaction as every write to that table"""
+    __tablename__ = 'table_versions'
+    
+    table_name = db.Column(db.String(100), unique=True, nullable=False)
+    version = db.Column(db.BigInteger, default=0, nullable=False)
+    
+    @classmethod
+    def get_versions(cls, table_names):
+        """Get {table_name: version}, or None if any table is not registered yet"""
+        rows = db.session.execute(
+            db.select(cls.table_name, cls.version).where(cls.table_name.in_(table_names))
+        ).all()
+        versions = {table_name: version for table_name, version in rows}
+        if len(versions) != len(set(table_names)):
+            return None
+        return versions
+    
+    @classmethod
+    def bump(cls, *table_names, connection=None):
+        """Increment the version of the given tables within the current transaction"""
+        table_names = [name for name in set(table_names) if name != cls.__tablename__]
+        if not table_names:
+            return
+        statement = cls.__table__.update().where(
+            cls.__table__.c.table_name.in_(table_names)
+        ).values(version=cls.__table__.c.version + 1)
+        (connection or db.session.connection()).execute(statement)
+    
+    @classmethod
+    def ensure_registered(cls):
+        """Create a version row for every mapped table that does not have one yet"""
+        existing = set(db.session.execute(db.select(cls.table_name)).scalars())
+        for table_name in db.metadata.tables:
+            if table_name not in existing and table_name != cls.__tablename__:
+                db.session.add(cls(table_name=table_name, version=1))
+        db.session.commit()
+
+@event.listens_for(Session, 'after_flush')
+def _bump_flushed_tables(session, flush_context):
+    """Bump versions for tables touched by an ORM flush"""
+    table_names = set()
+    for instance in session.new | session.deleted:
+        table_names.add(instance.__table__.name)
+    for instance in session.dirty:
+        if session.is_modified(instance, include_collections=False):
+            table_names.add(instance.__table__.name)
+    TableVersion.bump(*table_names, connection=session.connection())
+
+@event.listens_for(Session, 'do_orm_execute')
+def _bump_bulk_statement_tables(orm_execute_state):
+    """Bump versions for ORM-enabled bulk INSERT/UPDATE/DELETE statements, which skip the flush"""
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None:
+        TableVersion.bump(mapper.local_table.name, connection=orm_execute_state.session.connection())
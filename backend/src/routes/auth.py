@@ -3,6 +3,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from src.models import db, User, Role, Permission, RolePermission
 from src.utils.auth_utils import admin_required, permission_required
+from src.utils.cache_utils import conditional_get
 
 auth_bp = Blueprint("auth", __name__)
 
@@ -67,12 +68,14 @@ def get_current_user():
 # --- User Management (Admin Only) ---
 @auth_bp.route("/users", methods=["GET"])
 @permission_required("manage_users", "view")
+@conditional_get("users", "roles")
 def get_users():
     users = User.query.all()
     return jsonify([user.to_dict() for user in users]), 200
 
 @auth_bp.route("/users/<int:user_id>", methods=["GET"])
 @permission_required("manage_users", "view")
+@conditional_get("users", "roles")
 def get_user(user_id):
     user = User.query.get(user_id)
     if not user:
@@ -110,6 +113,7 @@ def delete_user(user_id):
 # --- Role Management (Admin Only) ---
 @auth_bp.route("/roles", methods=["GET"])
 @permission_required("manage_roles", "view")
+@conditional_get("roles")
 def get_roles():
     roles = Role.query.all()
     return jsonify([role.to_dict() for role in roles]), 200
@@ -162,12 +166,14 @@ def delete_role(role_id):
 # --- Permission Management (Admin Only) ---
 @auth_bp.route("/permissions", methods=["GET"])
 @permission_required("manage_roles", "view") # Assuming manage_roles permission covers viewing permissions
+@conditional_get("permissions")
 def get_permissions():
     permissions = Permission.query.all()
     return jsonify([p.to_dict() for p in permissions]), 200
 
 @auth_bp.route("/roles/<int:role_id>/permissions", methods=["GET"])
 @permission_required("manage_roles", "view")
+@conditional_get("role_permissions_detail", "roles")
 def get_role_permissions(role_id):
     role = Role.query.get(role_id)
     if not role:
@@ -216,6 +222,7 @@ def update_role_permissions(role_id):
 
 @auth_bp.route("/permissions/all", methods=["GET"])
 @permission_required("manage_roles", "view")
+@conditional_get("permissions")
 def get_all_permissions():
     permissions = Permission.query.all()
     return jsonify([p.to_dict() for p in permissions]), 200
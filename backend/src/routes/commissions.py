@@ -0,0 +1,102 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import get_jwt_identity
+from src.models import User, CommissionAccrual, CommissionSettlementRun
+from src.services.commission_service import CommissionService
+from src.utils.auth_utils import permission_required
+from src.utils.cache_utils import conditional_get
+from src.utils.serialization import ModelSerializer, json_response
+from datetime import datetime
+
+commissions_bp = Blueprint("commissions", __name__)
+
+ACCRUALS_MAX_LIMIT = 5000
+
+accrual_serializer = ModelSerializer(
+    CommissionAccrual,
+    extra_columns={"user_name": User.first_name + " " + User.last_name},
+    joins=[(User, User.id == CommissionAccrual.user_id)],
+)
+
+def _parse_date_arg(value):
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+def _parse_user_ids(value):
+    return [int(user_id) for user_id in value.split(",") if user_id.strip()] if value else None
+
+@commissions_bp.route("/commissions/unpaid", methods=["GET"])
+@permission_required("manage_cashier", "view")
+@conditional_get("commission_accruals", "users")
+def get_unpaid_commissions():
+    try:
+        period_end = _parse_date_arg(request.args.get("period_end"))
+        user_ids = _parse_user_ids(request.args.get("user_ids"))
+    except ValueError:
+        return jsonify({"msg": "Invalid period_end or user_ids"}), 400
+    balances = CommissionService.unpaid_balances(period_end, user_ids)
+    return json_response(balances)
+
+@commissions_bp.route("/commissions/accruals", methods=["GET"])
+@permission_required("manage_cashier", "view")
+@conditional_get("commission_accruals", "users")
+def get_commission_accruals():
+    """Accruals in id order, paged with after_id/limit"""
+    status = request.args.get("status")
+    user_id = request.args.get("user_id", type=int)
+    sale_id = request.args.get("sale_id", type=int)
+    run_id = request.args.get("settlement_run_id", type=int)
+    after_id = request.args.get("after_id", 0, type=int)
+    limit = min(request.args.get("limit", 500, type=int), ACCRUALS_MAX_LIMIT)
+    if limit < 1:
+        return jsonify({"msg": "limit must be a positive integer"}), 400
+
+    statement = accrual_serializer.select().where(CommissionAccrual.id > after_id)
+    if status == "unpaid":
+        statement = statement.where(CommissionAccrual.settlement_run_id.is_(None))
+    elif status == "settled":
+        statement = statement.where(CommissionAccrual.settlement_run_id.isnot(None))
+    if user_id:
+        statement = statement.where(CommissionAccrual.user_id == user_id)
+    if sale_id:
+        statement = statement.where(CommissionAccrual.sale_id == sale_id)
+    if run_id:
+        statement = statement.where(CommissionAccrual.settlement_run_id == run_id)
+    accruals = accrual_serializer.fetch(statement.order_by(CommissionAccrual.id).limit(limit))
+    return json_response(accruals)
+
+@commissions_bp.route("/commissions/settlement_runs", methods=["POST"])
+@permission_required("manage_cashier", "create")
+def create_settlement_run():
+    data = request.get_json() or {}
+    try:
+        period_end = _parse_date_arg(data.get("period_end"))
+    except ValueError:
+        return jsonify({"msg": "Invalid period_end format"}), 400
+    user_ids = data.get("user_ids")
+    if user_ids is not None and not isinstance(user_ids, list):
+        return jsonify({"msg": "user_ids must be a list"}), 400
+
+    try:
+        result = CommissionService.run_settlement(
+            get_jwt_identity(), period_end=period_end, user_ids=user_ids,
+            dry_run=bool(data.get("dry_run")), notes=data.get("notes")
+        )
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    return jsonify(result), 200 if data.get("dry_run") else 201
+
+@commissions_bp.route("/commissions/settlement_runs", methods=["GET"])
+@permission_required("manage_cashier", "view")
+@conditional_get("commission_settlement_runs", "users")
+def get_settlement_runs():
+    runs = CommissionSettlementRun.query.order_by(CommissionSettlementRun.id.desc()).all()
+    return jsonify([run.to_dict() for run in runs]), 200
+
+@commissions_bp.route("/commissions/settlement_runs/<int:run_id>", methods=["GET"])
+@permission_required("manage_cashier", "view")
+@conditional_get("commission_settlement_runs", "commission_accruals", "sales", "units", "users")
+def get_settlement_run(run_id):
+    """A run with its payout statements"""
+    run = CommissionSettlementRun.query.get(run_id)
+    if not run:
+        return jsonify({"msg": "Settlement run not found"}), 404
+    return json_response({**run.to_dict(), "statements": CommissionService.payout_statements(run_id)})
@@ -1,22 +1,32 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from src.models import db
 from src.models.dynamic_calculations import CalculationRule, CustomField, PrintTemplate, ReportConfiguration
 from src.models.user import User
 from src.services.dynamic_calculation_service import DynamicCalculationService
+from src.services.calculation_engine import CalculationEngine, InvalidPreview
+from src.services.rule_expressions import RuleExpressionError
+from src.utils.cache_utils import conditional_get
+from src.utils.serialization import ModelSerializer, json_response
 
 dynamic_calculations_bp = Blueprint('dynamic_calculations', __name__)
 
+calculation_rule_serializer = ModelSerializer(CalculationRule, json_columns={'unit_type_filter': list})
+
 # ==================== Calculation Rules ====================
 
 @dynamic_calculations_bp.route('/calculation-rules', methods=['GET'])
 @jwt_required()
+@conditional_get('calculation_rules')
 def get_calculation_rules():
     """الحصول على جميع قواعد الحساب"""
     try:
-        rules = CalculationRule.query.order_by(CalculationRule.order_index).all()
-        return jsonify({
+        rules = calculation_rule_serializer.fetch(
+            calculation_rule_serializer.select().order_by(CalculationRule.order_index)
+        )
+        return json_response({
             'success': True,
-            'data': [rule.to_dict() for rule in rules]
+            'data': rules
         })
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -36,6 +46,8 @@ def create_calculation_rule():
         
         # التحقق من البيانات المطلوبة
         required_fields = ['name_ar', 'name_en', 'rule_type', 'calculation_type', 'value', 'applies_to']
+        if data.get('calculation_type') == 'expression':
+            required_fields = ['name_ar', 'name_en', 'rule_type', 'expression', 'applies_to']
         for field in required_fields:
             if field not in data:
                 return jsonify({'success': False, 'message': f'Missing required field: {field}'}), 400
@@ -45,7 +57,9 @@ def create_calculation_rule():
             name_en=data['name_en'],
             rule_type=data['rule_type'],
             calculation_type=data['calculation_type'],
-            value=data['value'],
+            value=data.get('value', 0),
+            code=data.get('code') or None,
+            expression=data.get('expression'),
             applies_to=data['applies_to'],
             order_index=data.get('order_index', 0),
             description_ar=data.get('description_ar', ''),
@@ -56,6 +70,11 @@ def create_calculation_rule():
         if 'unit_type_filter' in data:
             rule.set_unit_type_filter(data['unit_type_filter'])
         
+        try:
+            CalculationEngine.validate_rule(rule)
+        except RuleExpressionError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        
         rule.save()
         
         return jsonify({
@@ -80,18 +99,39 @@ def update_calculation_rule(rule_id):
         
         rule = CalculationRule.query.get_or_404(rule_id)
         data = request.get_json()
+        was_active = rule.is_active and rule.applies_to == 'sales'
         
         # تحديث الحقول
-        updateable_fields = ['name_ar', 'name_en', 'rule_type', 'calculation_type', 'value', 
+        updateable_fields = ['name_ar', 'name_en', 'rule_type', 'calculation_type', 'value', 'expression',
                            'applies_to', 'order_index', 'description_ar', 'description_en', 'is_active']
         
         for field in updateable_fields:
             if field in data:
                 setattr(rule, field, data[field])
         
+        # رمز فارغ يعني عدم وجود رمز كما في الإنشاء، حتى لا يتعارض مع قيد التفرد
+        if 'code' in data:
+            rule.code = data['code'] or None
+        
         if 'unit_type_filter' in data:
             rule.set_unit_type_filter(data['unit_type_filter'])
         
+        # تعطيل قاعدة تشير إليها قواعد أخرى يعطل حساب المبيعات
+        if was_active and not (rule.is_active and rule.applies_to == 'sales'):
+            try:
+                with db.session.no_autoflush:
+                    CalculationEngine.validate_removal(rule)
+            except RuleExpressionError as e:
+                db.session.rollback()
+                return jsonify({'success': False, 'message': f'Calculation rule is referenced by another rule: {e}'}), 409
+        
+        try:
+            with db.session.no_autoflush:
+                CalculationEngine.validate_rule(rule)
+        except RuleExpressionError as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'message': str(e)}), 400
+        
         rule.save()
         
         return jsonify({
@@ -115,6 +155,10 @@ def delete_calculation_rule(rule_id):
             return jsonify({'success': False, 'message': 'Access denied. Admin role required.'}), 403
         
         rule = CalculationRule.query.get_or_404(rule_id)
+        try:
+            CalculationEngine.validate_removal(rule)
+        except RuleExpressionError as e:
+            return jsonify({'success': False, 'message': f'Calculation rule is referenced by another rule: {e}'}), 409
         rule.delete()
         
         return jsonify({
@@ -129,6 +173,7 @@ def delete_calculation_rule(rule_id):
 
 @dynamic_calculations_bp.route('/custom-fields/<entity_type>', methods=['GET'])
 @jwt_required()
+@conditional_get('custom_fields')
 def get_custom_fields(entity_type):
     """الحصول على الحقول المخصصة لكيان معين"""
     try:
@@ -190,6 +235,7 @@ def create_custom_field():
 
 @dynamic_calculations_bp.route('/print-templates/<template_type>', methods=['GET'])
 @jwt_required()
+@conditional_get('print_templates')
 def get_print_templates(template_type):
     """الحصول على قوالب الطباعة لنوع معين"""
     try:
@@ -260,7 +306,9 @@ def calculate_preview():
             sale_price=data['sale_price'],
             unit_id=data['unit_id'],
             salesperson_id=data.get('salesperson_id'),
-            sales_manager_id=data.get('sales_manager_id')
+            sales_manager_id=data.get('sales_manager_id'),
+            # نتيجة المعاينة السابقة؛ ترسل {} في أول طلب للحصول على قيم العقد
+            previous=data.get('previous')
         )
         
         return jsonify({
@@ -268,6 +316,8 @@ def calculate_preview():
             'data': calculations
         })
         
+    except InvalidPreview as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
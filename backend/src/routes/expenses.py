@@ -1,13 +1,33 @@
 
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from src.models import db, Expense, ExpenseCategory, CashierBalance, CashierTransaction
+from src.models import db, Expense, ExpenseCategory, RecurringExpense, CashierBalance, CashierTransaction, User
+from src.models.expenses import RECURRENCE_MONTHS
 from src.services.calculation_service import CalculationService
+from src.services.ledger_service import LedgerService
+from src.services.period_service import PeriodService, PeriodClosed
+from src.services.recurring_expense_service import RecurringExpenseService
 from src.utils.auth_utils import permission_required
+from src.utils.cache_utils import conditional_get
+from src.utils.serialization import ModelSerializer
 from datetime import datetime
+from decimal import Decimal
 
 expenses_bp = Blueprint("expenses", __name__)
 
+expense_serializer = ModelSerializer(
+    Expense,
+    extra_columns={
+        "category_name_ar": ExpenseCategory.name_ar,
+        "category_name_en": ExpenseCategory.name_en,
+        "user_name": User.first_name + " " + User.last_name,
+    },
+    joins=[
+        (ExpenseCategory, ExpenseCategory.id == Expense.category_id),
+        (User, User.id == Expense.user_id),
+    ],
+)
+
 @expenses_bp.route("/expense_categories", methods=["POST"])
 @permission_required("manage_expenses", "create")
 def create_expense_category():
@@ -34,6 +54,7 @@ def create_expense_category():
 
 @expenses_bp.route("/expense_categories", methods=["GET"])
 @permission_required("manage_expenses", "view")
+@conditional_get("expense_categories")
 def get_expense_categories():
     categories = ExpenseCategory.query.all()
     return jsonify([category.to_dict() for category in categories]), 200
@@ -88,25 +109,24 @@ def create_expense():
     except ValueError:
         return jsonify({"msg": "Invalid date or amount format"}), 400
 
+    try:
+        PeriodService.check_open(expense_date)
+    except PeriodClosed as e:
+        return jsonify({"msg": str(e)}), 409
+
     new_expense = Expense(
         description_ar=description_ar,
         description_en=description_en,
-        amount=amount,
+        amount=Decimal(str(amount)),
         expense_date=expense_date,
         category_id=category_id,
         user_id=get_jwt_identity(),
         notes=notes
     )
-    new_expense.save()
-
-    # Update cashier balance and record transaction
-    current_balance = CashierBalance.get_current_balance()
-    cashier_impact = CalculationService.calculate_cashier_impact(
-        "expense_payment", new_expense.amount
-    )
-    new_balance = current_balance + cashier_impact
-    CashierBalance.update_balance(new_balance)
+    db.session.add(new_expense)
+    db.session.flush()
 
+    # Record the cashier transaction and post the journal entry
     cashier_transaction = CashierTransaction(
         transaction_date=datetime.utcnow(),
         amount=new_expense.amount,
@@ -115,18 +135,26 @@ def create_expense():
         notes=f"دفع مصروف: {new_expense.description_ar}",
         user_id=get_jwt_identity()
     )
-    cashier_transaction.save()
+    db.session.add(cashier_transaction)
+    LedgerService.sync("expense", [new_expense.id])
+
+    # Update cashier balance; update_balance commits the expense, its transaction and journal entry together
+    cashier_impact = CalculationService.calculate_cashier_impact(
+        "expense_payment", new_expense.amount
+    )
+    CashierBalance.update_balance(Decimal(str(CashierBalance.get_current_balance())) + cashier_impact)
 
     return jsonify({"msg": "Expense created successfully", "expense": new_expense.to_dict()}), 201
 
 @expenses_bp.route("/expenses", methods=["GET"])
 @permission_required("manage_expenses", "view")
+@conditional_get("expenses", "expense_categories", "users")
 def get_expenses():
-    expenses = Expense.query.all()
-    return jsonify([expense.to_dict() for expense in expenses]), 200
+    return expense_serializer.response()
 
 @expenses_bp.route("/expenses/<int:expense_id>", methods=["GET"])
 @permission_required("manage_expenses", "view")
+@conditional_get("expenses", "expense_categories", "users")
 def get_expense(expense_id):
     expense = Expense.query.get(expense_id)
     if not expense:
@@ -158,35 +186,37 @@ def update_expense(expense_id):
     except ValueError:
         return jsonify({"msg": "Invalid date or amount format"}), 400
 
-    # Revert previous cashier impact
+    try:
+        PeriodService.check_open(expense.expense_date, expense_date)
+    except PeriodClosed as e:
+        return jsonify({"msg": str(e)}), 409
+
     previous_cashier_impact = CalculationService.calculate_cashier_impact(
-        "expense_payment", expense.amount
+        "expense_payment", Decimal(str(expense.amount))
     )
-    current_balance = CashierBalance.get_current_balance()
-    CashierBalance.update_balance(current_balance - previous_cashier_impact)
 
     expense.description_ar = description_ar
     expense.description_en = description_en
-    expense.amount = amount
+    expense.amount = Decimal(str(amount))
     expense.expense_date = expense_date
     expense.category_id = category_id
     expense.notes = notes
-    expense.save()
-
-    # Apply new cashier impact
-    new_cashier_impact = CalculationService.calculate_cashier_impact(
-        "expense_payment", expense.amount
-    )
-    current_balance = CashierBalance.get_current_balance()
-    CashierBalance.update_balance(current_balance + new_cashier_impact)
 
-    # Update cashier transaction
+    # Update cashier transaction and journal entry
     cashier_transaction = CashierTransaction.query.filter_by(reference_id=expense.id, transaction_type="expense_payment").first()
     if cashier_transaction:
         cashier_transaction.amount = expense.amount
         cashier_transaction.transaction_date = datetime.utcnow()
         cashier_transaction.notes = f"تحديث دفع مصروف: {expense.description_ar}"
-        cashier_transaction.save()
+    LedgerService.sync("expense", [expense.id])
+
+    # Revert the previous cashier impact and apply the new one; update_balance commits everything together
+    new_cashier_impact = CalculationService.calculate_cashier_impact(
+        "expense_payment", expense.amount
+    )
+    CashierBalance.update_balance(
+        Decimal(str(CashierBalance.get_current_balance())) - previous_cashier_impact + new_cashier_impact
+    )
 
     return jsonify({"msg": "Expense updated successfully", "expense": expense.to_dict()}), 200
 
@@ -197,19 +227,112 @@ def delete_expense(expense_id):
     if not expense:
         return jsonify({"msg": "Expense not found"}), 404
 
-    # Revert cashier impact
-    current_balance = CashierBalance.get_current_balance()
+    try:
+        PeriodService.check_open(expense.expense_date)
+    except PeriodClosed as e:
+        return jsonify({"msg": str(e)}), 409
+
     cashier_impact = CalculationService.calculate_cashier_impact(
-        "expense_payment", expense.amount
+        "expense_payment", Decimal(str(expense.amount))
     )
-    CashierBalance.update_balance(current_balance - cashier_impact)
 
-    # Delete cashier transaction
+    # Delete cashier transaction and journal entry
     cashier_transaction = CashierTransaction.query.filter_by(reference_id=expense.id, transaction_type="expense_payment").first()
     if cashier_transaction:
-        cashier_transaction.delete()
+        db.session.delete(cashier_transaction)
+    LedgerService.remove("expense", [expense.id])
+    db.session.delete(expense)
 
-    expense.delete()
+    # Revert cashier impact; update_balance commits the deletion
+    CashierBalance.update_balance(Decimal(str(CashierBalance.get_current_balance())) - cashier_impact)
     return jsonify({"msg": "Expense deleted successfully"}), 200
 
+# --- Recurring Expenses ---
+def _parse_recurring_expense(data, template=None):
+    """Validated column values for a recurring expense from the request body; (values, error message)"""
+    values = {
+        "description_ar": data.get("description_ar", template.description_ar if template else None),
+        "description_en": data.get("description_en", template.description_en if template else None),
+        "amount": data.get("amount", template.amount if template else None),
+        "category_id": data.get("category_id", template.category_id if template else None),
+        "cadence": data.get("cadence", template.cadence if template else None),
+        "is_active": bool(data.get("is_active", template.is_active if template else True)),
+        "notes": data.get("notes", template.notes if template else None),
+    }
+    start_date_str = data.get("start_date", template.start_date.isoformat() if template else None)
+    end_date_str = data.get("end_date", template.end_date.isoformat() if template and template.end_date else None)
+
+    if not all([values["description_ar"], values["amount"], values["category_id"], values["cadence"], start_date_str]):
+        return None, "Missing required fields: description_ar, amount, category_id, cadence, start_date"
+    if values["cadence"] not in RECURRENCE_MONTHS:
+        return None, f"cadence must be one of: {', '.join(RECURRENCE_MONTHS)}"
+    if not ExpenseCategory.query.get(values["category_id"]):
+        return None, "Expense category not found"
+    try:
+        values["start_date"] = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+        values["end_date"] = datetime.strptime(end_date_str, '%Y-%m-%d').date() if end_date_str else None
+        values["amount"] = float(values["amount"])
+    except ValueError:
+        return None, "Invalid date or amount format"
+    if values["amount"] <= 0:
+        return None, "amount must be positive"
+    if values["end_date"] and values["end_date"] < values["start_date"]:
+        return None, "end_date must not be before start_date"
+    return values, None
+
+@expenses_bp.route("/recurring_expenses", methods=["POST"])
+@permission_required("manage_expenses", "create")
+def create_recurring_expense():
+    values, error = _parse_recurring_expense(request.get_json() or {})
+    if error:
+        return jsonify({"msg": error}), 400
+    template = RecurringExpense(user_id=get_jwt_identity(), **values)
+    template.save()
+    return jsonify({"msg": "Recurring expense created successfully", "recurring_expense": template.to_dict()}), 201
+
+@expenses_bp.route("/recurring_expenses", methods=["GET"])
+@permission_required("manage_expenses", "view")
+@conditional_get("recurring_expenses", "expense_categories")
+def get_recurring_expenses():
+    templates = RecurringExpense.query.order_by(RecurringExpense.id).all()
+    return jsonify([template.to_dict() for template in templates]), 200
 
+@expenses_bp.route("/recurring_expenses/<int:template_id>", methods=["PUT"])
+@permission_required("manage_expenses", "edit")
+def update_recurring_expense(template_id):
+    """Changes apply to the periods not posted yet; posted expenses are edited on their own"""
+    template = RecurringExpense.query.get(template_id)
+    if not template:
+        return jsonify({"msg": "Recurring expense not found"}), 404
+    values, error = _parse_recurring_expense(request.get_json() or {}, template)
+    if error:
+        return jsonify({"msg": error}), 400
+    for name, value in values.items():
+        setattr(template, name, value)
+    template.save()
+    return jsonify({"msg": "Recurring expense updated successfully", "recurring_expense": template.to_dict()}), 200
+
+@expenses_bp.route("/recurring_expenses/<int:template_id>", methods=["DELETE"])
+@permission_required("manage_expenses", "delete")
+def delete_recurring_expense(template_id):
+    """Stops future postings; expenses already posted are kept"""
+    template = RecurringExpense.query.get(template_id)
+    if not template:
+        return jsonify({"msg": "Recurring expense not found"}), 404
+    template.delete()
+    return jsonify({"msg": "Recurring expense deleted successfully"}), 200
+
+@expenses_bp.route("/recurring_expenses/post", methods=["POST"])
+@permission_required("manage_expenses", "create")
+def post_recurring_expenses():
+    """Post the due occurrences now (the scheduler does this daily); dry_run lists them only"""
+    data = request.get_json(silent=True) or {}
+    try:
+        as_of = datetime.strptime(data["as_of"], '%Y-%m-%d').date() if data.get("as_of") else None
+    except ValueError:
+        return jsonify({"msg": "Invalid as_of format"}), 400
+    template_ids = data.get("template_ids")
+    if template_ids is not None and not isinstance(template_ids, list):
+        return jsonify({"msg": "template_ids must be a list"}), 400
+    result = RecurringExpenseService.post_due(as_of, template_ids, dry_run=bool(data.get("dry_run")))
+    return jsonify(result), 200
@@ -3,11 +3,39 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from src.models import db, FinishingWork, FinishingWorkExpense, Unit, CashierBalance, CashierTransaction
 from src.services.calculation_service import CalculationService
+from src.services.finishing_work_service import FinishingWorkService
+from src.services.ledger_service import LedgerService
+from src.services.period_service import PeriodService, PeriodClosed
 from src.utils.auth_utils import permission_required
+from src.utils.cache_utils import conditional_get
+from src.utils.serialization import ModelSerializer, json_response
 from datetime import datetime
+from decimal import Decimal
 
 finishing_works_bp = Blueprint("finishing_works", __name__)
 
+finishing_work_serializer = ModelSerializer(
+    FinishingWork,
+    extra_columns={
+        "unit_code": Unit.code,
+        "unit_type": Unit.type,
+        "unit_address": Unit.address,
+    },
+    joins=[(Unit, Unit.id == FinishingWork.unit_id)],
+)
+finishing_work_expense_serializer = ModelSerializer(
+    FinishingWorkExpense,
+    extra_columns={
+        "project_name_ar": FinishingWork.project_name_ar,
+        "project_name_en": FinishingWork.project_name_en,
+        "unit_code": Unit.code,
+    },
+    joins=[
+        (FinishingWork, FinishingWork.id == FinishingWorkExpense.finishing_work_id),
+        (Unit, Unit.id == FinishingWork.unit_id),
+    ],
+)
+
 @finishing_works_bp.route("/finishing_works", methods=["POST"])
 @permission_required("manage_finishing_works", "create")
 def create_finishing_work():
@@ -53,12 +81,23 @@ def create_finishing_work():
 
 @finishing_works_bp.route("/finishing_works", methods=["GET"])
 @permission_required("manage_finishing_works", "view")
+@conditional_get("finishing_works", "units")
 def get_finishing_works():
-    finishing_works = FinishingWork.query.all()
-    return jsonify([fw.to_dict() for fw in finishing_works]), 200
+    return finishing_work_serializer.response()
+
+@finishing_works_bp.route("/finishing_works/budget_variance", methods=["GET"])
+@permission_required("manage_finishing_works", "view")
+def get_budget_variance():
+    """Budget vs actual, percent used and weekly burn rate per project; reads only the project rows"""
+    try:
+        as_of = datetime.strptime(request.args["as_of"], "%Y-%m-%d").date() if request.args.get("as_of") else None
+    except ValueError:
+        return jsonify({"msg": "Invalid as_of format"}), 400
+    return json_response(FinishingWorkService.budget_variance(request.args.get("status"), as_of))
 
 @finishing_works_bp.route("/finishing_works/<int:fw_id>", methods=["GET"])
 @permission_required("manage_finishing_works", "view")
+@conditional_get("finishing_works", "units")
 def get_finishing_work(fw_id):
     finishing_work = FinishingWork.query.get(fw_id)
     if not finishing_work:
@@ -79,7 +118,6 @@ def update_finishing_work(fw_id):
     start_date_str = data.get("start_date", finishing_work.start_date.isoformat() if finishing_work.start_date else None)
     end_date_str = data.get("end_date", finishing_work.end_date.isoformat() if finishing_work.end_date else None)
     budget = data.get("budget", finishing_work.budget)
-    actual_cost = data.get("actual_cost", finishing_work.actual_cost)
     status = data.get("status", finishing_work.status)
     notes = data.get("notes", finishing_work.notes)
 
@@ -93,7 +131,6 @@ def update_finishing_work(fw_id):
         end_date = datetime.strptime(end_date_str, 
                                      "%Y-%m-%d").date() if end_date_str else None
         budget = float(budget)
-        actual_cost = float(actual_cost)
     except ValueError:
         return jsonify({"msg": "Invalid date or amount format"}), 400
 
@@ -103,7 +140,7 @@ def update_finishing_work(fw_id):
     finishing_work.start_date = start_date
     finishing_work.end_date = end_date
     finishing_work.budget = budget
-    finishing_work.actual_cost = actual_cost
+    # actual_cost is maintained from the expenses and not writable here
     finishing_work.status = status
     finishing_work.notes = notes
     finishing_work.save()
@@ -117,7 +154,13 @@ def delete_finishing_work(fw_id):
     if not finishing_work:
         return jsonify({"msg": "Finishing work project not found"}), 404
 
+    try:
+        PeriodService.check_open(*[expense.expense_date for expense in finishing_work.expenses])
+    except PeriodClosed as e:
+        return jsonify({"msg": str(e)}), 409
+
     # Delete associated expenses
+    LedgerService.remove("finishing_work_expense", [expense.id for expense in finishing_work.expenses])
     for expense in finishing_work.expenses:
         # Revert cashier impact for each expense
         current_balance = CashierBalance.get_current_balance()
@@ -160,6 +203,11 @@ def add_finishing_work_expense(fw_id):
     except ValueError:
         return jsonify({"msg": "Invalid date or amount format"}), 400
 
+    try:
+        PeriodService.check_open(expense_date)
+    except PeriodClosed as e:
+        return jsonify({"msg": str(e)}), 409
+
     new_expense = FinishingWorkExpense(
         finishing_work_id=fw_id,
         description_ar=description_ar,
@@ -168,11 +216,12 @@ def add_finishing_work_expense(fw_id):
         expense_date=expense_date,
         notes=notes
     )
-    new_expense.save()
+    db.session.add(new_expense)
+    db.session.flush()
 
-    # Update actual cost of finishing work project
-    finishing_work.actual_cost += new_expense.amount
-    finishing_work.save()
+    # Actual cost of the project and the journal entry, committed together with the expense
+    FinishingWorkService.apply_cost_delta(finishing_work, amount)
+    LedgerService.sync("finishing_work_expense", [new_expense.id])
 
     # Update cashier balance and record transaction
     current_balance = CashierBalance.get_current_balance()
@@ -196,13 +245,15 @@ def add_finishing_work_expense(fw_id):
 
 @finishing_works_bp.route("/finishing_works/<int:fw_id>/expenses", methods=["GET"])
 @permission_required("manage_finishing_works", "view")
+@conditional_get("finishing_work_expenses", "finishing_works", "units")
 def get_finishing_work_expenses(fw_id):
     finishing_work = FinishingWork.query.get(fw_id)
     if not finishing_work:
         return jsonify({"msg": "Finishing work project not found"}), 404
     
-    expenses = FinishingWorkExpense.query.filter_by(finishing_work_id=fw_id).all()
-    return jsonify([expense.to_dict() for expense in expenses]), 200
+    return finishing_work_expense_serializer.response(
+        finishing_work_expense_serializer.select().where(FinishingWorkExpense.finishing_work_id == fw_id)
+    )
 
 @finishing_works_bp.route("/finishing_work_expenses/<int:expense_id>", methods=["PUT"])
 @permission_required("manage_finishing_works", "edit")
@@ -225,6 +276,11 @@ def update_finishing_work_expense(expense_id):
     except ValueError:
         return jsonify({"msg": "Invalid date or amount format"}), 400
 
+    try:
+        PeriodService.check_open(expense.expense_date, expense_date)
+    except PeriodClosed as e:
+        return jsonify({"msg": str(e)}), 409
+
     # Revert previous cashier impact
     previous_cashier_impact = CalculationService.calculate_cashier_impact(
         "finishing_work_expense", expense.amount
@@ -232,18 +288,17 @@ def update_finishing_work_expense(expense_id):
     current_balance = CashierBalance.get_current_balance()
     CashierBalance.update_balance(current_balance - previous_cashier_impact)
 
-    # Update actual cost of finishing work project
+    # Actual cost of the project moves by the difference, committed together with the expense
     finishing_work = expense.finishing_work
     if finishing_work:
-        finishing_work.actual_cost -= expense.amount
-        finishing_work.actual_cost += amount
-        finishing_work.save()
+        FinishingWorkService.apply_cost_delta(finishing_work, Decimal(str(amount)) - expense.amount)
 
     expense.description_ar = description_ar
     expense.description_en = description_en
     expense.amount = amount
     expense.expense_date = expense_date
     expense.notes = notes
+    LedgerService.sync("finishing_work_expense", [expense.id])
     expense.save()
 
     # Apply new cashier impact
@@ -270,6 +325,11 @@ def delete_finishing_work_expense(expense_id):
     if not expense:
         return jsonify({"msg": "Finishing work expense not found"}), 404
 
+    try:
+        PeriodService.check_open(expense.expense_date)
+    except PeriodClosed as e:
+        return jsonify({"msg": str(e)}), 409
+
     # Revert cashier impact
     current_balance = CashierBalance.get_current_balance()
     cashier_impact = CalculationService.calculate_cashier_impact(
@@ -277,17 +337,16 @@ def delete_finishing_work_expense(expense_id):
     )
     CashierBalance.update_balance(current_balance - cashier_impact)
 
-    # Update actual cost of finishing work project
-    finishing_work = expense.finishing_work
-    if finishing_work:
-        finishing_work.actual_cost -= expense.amount
-        finishing_work.save()
-
     # Delete cashier transaction
     cashier_transaction = CashierTransaction.query.filter_by(reference_id=expense.id, transaction_type="finishing_work_expense").first()
     if cashier_transaction:
-        cashier_transaction.delete()
+        db.session.delete(cashier_transaction)
 
+    # Actual cost of the project, committed together with the deletion
+    finishing_work = expense.finishing_work
+    if finishing_work:
+        FinishingWorkService.apply_cost_delta(finishing_work, -expense.amount)
+    LedgerService.remove("finishing_work_expense", [expense.id])
     expense.delete()
     return jsonify({"msg": "Finishing work expense deleted successfully"}), 200
 
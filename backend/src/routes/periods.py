@@ -0,0 +1,59 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import get_jwt_identity
+from src.models import ClosedPeriod
+from src.services.period_service import PeriodService
+from src.utils.auth_utils import permission_required
+from src.utils.cache_utils import conditional_get
+from src.utils.serialization import json_response
+from datetime import date, datetime
+
+periods_bp = Blueprint("periods", __name__)
+
+def _parse_month(value):
+    return datetime.strptime(value, '%Y-%m').date() if value else None
+
+@periods_bp.route("/periods", methods=["GET"])
+@permission_required("view_reports", "view")
+@conditional_get("closed_periods", "users")
+def get_closed_periods():
+    periods = ClosedPeriod.query.order_by(ClosedPeriod.month.desc()).all()
+    return jsonify([period.to_dict() for period in periods]), 200
+
+@periods_bp.route("/periods/close", methods=["POST"])
+@permission_required("manage_settings", "edit")
+def close_period():
+    """Close a past month (YYYY-MM); months close in order"""
+    data = request.get_json() or {}
+    try:
+        month = _parse_month(data.get("month"))
+    except ValueError:
+        return jsonify({"msg": "Invalid month format, expected YYYY-MM"}), 400
+    if not month:
+        return jsonify({"msg": "Missing required field: month"}), 400
+    try:
+        period = PeriodService.close_month(month, get_jwt_identity(), data.get("notes"))
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 409
+    return jsonify({"msg": "Period closed successfully", "period": period.to_dict()}), 201
+
+@periods_bp.route("/periods/reopen", methods=["POST"])
+@permission_required("manage_settings", "edit")
+def reopen_period():
+    """Reopen the last closed month"""
+    month = PeriodService.reopen_last()
+    if not month:
+        return jsonify({"msg": "No closed period to reopen"}), 404
+    return jsonify({"msg": "Period reopened successfully", "month": month.strftime('%Y-%m')}), 200
+
+@periods_bp.route("/periods/summary", methods=["GET"])
+@permission_required("view_reports", "view")
+def get_period_summary():
+    """Monthly revenue, commissions, taxes and expenses; closed months come from their snapshots"""
+    try:
+        end_month = _parse_month(request.args.get("end_month")) or date.today().replace(day=1)
+        start_month = _parse_month(request.args.get("start_month")) or end_month.replace(month=1)
+    except ValueError:
+        return jsonify({"msg": "Invalid month format, expected YYYY-MM"}), 400
+    if start_month > end_month:
+        return jsonify({"msg": "start_month must not be after end_month"}), 400
+    return json_response(PeriodService.monthly_summary(start_month, end_month))
@@ -1,13 +1,46 @@
 
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from src.models import db, Rental, RentalPayment, Unit, CashierBalance, CashierTransaction
+from src.models import db, Rental, RentalPayment, RentalArrears, Unit, CashierBalance, CashierTransaction
+from src.models.rentals import PAYMENT_STATUS_PAID, PAYMENT_FREQUENCY_MONTHS
 from src.services.calculation_service import CalculationService
+from src.services.ledger_service import LedgerService
+from src.services.occupancy_service import OccupancyService, OccupancyConflict
+from src.services.period_service import PeriodService, PeriodClosed
+from src.services.rental_service import RentalService
 from src.utils.auth_utils import permission_required
+from src.utils.cache_utils import conditional_get
+from src.utils.serialization import ModelSerializer, json_response
 from datetime import datetime
 
 rentals_bp = Blueprint("rentals", __name__)
 
+rental_serializer = ModelSerializer(
+    Rental,
+    extra_columns={
+        "unit_code": Unit.code,
+        "unit_type": Unit.type,
+        "unit_address": Unit.address,
+    },
+    joins=[(Unit, Unit.id == Rental.unit_id)],
+)
+rental_payment_serializer = ModelSerializer(
+    RentalPayment,
+    extra_columns={
+        "rental_tenant_name": Rental.tenant_name,
+        "rental_unit_code": Unit.code,
+    },
+    joins=[
+        (Rental, Rental.id == RentalPayment.rental_id),
+        (Unit, Unit.id == Rental.unit_id),
+    ],
+)
+rental_arrears_serializer = ModelSerializer(
+    RentalArrears,
+    extra_columns={"unit_code": Unit.code},
+    joins=[(Unit, Unit.id == RentalArrears.unit_id)],
+)
+
 @rentals_bp.route("/rentals", methods=["POST"])
 @permission_required("manage_rentals", "create")
 def create_rental():
@@ -26,9 +59,6 @@ def create_rental():
     unit = Unit.query.get(unit_id)
     if not unit:
         return jsonify({"msg": "Unit not found"}), 404
-    # Optionally, check if unit is already rented
-    # if unit.status == "مؤجرة":
-    #     return jsonify({"msg": "Unit is already rented"}), 400
 
     try:
         start_date = datetime.strptime(start_date_str, 
@@ -38,6 +68,10 @@ def create_rental():
         rent_amount = float(rent_amount)
     except ValueError:
         return jsonify({"msg": "Invalid date or amount format"}), 400
+    if payment_frequency not in PAYMENT_FREQUENCY_MONTHS:
+        return jsonify({"msg": f"payment_frequency must be one of: {', '.join(PAYMENT_FREQUENCY_MONTHS)}"}), 400
+    if end_date < start_date:
+        return jsonify({"msg": "end_date must not be before start_date"}), 400
 
     new_rental = Rental(
         unit_id=unit_id,
@@ -48,22 +82,29 @@ def create_rental():
         payment_frequency=payment_frequency,
         notes=notes
     )
-    new_rental.save()
-
-    # Update unit status
-    unit.status = "مؤجرة"
-    unit.save()
+    db.session.add(new_rental)
+    db.session.flush()
+    # Reject double booking; the lease occupies the unit over [start_date, end_date)
+    try:
+        OccupancyService.occupy(unit_id, "rental", new_rental.id, start_date, end_date)
+    except OccupancyConflict as e:
+        db.session.rollback()
+        return jsonify({"msg": "Unit is not available for these dates", "error": str(e)}), 409
+    # The whole payment schedule, inserted in one statement
+    RentalService.regenerate_schedule(new_rental, from_date=start_date)
+    db.session.commit()
 
     return jsonify({"msg": "Rental created successfully", "rental": new_rental.to_dict()}), 201
 
 @rentals_bp.route("/rentals", methods=["GET"])
 @permission_required("manage_rentals", "view")
+@conditional_get("rentals", "units")
 def get_rentals():
-    rentals = Rental.query.all()
-    return jsonify([rental.to_dict() for rental in rentals]), 200
+    return rental_serializer.response()
 
 @rentals_bp.route("/rentals/<int:rental_id>", methods=["GET"])
 @permission_required("manage_rentals", "view")
+@conditional_get("rentals", "units")
 def get_rental(rental_id):
     rental = Rental.query.get(rental_id)
     if not rental:
@@ -98,6 +139,17 @@ def update_rental(rental_id):
         rent_amount = float(rent_amount)
     except ValueError:
         return jsonify({"msg": "Invalid date or amount format"}), 400
+    if payment_frequency not in PAYMENT_FREQUENCY_MONTHS:
+        return jsonify({"msg": f"payment_frequency must be one of: {', '.join(PAYMENT_FREQUENCY_MONTHS)}"}), 400
+    if end_date < start_date:
+        return jsonify({"msg": "end_date must not be before start_date"}), 400
+
+    conflict = OccupancyService.find_conflict(unit_id, start_date, end_date, exclude=("rental", rental.id))
+    if conflict:
+        return jsonify({"msg": "Unit is not available for these dates", "error": str(OccupancyConflict(conflict))}), 409
+
+    schedule_changed = (start_date != rental.start_date or end_date != rental.end_date or
+                        rent_amount != float(rental.rent_amount) or payment_frequency != rental.payment_frequency)
 
     rental.unit_id = unit_id
     rental.tenant_name = tenant_name
@@ -106,17 +158,13 @@ def update_rental(rental_id):
     rental.rent_amount = rent_amount
     rental.payment_frequency = payment_frequency
     rental.notes = notes
+    if schedule_changed:
+        # Only the future, unpaid part of the schedule follows the new terms
+        RentalService.regenerate_schedule(rental)
+    # Moves the occupancy and re-derives the status of both the old and the new unit
+    OccupancyService.occupy(unit_id, "rental", rental.id, start_date, end_date)
     rental.save()
 
-    # Update unit status if unit_id changed
-    if unit.id != rental.unit_id:
-        old_unit = Unit.query.get(rental.unit_id) # Assuming old_unit is still valid
-        if old_unit:
-            old_unit.status = "متاحة"
-            old_unit.save()
-        unit.status = "مؤجرة"
-        unit.save()
-
     return jsonify({"msg": "Rental updated successfully", "rental": rental.to_dict()}), 200
 
 @rentals_bp.route("/rentals/<int:rental_id>", methods=["DELETE"])
@@ -126,30 +174,90 @@ def delete_rental(rental_id):
     if not rental:
         return jsonify({"msg": "Rental not found"}), 404
 
-    # Delete associated rental payments
-    for payment in rental.payments:
-        # Revert cashier impact for each payment
-        current_balance = CashierBalance.get_current_balance()
-        cashier_impact = CalculationService.calculate_cashier_impact(
-            "rental_income", payment.amount
-        )
-        CashierBalance.update_balance(current_balance - cashier_impact)
-
-        # Delete cashier transaction
-        cashier_transaction = CashierTransaction.query.filter_by(reference_id=payment.id, transaction_type="rental_income").first()
-        if cashier_transaction:
-            cashier_transaction.delete()
-        payment.delete()
-
-    # Update unit status back to available
-    unit = Unit.query.get(rental.unit_id)
-    if unit:
-        unit.status = "متاحة"
-        unit.save()
-
+    try:
+        PeriodService.check_open(db.session.execute(
+            db.select(db.func.min(RentalPayment.payment_date))
+            .where(RentalPayment.rental_id == rental.id, RentalPayment.status == PAYMENT_STATUS_PAID)
+        ).scalar())
+    except PeriodClosed as e:
+        return jsonify({"msg": str(e)}), 409
+
+    # Revert the cashier income of the posted payments and drop their transactions in one pass;
+    # the payments themselves go with the rental (cascade)
+    posted = db.select(CashierTransaction).where(
+        CashierTransaction.transaction_type == "rental_income",
+        CashierTransaction.reference_id.in_(db.select(RentalPayment.id).where(RentalPayment.rental_id == rental.id))
+    )
+    cashier_impact = sum(
+        CalculationService.calculate_cashier_impact("rental_income", float(transaction.amount))
+        for transaction in db.session.execute(posted).scalars()
+    )
+    db.session.execute(
+        db.delete(CashierTransaction).where(CashierTransaction.id.in_(posted.with_only_columns(CashierTransaction.id)))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        db.delete(RentalArrears).where(RentalArrears.rental_id == rental.id)
+        .execution_options(synchronize_session=False)
+    )
+    LedgerService.remove("rental_payment", db.session.execute(
+        db.select(RentalPayment.id).where(RentalPayment.rental_id == rental.id)
+    ).scalars())
+    if cashier_impact:
+        CashierBalance.update_balance(CashierBalance.get_current_balance() - cashier_impact)
+
+    # Free the unit
+    OccupancyService.release("rental", rental.id)
     rental.delete()
     return jsonify({"msg": "Rental deleted successfully"}), 200
 
+@rentals_bp.route("/rentals/<int:rental_id>/schedule", methods=["POST"])
+@permission_required("manage_rentals", "edit")
+def regenerate_rental_schedule(rental_id):
+    """Rebuild the unpaid payment schedule from from_date (default today)"""
+    rental = Rental.query.get(rental_id)
+    if not rental:
+        return jsonify({"msg": "Rental not found"}), 404
+
+    data = request.get_json(silent=True) or {}
+    try:
+        from_date = datetime.strptime(data["from_date"], "%Y-%m-%d").date() if data.get("from_date") else None
+    except ValueError:
+        return jsonify({"msg": "Invalid from_date format"}), 400
+    try:
+        created = RentalService.regenerate_schedule(rental, from_date)
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    RentalService.refresh_arrears([rental.id])
+    db.session.commit()
+    return jsonify({"msg": "Rental schedule regenerated", "payments_created": created}), 200
+
+@rentals_bp.route("/rentals/arrears", methods=["GET"])
+@permission_required("manage_rentals", "view")
+@conditional_get("rental_arrears", "units")
+def get_rental_arrears():
+    """Per-lease arrears, as of the last overdue run, largest first"""
+    return rental_arrears_serializer.response(
+        rental_arrears_serializer.select().order_by(RentalArrears.overdue_amount.desc())
+    )
+
+@rentals_bp.route("/rentals/arrears/aging", methods=["GET"])
+@permission_required("manage_rentals", "view")
+def get_rental_arrears_aging():
+    """Unpaid rent past due in 0-30/31-60/61-90/90+ day buckets; group_by=rental for one row per lease
+
+    No ETag: the buckets move with the date even when no table changes.
+    """
+    try:
+        as_of = datetime.strptime(request.args["as_of"], "%Y-%m-%d").date() if request.args.get("as_of") else None
+    except ValueError:
+        return jsonify({"msg": "Invalid as_of format"}), 400
+    group_by = request.args.get("group_by")
+    if group_by not in (None, "rental"):
+        return jsonify({"msg": "group_by must be 'rental'"}), 400
+    rows = RentalService.aging(as_of, by_rental=group_by == "rental")
+    return json_response(rows if group_by else rows[0])
+
 # --- Rental Payments ---
 @rentals_bp.route("/rentals/<int:rental_id>/payments", methods=["POST"])
 @permission_required("manage_rentals", "create")
@@ -174,6 +282,12 @@ def add_rental_payment(rental_id):
     except ValueError:
         return jsonify({"msg": "Invalid date or amount format"}), 400
 
+    # Only paid payments count in the books
+    try:
+        PeriodService.check_open(payment_date if status == PAYMENT_STATUS_PAID else None)
+    except PeriodClosed as e:
+        return jsonify({"msg": str(e)}), 409
+
     new_payment = RentalPayment(
         rental_id=rental_id,
         payment_date=payment_date,
@@ -181,37 +295,27 @@ def add_rental_payment(rental_id):
         status=status,
         notes=notes
     )
-    new_payment.save()
+    db.session.add(new_payment)
+    db.session.flush()
 
-    # Update cashier balance and record transaction
-    current_balance = CashierBalance.get_current_balance()
-    cashier_impact = CalculationService.calculate_cashier_impact(
-        "rental_income", new_payment.amount
-    )
-    new_balance = current_balance + cashier_impact
-    CashierBalance.update_balance(new_balance)
-
-    cashier_transaction = CashierTransaction(
-        transaction_date=datetime.utcnow(),
-        amount=new_payment.amount,
-        transaction_type="rental_income",
-        reference_id=new_payment.id,
-        notes=f"إيراد إيجار الوحدة {rental.unit.code} من {rental.tenant_name}",
-        user_id=get_jwt_identity()
-    )
-    cashier_transaction.save()
+    # Cashier income only for paid payments; one commit for the payment, its posting and the arrears
+    RentalService.refresh_arrears([rental_id])
+    RentalService.post_payment(new_payment, get_jwt_identity())
+    db.session.commit()
 
     return jsonify({"msg": "Rental payment added successfully", "payment": new_payment.to_dict()}), 201
 
 @rentals_bp.route("/rentals/<int:rental_id>/payments", methods=["GET"])
 @permission_required("manage_rentals", "view")
+@conditional_get("rental_payments", "rentals", "units")
 def get_rental_payments(rental_id):
     rental = Rental.query.get(rental_id)
     if not rental:
         return jsonify({"msg": "Rental not found"}), 404
     
-    payments = RentalPayment.query.filter_by(rental_id=rental_id).all()
-    return jsonify([payment.to_dict() for payment in payments]), 200
+    return rental_payment_serializer.response(
+        rental_payment_serializer.select().where(RentalPayment.rental_id == rental_id)
+    )
 
 @rentals_bp.route("/rental_payments/<int:payment_id>", methods=["PUT"])
 @permission_required("manage_rentals", "edit")
@@ -233,33 +337,21 @@ def update_rental_payment(payment_id):
     except ValueError:
         return jsonify({"msg": "Invalid date or amount format"}), 400
 
-    # Revert previous cashier impact
-    previous_cashier_impact = CalculationService.calculate_cashier_impact(
-        "rental_income", payment.amount
-    )
-    current_balance = CashierBalance.get_current_balance()
-    CashierBalance.update_balance(current_balance - previous_cashier_impact)
+    try:
+        PeriodService.check_open(payment.payment_date if payment.status == PAYMENT_STATUS_PAID else None,
+                                 payment_date if status == PAYMENT_STATUS_PAID else None)
+    except PeriodClosed as e:
+        return jsonify({"msg": str(e)}), 409
 
     payment.payment_date = payment_date
     payment.amount = amount
     payment.status = status
     payment.notes = notes
-    payment.save()
-
-    # Apply new cashier impact
-    new_cashier_impact = CalculationService.calculate_cashier_impact(
-        "rental_income", payment.amount
-    )
-    current_balance = CashierBalance.get_current_balance()
-    CashierBalance.update_balance(current_balance + new_cashier_impact)
 
-    # Update cashier transaction
-    cashier_transaction = CashierTransaction.query.filter_by(reference_id=payment.id, transaction_type="rental_income").first()
-    if cashier_transaction:
-        cashier_transaction.amount = payment.amount
-        cashier_transaction.transaction_date = datetime.utcnow()
-        cashier_transaction.notes = f"تحديث إيراد إيجار الوحدة {payment.rental.unit.code} من {payment.rental.tenant_name}"
-        cashier_transaction.save()
+    # Post, adjust or withdraw the cashier income as the payment becomes paid, changes or is unpaid
+    RentalService.refresh_arrears([payment.rental_id])
+    RentalService.post_payment(payment, get_jwt_identity())
+    db.session.commit()
 
     return jsonify({"msg": "Rental payment updated successfully", "payment": payment.to_dict()}), 200
 
@@ -270,19 +362,17 @@ def delete_rental_payment(payment_id):
     if not payment:
         return jsonify({"msg": "Rental payment not found"}), 404
 
-    # Revert cashier impact
-    current_balance = CashierBalance.get_current_balance()
-    cashier_impact = CalculationService.calculate_cashier_impact(
-        "rental_income", payment.amount
-    )
-    CashierBalance.update_balance(current_balance - cashier_impact)
-
-    # Delete cashier transaction
-    cashier_transaction = CashierTransaction.query.filter_by(reference_id=payment.id, transaction_type="rental_income").first()
-    if cashier_transaction:
-        cashier_transaction.delete()
-
-    payment.delete()
+    try:
+        PeriodService.check_open(payment.payment_date if payment.status == PAYMENT_STATUS_PAID else None)
+    except PeriodClosed as e:
+        return jsonify({"msg": str(e)}), 409
+
+    # Revert the cashier income, if the payment was posted
+    rental_id = payment.rental_id
+    RentalService.post_payment(payment, get_jwt_identity(), removed=True)
+    db.session.delete(payment)
+    RentalService.refresh_arrears([rental_id])
+    db.session.commit()
     return jsonify({"msg": "Rental payment deleted successfully"}), 200
 
 
@@ -1,42 +1,103 @@
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, send_file
 from flask_jwt_extended import jwt_required
-from src.models import Sale, Expense, RentalPayment, FinishingWorkExpense, CashierTransaction
+from src.models import (
+    db, Sale, SalesPerformanceMonthly, RentalPayment, CashierTransaction, User
+)
+from src.models.rentals import PAYMENT_STATUS_PAID
 from src.utils.auth_utils import permission_required
-from datetime import datetime
+from src.utils.cache_utils import conditional_get
+from src.utils.serialization import json_response
+from src.services.expense_analytics_service import (
+    ExpenseAnalyticsService, ANALYTICS_DIMENSIONS, expense_serializer
+)
+from src.services.ledger_service import LedgerService
+from src.services.period_service import PeriodService
+from src.services.tax_report_service import TaxReportService, TAX_REPORT_PERIODS, TAX_EXPORT_FORMATS
+from datetime import datetime, time, timedelta
+import base64
+import binascii
 
 reports_bp = Blueprint("reports", __name__)
 
+CASHIER_REPORT_MAX_LIMIT = 1000
+LEADERBOARD_MAX_LIMIT = 100
+LEADERBOARD_ROLES = ('salesperson', 'sales_manager')
+LEADERBOARD_METRICS = ('sale_count', 'sales_volume', 'commission')
+
+def _parse_date_arg(name):
+    """Parse an optional YYYY-MM-DD query argument, raising ValueError if malformed"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+def _parse_month_arg(name):
+    """Parse an optional YYYY-MM query argument to the first day of the month"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    return datetime.strptime(value, "%Y-%m").date()
+
+def _encode_cursor(transaction_date, transaction_id):
+    """Encode a (transaction_date, id) keyset position as an opaque cursor"""
+    raw = f"{transaction_date.isoformat()}|{transaction_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor):
+    """Decode a cursor produced by _encode_cursor, raising ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        date_str, id_str = raw.split("|")
+        return datetime.fromisoformat(date_str), int(id_str)
+    except (UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError(str(e))
+
 @reports_bp.route("/reports/expenses", methods=["GET"])
 @permission_required("view_reports", "view")
 def get_expenses_report():
-    start_date_str = request.args.get("start_date")
-    end_date_str = request.args.get("end_date")
-    category_id = request.args.get("category_id", type=int)
+    try:
+        start_date = _parse_date_arg("start_date")
+        end_date = _parse_date_arg("end_date")
+    except ValueError:
+        return jsonify({"msg": "Invalid start_date or end_date format"}), 400
+    filters = ExpenseAnalyticsService.expense_filters(start_date, end_date, request.args.get("category_id", type=int))
 
-    query = Expense.query
+    # Category and user names joined in the same SELECT instead of lazy loads per row
+    return expense_serializer.response(expense_serializer.select().where(*filters))
 
-    if start_date_str:
-        try:
-            start_date = datetime.strptime(start_date_str, 
-                                           "%Y-%m-%d").date()
-            query = query.filter(Expense.expense_date >= start_date)
-        except ValueError:
-            return jsonify({"msg": "Invalid start_date format"}), 400
-
-    if end_date_str:
-        try:
-            end_date = datetime.strptime(end_date_str, 
-                                         "%Y-%m-%d").date()
-            query = query.filter(Expense.expense_date <= end_date)
-        except ValueError:
-            return jsonify({"msg": "Invalid end_date format"}), 400
+@reports_bp.route("/reports/expenses/analytics", methods=["GET"])
+@permission_required("view_reports", "view")
+@conditional_get("expenses", "expense_categories", "users")
+def get_expense_analytics():
+    """Expense totals by category (or group_by=user) × month with subtotals
 
-    if category_id:
-        query = query.filter(Expense.category_id == category_id)
+    With drill_id and drill_month (YYYY-MM), returns the expense rows of that one cell instead,
+    paged with after_id/limit.
+    """
+    group_by = request.args.get("group_by", "category")
+    if group_by not in ANALYTICS_DIMENSIONS:
+        return jsonify({"msg": f"group_by must be one of: {', '.join(ANALYTICS_DIMENSIONS)}"}), 400
+    try:
+        start_date = _parse_date_arg("start_date")
+        end_date = _parse_date_arg("end_date")
+        drill_month = _parse_month_arg("drill_month")
+    except ValueError:
+        return jsonify({"msg": "Invalid date format, expected YYYY-MM-DD (drill_month YYYY-MM)"}), 400
+    category_id = request.args.get("category_id", type=int)
+    drill_id = request.args.get("drill_id", type=int)
 
-    expenses = query.all()
-    return jsonify([expense.to_dict() for expense in expenses]), 200
+    if drill_id is None and drill_month is None:
+        return json_response(ExpenseAnalyticsService.totals(group_by, start_date, end_date, category_id))
+    if drill_id is None or drill_month is None:
+        return jsonify({"msg": "drill_id and drill_month must be given together"}), 400
+    limit = request.args.get("limit", 100, type=int)
+    if limit < 1:
+        return jsonify({"msg": "limit must be a positive integer"}), 400
+    return json_response(ExpenseAnalyticsService.drill_down(
+        group_by, drill_id, drill_month.strftime("%Y-%m"), start_date, end_date, category_id,
+        after_id=request.args.get("after_id", 0, type=int), limit=limit
+    ))
 
 @reports_bp.route("/reports/revenue", methods=["GET"])
 @permission_required("view_reports", "view")
@@ -45,7 +106,8 @@ def get_revenue_report():
     end_date_str = request.args.get("end_date")
 
     sales_query = Sale.query
-    rentals_query = RentalPayment.query
+    # Scheduled payments are revenue once paid
+    rentals_query = RentalPayment.query.filter(RentalPayment.status == PAYMENT_STATUS_PAID)
 
     if start_date_str:
         try:
@@ -92,78 +154,329 @@ def get_revenue_report():
 @reports_bp.route("/reports/profit_loss", methods=["GET"])
 @permission_required("view_reports", "view")
 def get_profit_loss_report():
-    start_date_str = request.args.get("start_date")
-    end_date_str = request.args.get("end_date")
+    """Revenue against expenses over a date range; closed months inside it are read from their snapshots"""
+    try:
+        start_date = _parse_date_arg("start_date")
+    except ValueError:
+        return jsonify({"msg": "Invalid start_date format"}), 400
+    try:
+        end_date = _parse_date_arg("end_date")
+    except ValueError:
+        return jsonify({"msg": "Invalid end_date format"}), 400
 
-    sales_query = Sale.query
-    expenses_query = Expense.query
-    rental_payments_query = RentalPayment.query
-    finishing_work_expenses_query = FinishingWorkExpense.query
+    totals = PeriodService.totals(start_date, end_date)
+    return jsonify({
+        "total_revenue": totals["total_revenue"],
+        "total_expenses": totals["total_expenses"],
+        "net_profit_loss": totals["net_profit_loss"]
+    }), 200
 
-    if start_date_str:
-        try:
-            start_date = datetime.strptime(start_date_str, 
-                                           "%Y-%m-%d").date()
-            sales_query = sales_query.filter(Sale.sale_date >= start_date)
-            expenses_query = expenses_query.filter(Expense.expense_date >= start_date)
-            rental_payments_query = rental_payments_query.filter(RentalPayment.payment_date >= start_date)
-            finishing_work_expenses_query = finishing_work_expenses_query.filter(FinishingWorkExpense.expense_date >= start_date)
-        except ValueError:
-            return jsonify({"msg": "Invalid start_date format"}), 400
+@reports_bp.route("/reports/taxes", methods=["GET"])
+@permission_required("view_reports", "view")
+@conditional_get("sale_tax_lines", "sales")
+def get_tax_report():
+    """Tax liability by tax rule and month, quarter or year; format=xlsx|csv downloads the filing summary"""
+    period = request.args.get("period", "quarter")
+    file_format = request.args.get("format")
+    if period not in TAX_REPORT_PERIODS:
+        return jsonify({"msg": f"period must be one of: {', '.join(TAX_REPORT_PERIODS)}"}), 400
+    if file_format and file_format not in TAX_EXPORT_FORMATS:
+        return jsonify({"msg": f"format must be one of: {', '.join(TAX_EXPORT_FORMATS)}"}), 400
+    try:
+        start_date = _parse_date_arg("start_date")
+        end_date = _parse_date_arg("end_date")
+    except ValueError:
+        return jsonify({"msg": "Invalid start_date or end_date format"}), 400
 
-    if end_date_str:
+    report = TaxReportService.summary(start_date, end_date, period)
+    if not file_format:
+        return json_response(report)
+    mimetypes = {
+        "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "csv": "text/csv",
+    }
+    return send_file(
+        TaxReportService.export(report, file_format),
+        as_attachment=True,
+        download_name=f"tax_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{file_format}",
+        mimetype=mimetypes[file_format]
+    )
+
+@reports_bp.route("/reports/cashier_transactions", methods=["GET"])
+@permission_required("view_reports", "view")
+def get_cashier_transactions_report():
+    transaction_type = request.args.get("transaction_type")
+    limit = request.args.get("limit", type=int)
+    cursor = request.args.get("cursor")
+    include_running_balance = request.args.get("running_balance", "false").lower() == "true"
+
+    try:
+        start_date = _parse_date_arg("start_date")
+    except ValueError:
+        return jsonify({"msg": "Invalid start_date format"}), 400
+    try:
+        end_date = _parse_date_arg("end_date")
+    except ValueError:
+        return jsonify({"msg": "Invalid end_date format"}), 400
+
+    if limit is not None and limit < 1:
+        return jsonify({"msg": "limit must be a positive integer"}), 400
+    if limit:
+        limit = min(limit, CASHIER_REPORT_MAX_LIMIT)
+
+    after = None
+    if cursor:
         try:
-            end_date = datetime.strptime(end_date_str, 
-                                         "%Y-%m-%d").date()
-            sales_query = sales_query.filter(Sale.sale_date <= end_date)
-            expenses_query = expenses_query.filter(Expense.expense_date <= end_date)
-            rental_payments_query = rental_payments_query.filter(RentalPayment.payment_date <= end_date)
-            finishing_work_expenses_query = finishing_work_expenses_query.filter(FinishingWorkExpense.expense_date <= end_date)
+            after = _decode_cursor(cursor)
         except ValueError:
-            return jsonify({"msg": "Invalid end_date format"}), 400
+            return jsonify({"msg": "Invalid cursor"}), 400
+
+    # Half-open datetime range so the transaction_date index stays usable
+    filters = []
+    if start_date:
+        filters.append(CashierTransaction.transaction_date >= datetime.combine(start_date, time.min))
+    if end_date:
+        filters.append(CashierTransaction.transaction_date < datetime.combine(end_date + timedelta(days=1), time.min))
+    if transaction_type:
+        filters.append(CashierTransaction.transaction_type == transaction_type)
 
-    total_revenue = sum(float(s.net_company_revenue) for s in sales_query.all()) + \
-                    sum(float(rp.amount) for rp in rental_payments_query.all())
-    total_expenses = sum(float(e.amount) for e in expenses_query.all()) + \
-                     sum(float(fwe.amount) for fwe in finishing_work_expenses_query.all())
+    columns = [
+        CashierTransaction.id,
+        CashierTransaction.created_at,
+        CashierTransaction.updated_at,
+        CashierTransaction.transaction_date,
+        CashierTransaction.amount,
+        CashierTransaction.transaction_type,
+        CashierTransaction.reference_id,
+        CashierTransaction.notes,
+        CashierTransaction.user_id,
+        (User.first_name + " " + User.last_name).label("user_name"),
+    ]
+    if include_running_balance:
+        # Cumulative cashier effect within the filtered range, in transaction order
+        columns.append(
+            db.func.sum(CashierTransaction.signed_amount()).over(
+                order_by=(CashierTransaction.transaction_date, CashierTransaction.id)
+            ).label("running_balance")
+        )
 
-    net_profit_loss = total_revenue - total_expenses
+    query = db.select(*columns).outerjoin(User, User.id == CashierTransaction.user_id).where(*filters)
+    if include_running_balance:
+        # The window has to see the whole range, so page over it from the outside
+        query = db.select(query.subquery())
+    source = query.selected_columns
+
+    if after:
+        after_date, after_id = after
+        query = query.where(db.or_(
+            source.transaction_date > after_date,
+            db.and_(source.transaction_date == after_date, source.id > after_id)
+        ))
+    query = query.order_by(source.transaction_date.asc(), source.id.asc())
+    if limit:
+        query = query.limit(limit + 1)
+
+    rows = db.session.execute(query).mappings().all()
+
+    next_cursor = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1]["transaction_date"], rows[-1]["id"])
+
+    transactions = []
+    for row in rows:
+        transaction = {
+            "id": row["id"],
+            "created_at": row["created_at"].isoformat(),
+            "updated_at": row["updated_at"].isoformat(),
+            "transaction_date": row["transaction_date"].isoformat(),
+            "amount": float(row["amount"]),
+            "transaction_type": row["transaction_type"],
+            "reference_id": row["reference_id"],
+            "notes": row["notes"],
+            "user_id": row["user_id"],
+            "user_name": row["user_name"],
+        }
+        if include_running_balance:
+            transaction["running_balance"] = round(float(row["running_balance"]), 2)
+        transactions.append(transaction)
+
+    response = jsonify(transactions)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response, 200
+
+@reports_bp.route("/reports/cashier_statement", methods=["GET"])
+@permission_required("view_reports", "view")
+def get_cashier_statement():
+    try:
+        start_date = _parse_date_arg("start_date")
+    except ValueError:
+        return jsonify({"msg": "Invalid start_date format"}), 400
+    try:
+        end_date = _parse_date_arg("end_date") or datetime.utcnow().date()
+    except ValueError:
+        return jsonify({"msg": "Invalid end_date format"}), 400
+
+    if not start_date:
+        return jsonify({"msg": "Missing required parameter: start_date"}), 400
+    if start_date > end_date:
+        return jsonify({"msg": "start_date must not be after end_date"}), 400
+
+    range_start = datetime.combine(start_date, time.min)
+    range_end = datetime.combine(end_date + timedelta(days=1), time.min)
+    signed_amount = CashierTransaction.signed_amount()
+
+    # Opening balance from the last closed month's snapshot plus the rollup after it;
+    # ix_cashier_transactions_rollup covers the rollup
+    opening = float(PeriodService.cashier_balance_before(start_date))
+
+    query = db.select(
+        CashierTransaction.id,
+        CashierTransaction.transaction_date,
+        CashierTransaction.amount,
+        CashierTransaction.transaction_type,
+        CashierTransaction.reference_id,
+        CashierTransaction.notes,
+        (User.first_name + " " + User.last_name).label("user_name"),
+        signed_amount.label("signed_amount"),
+        db.func.sum(signed_amount).over(
+            order_by=(CashierTransaction.transaction_date, CashierTransaction.id)
+        ).label("range_balance"),
+    ).outerjoin(User, User.id == CashierTransaction.user_id).where(
+        CashierTransaction.transaction_date >= range_start,
+        CashierTransaction.transaction_date < range_end,
+    ).order_by(CashierTransaction.transaction_date.asc(), CashierTransaction.id.asc())
+
+    rows = db.session.execute(query).mappings().all()
+
+    transactions = []
+    total_in = 0.0
+    total_out = 0.0
+    for row in rows:
+        signed = float(row["signed_amount"])
+        if signed >= 0:
+            total_in += signed
+        else:
+            total_out -= signed
+        transactions.append({
+            "id": row["id"],
+            "transaction_date": row["transaction_date"].isoformat(),
+            "amount": float(row["amount"]),
+            "transaction_type": row["transaction_type"],
+            "reference_id": row["reference_id"],
+            "notes": row["notes"],
+            "user_name": row["user_name"],
+            "signed_amount": signed,
+            "running_balance": round(opening + float(row["range_balance"]), 2),
+        })
+
+    closing = transactions[-1]["running_balance"] if transactions else opening
 
     return jsonify({
-        "total_revenue": round(total_revenue, 2),
-        "total_expenses": round(total_expenses, 2),
-        "net_profit_loss": round(net_profit_loss, 2)
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "opening_balance": round(opening, 2),
+        "total_in": round(total_in, 2),
+        "total_out": round(total_out, 2),
+        "closing_balance": round(closing, 2),
+        "transactions": transactions
     }), 200
 
-@reports_bp.route("/reports/cashier_transactions", methods=["GET"])
+@reports_bp.route("/reports/sales_leaderboard", methods=["GET"])
 @permission_required("view_reports", "view")
-def get_cashier_transactions_report():
-    start_date_str = request.args.get("start_date")
-    end_date_str = request.args.get("end_date")
-    transaction_type = request.args.get("transaction_type")
+@conditional_get("sales_performance_monthly", "users")
+def get_sales_leaderboard():
+    """Top salespeople or sales managers over a month window, read from the monthly aggregate only"""
+    role = request.args.get("role", "salesperson")
+    order_by = request.args.get("order_by", "sales_volume")
+    limit = request.args.get("limit", 10, type=int)
+    if role not in LEADERBOARD_ROLES:
+        return jsonify({"msg": f"role must be one of: {', '.join(LEADERBOARD_ROLES)}"}), 400
+    if order_by not in LEADERBOARD_METRICS:
+        return jsonify({"msg": f"order_by must be one of: {', '.join(LEADERBOARD_METRICS)}"}), 400
+    if limit < 1:
+        return jsonify({"msg": "limit must be a positive integer"}), 400
+    try:
+        start_month = _parse_month_arg("start_month")
+        end_month = _parse_month_arg("end_month")
+    except ValueError:
+        return jsonify({"msg": "Invalid month format, expected YYYY-MM"}), 400
 
-    query = CashierTransaction.query
+    metrics = {
+        name: db.func.sum(getattr(SalesPerformanceMonthly, name)).label(name)
+        for name in LEADERBOARD_METRICS
+    }
+    filters = [SalesPerformanceMonthly.role == role]
+    if start_month:
+        filters.append(SalesPerformanceMonthly.month >= start_month)
+    if end_month:
+        filters.append(SalesPerformanceMonthly.month <= end_month)
 
-    if start_date_str:
-        try:
-            start_date = datetime.strptime(start_date_str, 
-                                           "%Y-%m-%d").date()
-            query = query.filter(db.func.date(CashierTransaction.transaction_date) >= start_date)
-        except ValueError:
-            return jsonify({"msg": "Invalid start_date format"}), 400
+    query = db.select(
+        SalesPerformanceMonthly.user_id,
+        (User.first_name + " " + User.last_name).label("user_name"),
+        *metrics.values(),
+    ).join(User, User.id == SalesPerformanceMonthly.user_id).where(*filters).group_by(
+        SalesPerformanceMonthly.user_id, User.first_name, User.last_name
+    ).having(metrics["sale_count"] > 0).order_by(
+        metrics[order_by].desc(), SalesPerformanceMonthly.user_id
+    ).limit(min(limit, LEADERBOARD_MAX_LIMIT))
 
-    if end_date_str:
-        try:
-            end_date = datetime.strptime(end_date_str, 
-                                         "%Y-%m-%d").date()
-            query = query.filter(db.func.date(CashierTransaction.transaction_date) <= end_date)
-        except ValueError:
-            return jsonify({"msg": "Invalid end_date format"}), 400
+    leaderboard = [
+        {
+            "rank": rank,
+            "user_id": row["user_id"],
+            "user_name": row["user_name"],
+            "sale_count": int(row["sale_count"]),
+            "sales_volume": round(float(row["sales_volume"]), 2),
+            "commission": round(float(row["commission"]), 2),
+        }
+        for rank, row in enumerate(db.session.execute(query).mappings(), start=1)
+    ]
+    return jsonify({
+        "role": role,
+        "order_by": order_by,
+        "start_month": start_month.strftime("%Y-%m") if start_month else None,
+        "end_month": end_month.strftime("%Y-%m") if end_month else None,
+        "leaderboard": leaderboard
+    }), 200
 
-    if transaction_type:
-        query = query.filter(CashierTransaction.transaction_type == transaction_type)
+# --- General ledger statements, read from the monthly account balances ---
+@reports_bp.route("/reports/ledger/accounts", methods=["GET"])
+@permission_required("view_reports", "view")
+@conditional_get("accounts", "account_balances_monthly")
+def get_ledger_accounts():
+    """Chart of accounts with all-time debit, credit and balance"""
+    return jsonify(LedgerService.account_balances()), 200
 
-    transactions = query.order_by(CashierTransaction.transaction_date.asc()).all()
-    return jsonify([t.to_dict() for t in transactions]), 200
+@reports_bp.route("/reports/ledger/trial_balance", methods=["GET"])
+@permission_required("view_reports", "view")
+@conditional_get("accounts", "account_balances_monthly")
+def get_trial_balance():
+    try:
+        as_of = _parse_month_arg("as_of")
+    except ValueError:
+        return jsonify({"msg": "Invalid month format, expected YYYY-MM"}), 400
+    return jsonify(LedgerService.trial_balance(as_of)), 200
 
+@reports_bp.route("/reports/ledger/income_statement", methods=["GET"])
+@permission_required("view_reports", "view")
+@conditional_get("accounts", "account_balances_monthly")
+def get_income_statement():
+    try:
+        start_month = _parse_month_arg("start_month")
+        end_month = _parse_month_arg("end_month")
+    except ValueError:
+        return jsonify({"msg": "Invalid month format, expected YYYY-MM"}), 400
+    return jsonify(LedgerService.income_statement(start_month, end_month)), 200
 
+@reports_bp.route("/reports/ledger/balance_sheet", methods=["GET"])
+@permission_required("view_reports", "view")
+@conditional_get("accounts", "account_balances_monthly")
+def get_balance_sheet():
+    try:
+        as_of = _parse_month_arg("as_of")
+    except ValueError:
+        return jsonify({"msg": "Invalid month format, expected YYYY-MM"}), 400
+    return jsonify(LedgerService.balance_sheet(as_of)), 200
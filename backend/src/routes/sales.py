@@ -1,14 +1,57 @@
 
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from src.models import db, Sale, Unit, User, CashierBalance, CashierTransaction
+from src.models import db, Sale, SaleCalculationLine, SalesPerformanceMonthly, Unit, User, CashierBalance, CashierTransaction
 from src.services.calculation_service import CalculationService
+from src.services.commission_service import CommissionService
 from src.services.dynamic_calculation_service import DynamicCalculationService
+from src.services.ledger_service import LedgerService
+from src.services.occupancy_service import OccupancyService, OccupancyConflict
+from src.services.period_service import PeriodService, PeriodClosed
 from src.utils.auth_utils import permission_required
+from src.utils.cache_utils import conditional_get
+from src.utils.serialization import ModelSerializer, json_response
+from sqlalchemy.orm import aliased
 from datetime import datetime
 
 sales_bp = Blueprint("sales", __name__)
 
+# A sale's revenue transaction and the repricing corrections posted against it
+SALE_CASHIER_TYPES = ("sale_revenue", "sale_revenue_adjustment")
+
+def _sale_cashier_impact(sale_id):
+    """Current effect of a sale on the cashier: its revenue transaction plus any repricing adjustments"""
+    return float(db.session.execute(
+        db.select(db.func.coalesce(db.func.sum(CashierTransaction.signed_amount()), 0))
+        .where(CashierTransaction.reference_id == sale_id,
+               CashierTransaction.transaction_type.in_(SALE_CASHIER_TYPES))
+    ).scalar())
+
+def _delete_sale_adjustments(sale_id):
+    db.session.execute(db.delete(CashierTransaction).where(
+        CashierTransaction.reference_id == sale_id,
+        CashierTransaction.transaction_type == "sale_revenue_adjustment"
+    ))
+
+salesperson_user = aliased(User)
+sales_manager_user = aliased(User)
+sale_serializer = ModelSerializer(
+    Sale,
+    extra_columns={
+        "unit_code": Unit.code,
+        "unit_type": Unit.type,
+        "salesperson_name": salesperson_user.first_name + " " + salesperson_user.last_name,
+        "sales_manager_name": sales_manager_user.first_name + " " + sales_manager_user.last_name,
+    },
+    joins=[
+        (Unit, Unit.id == Sale.unit_id),
+        (salesperson_user, salesperson_user.id == Sale.salesperson_id),
+        (sales_manager_user, sales_manager_user.id == Sale.sales_manager_id),
+    ],
+    json_columns={"calculation_breakdown": dict, "custom_fields_data": dict},
+    exclude=("calculation_breakdown_archive",),
+)
+
 @sales_bp.route("/sales", methods=["POST"])
 @permission_required("manage_sales", "create")
 def create_sale():
@@ -27,8 +70,6 @@ def create_sale():
     unit = Unit.query.get(unit_id)
     if not unit:
         return jsonify({"msg": "Unit not found"}), 404
-    if unit.status != "متاحة":
-        return jsonify({"msg": "Unit is not available for sale"}), 400
 
     salesperson = User.query.get(salesperson_id)
     if not salesperson:
@@ -46,10 +87,20 @@ def create_sale():
     except ValueError:
         return jsonify({"msg": "Invalid date or price format"}), 400
 
+    try:
+        PeriodService.check_open(sale_date)
+    except PeriodClosed as e:
+        return jsonify({"msg": str(e)}), 409
+
+    # A sale occupies the unit from the sale date on; it must not overlap a sale or lease
+    conflict = OccupancyService.find_conflict(unit_id, sale_date)
+    if conflict:
+        return jsonify({"msg": "Unit is not available for sale", "error": str(OccupancyConflict(conflict))}), 409
+
     # Calculate financials using dynamic calculation service
     try:
         calculations = DynamicCalculationService.calculate_sale_amounts(
-            sale_price, unit_id, salesperson_id, sales_manager_id
+            sale_price, unit_id, salesperson_id, sales_manager_id, snapshot_rules=True
         )
     except Exception as e:
         return jsonify({"msg": f"Calculation error: {str(e)}"}), 500
@@ -71,20 +122,12 @@ def create_sale():
     
     # Store detailed calculation breakdown
     new_sale.set_calculation_breakdown(calculations)
-    new_sale.save()
-
-    # Update unit status
-    unit.status = "مباعة"
-    unit.save()
-
-    # Update cashier balance and record transaction
-    current_balance = CashierBalance.get_current_balance()
-    cashier_impact = CalculationService.calculate_cashier_impact(
-        "sale_revenue", new_sale.net_company_revenue
-    )
-    new_balance = current_balance + cashier_impact
-    CashierBalance.update_balance(new_balance)
+    db.session.add(new_sale)
+    db.session.flush()
+    # Occupancy interval and unit status, committed with the sale
+    OccupancyService.occupy(unit_id, "sale", new_sale.id, sale_date)
 
+    # Record the cashier transaction
     cashier_transaction = CashierTransaction(
         transaction_date=datetime.utcnow(),
         amount=new_sale.net_company_revenue,
@@ -93,18 +136,31 @@ def create_sale():
         notes=f"إيراد بيع الوحدة {unit.code} للعميل {client_name}",
         user_id=get_jwt_identity() # User who created the sale
     )
-    cashier_transaction.save()
+    db.session.add(cashier_transaction)
+    # Accrue the commissions, count the sale in the leaderboard and post its journal entry
+    CommissionService.sync_accruals([new_sale.id])
+    SalesPerformanceMonthly.record_change({}, SalesPerformanceMonthly.sale_contributions(new_sale))
+    LedgerService.sync("sale", [new_sale.id])
+
+    # Update cashier balance; update_balance commits the sale and everything recorded with it
+    current_balance = CashierBalance.get_current_balance()
+    cashier_impact = CalculationService.calculate_cashier_impact(
+        "sale_revenue", new_sale.net_company_revenue
+    )
+    CashierBalance.update_balance(current_balance + cashier_impact)
 
     return jsonify({"msg": "Sale created successfully", "sale": new_sale.to_dict()}), 201
 
 @sales_bp.route("/sales", methods=["GET"])
 @permission_required("manage_sales", "view")
+@conditional_get("sales", "units", "users")
 def get_sales():
-    sales = Sale.query.all()
-    return jsonify([sale.to_dict() for sale in sales]), 200
+    sales = SaleCalculationLine.get_breakdowns(sale_serializer.fetch())
+    return json_response(sales)
 
 @sales_bp.route("/sales/<int:sale_id>", methods=["GET"])
 @permission_required("manage_sales", "view")
+@conditional_get("sales", "units", "users")
 def get_sale(sale_id):
     sale = Sale.query.get(sale_id)
     if not sale:
@@ -118,6 +174,8 @@ def update_sale(sale_id):
     if not sale:
         return jsonify({"msg": "Sale not found"}), 404
 
+    performance_before = SalesPerformanceMonthly.sale_contributions(sale)
+
     data = request.get_json()
     unit_id = data.get("unit_id", sale.unit_id)
     client_name = data.get("client_name", sale.client_name)
@@ -147,42 +205,49 @@ def update_sale(sale_id):
     except ValueError:
         return jsonify({"msg": "Invalid date or price format"}), 400
 
-    # Re-calculate financials if relevant fields changed
+    try:
+        PeriodService.check_open(sale.sale_date, sale_date)
+    except PeriodClosed as e:
+        return jsonify({"msg": str(e)}), 409
+
+    conflict = OccupancyService.find_conflict(unit_id, sale_date, exclude=("sale", sale.id))
+    if conflict:
+        return jsonify({"msg": "Unit is not available for sale", "error": str(OccupancyConflict(conflict))}), 409
+
+    # Re-calculate financials if relevant fields changed; nothing is written before this succeeds
+    cashier_delta = 0
     if (sale_price != sale.sale_price or 
         unit.type != sale.unit.type or 
         salesperson_id != sale.salesperson_id or 
         sales_manager_id != sale.sales_manager_id):
         
-        # Revert previous cashier impact (if any)
-        previous_cashier_impact = CalculationService.calculate_cashier_impact(
-            "sale_revenue", sale.net_company_revenue
-        )
-        current_balance = CashierBalance.get_current_balance()
-        CashierBalance.update_balance(current_balance - previous_cashier_impact)
-        
-        financials = CalculationService.calculate_sale_financials(
-            sale_price, unit.type, salesperson_id, sales_manager_id
-        )
-        sale.company_commission = financials["company_commission"]
-        sale.salesperson_commission = financials["salesperson_commission"]
-        sale.sales_manager_commission = financials["sales_manager_commission"]
-        sale.total_taxes = financials["total_taxes"]
-        sale.net_company_revenue = financials["net_company_revenue"]
-        
-        # Apply new cashier impact
-        new_cashier_impact = CalculationService.calculate_cashier_impact(
+        # Same engine and rules as create_sale
+        try:
+            calculations = DynamicCalculationService.calculate_sale_amounts(
+                sale_price, unit_id, salesperson_id, sales_manager_id, snapshot_rules=True
+            )
+        except Exception as e:
+            return jsonify({"msg": f"Calculation error: {str(e)}"}), 500
+
+        # Previous cashier impact (including repricing adjustments) replaced by the new one, as one delta
+        previous_cashier_impact = _sale_cashier_impact(sale.id)
+        sale.company_commission = calculations["totals"]["company_commission"]
+        sale.salesperson_commission = calculations["totals"]["salesperson_commission"]
+        sale.sales_manager_commission = calculations["totals"]["sales_manager_commission"]
+        sale.total_taxes = calculations["totals"]["total_taxes"]
+        sale.net_company_revenue = calculations["totals"]["net_company_revenue"]
+        sale.set_calculation_breakdown(calculations)
+        cashier_delta = CalculationService.calculate_cashier_impact(
             "sale_revenue", sale.net_company_revenue
-        )
-        current_balance = CashierBalance.get_current_balance()
-        CashierBalance.update_balance(current_balance + new_cashier_impact)
+        ) - previous_cashier_impact
 
-        # Update cashier transaction
+        # Update cashier transaction; it now carries the whole revenue, so the adjustments go
+        _delete_sale_adjustments(sale.id)
         cashier_transaction = CashierTransaction.query.filter_by(reference_id=sale.id, transaction_type="sale_revenue").first()
         if cashier_transaction:
             cashier_transaction.amount = sale.net_company_revenue
             cashier_transaction.transaction_date = datetime.utcnow()
             cashier_transaction.notes = f"تحديث إيراد بيع الوحدة {unit.code} للعميل {client_name}"
-            cashier_transaction.save()
 
     sale.unit_id = unit_id
     sale.client_name = client_name
@@ -191,7 +256,16 @@ def update_sale(sale_id):
     sale.salesperson_id = salesperson_id
     sale.sales_manager_id = sales_manager_id
     sale.notes = notes
-    sale.save()
+    # Moves the occupancy (and frees the previous unit) when the unit or date changed
+    OccupancyService.occupy(unit_id, "sale", sale.id, sale_date)
+    SalesPerformanceMonthly.record_change(performance_before, SalesPerformanceMonthly.sale_contributions(sale))
+    CommissionService.sync_accruals([sale.id])
+    LedgerService.sync("sale", [sale.id])
+    if cashier_delta:
+        # update_balance commits the sale and everything recorded with it
+        CashierBalance.update_balance(CashierBalance.get_current_balance() + cashier_delta)
+    else:
+        db.session.commit()
 
     return jsonify({"msg": "Sale updated successfully", "sale": sale.to_dict()}), 200
 
@@ -202,25 +276,31 @@ def delete_sale(sale_id):
     if not sale:
         return jsonify({"msg": "Sale not found"}), 404
 
-    # Revert cashier impact
-    current_balance = CashierBalance.get_current_balance()
-    cashier_impact = CalculationService.calculate_cashier_impact(
-        "sale_revenue", sale.net_company_revenue
-    )
-    CashierBalance.update_balance(current_balance - cashier_impact)
+    try:
+        PeriodService.check_open(sale.sale_date)
+    except PeriodClosed as e:
+        return jsonify({"msg": str(e)}), 409
 
-    # Delete cashier transaction
+    # Cashier impact to revert, including repricing adjustments
+    cashier_impact = _sale_cashier_impact(sale.id)
+
+    # Delete cashier transactions
+    _delete_sale_adjustments(sale.id)
     cashier_transaction = CashierTransaction.query.filter_by(reference_id=sale.id, transaction_type="sale_revenue").first()
     if cashier_transaction:
-        cashier_transaction.delete()
+        db.session.delete(cashier_transaction)
+
+    # Free the unit
+    OccupancyService.release("sale", sale.id)
 
-    # Update unit status back to available
-    unit = Unit.query.get(sale.unit_id)
-    if unit:
-        unit.status = "متاحة"
-        unit.save()
+    # Unpaid commissions are dropped, paid ones clawed back in the next settlement run
+    CommissionService.sync_accruals([sale.id], removed=True)
+    SalesPerformanceMonthly.record_change(SalesPerformanceMonthly.sale_contributions(sale), {})
+    LedgerService.remove("sale", [sale.id])
+    db.session.delete(sale)
 
-    sale.delete()
+    # update_balance commits the deletion and everything reverted with it
+    CashierBalance.update_balance(CashierBalance.get_current_balance() - cashier_impact)
     return jsonify({"msg": "Sale deleted successfully"}), 200
 
 
@@ -3,10 +3,14 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
 from src.models import db, FinancialSetting, Template
 from src.utils.auth_utils import permission_required
+from src.utils.cache_utils import conditional_get
+from src.utils.serialization import ModelSerializer
 import json
 
 settings_bp = Blueprint("settings", __name__)
 
+financial_setting_serializer = ModelSerializer(FinancialSetting)
+
 # --- Financial Settings ---
 @settings_bp.route("/financial_settings", methods=["POST"])
 @permission_required("manage_settings", "create")
@@ -36,12 +40,13 @@ def create_financial_setting():
 
 @settings_bp.route("/financial_settings", methods=["GET"])
 @permission_required("manage_settings", "view")
+@conditional_get("financial_settings")
 def get_financial_settings():
-    settings = FinancialSetting.query.all()
-    return jsonify([setting.to_dict() for setting in settings]), 200
+    return financial_setting_serializer.response()
 
 @settings_bp.route("/financial_settings/<int:setting_id>", methods=["GET"])
 @permission_required("manage_settings", "view")
+@conditional_get("financial_settings")
 def get_financial_setting(setting_id):
     setting = FinancialSetting.query.get(setting_id)
     if not setting:
@@ -104,12 +109,14 @@ def create_template():
 
 @settings_bp.route("/templates", methods=["GET"])
 @permission_required("manage_settings", "view")
+@conditional_get("templates")
 def get_templates():
     templates = Template.query.all()
     return jsonify([template.to_dict() for template in templates]), 200
 
 @settings_bp.route("/templates/<int:template_id>", methods=["GET"])
 @permission_required("manage_settings", "view")
+@conditional_get("templates")
 def get_template(template_id):
     template = Template.query.get(template_id)
     if not template:
@@ -1,11 +1,26 @@
 
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
-from src.models import db, Unit
+from src.models import db, Unit, UnitOccupancy
+from src.services.occupancy_service import OccupancyService
+from src.services.unit_search_service import UnitSearchService, SEARCH_SORTS
+from src.services.unit_import_service import UnitImportService, UnitImportError
 from src.utils.auth_utils import permission_required
+from src.utils.cache_utils import conditional_get
+from src.utils.serialization import ModelSerializer, json_response
+from datetime import datetime
 
 units_bp = Blueprint("units", __name__)
 
+unit_serializer = ModelSerializer(Unit)
+
+SEARCH_MAX_LIMIT = 200
+
+def _list_arg(name):
+    """Comma-separated query argument as a list, or None"""
+    value = request.args.get(name)
+    return [item.strip() for item in value.split(",") if item.strip()] if value else None
+
 @units_bp.route("/units", methods=["POST"])
 @permission_required("manage_units", "create")
 def create_unit():
@@ -33,14 +48,89 @@ def create_unit():
     new_unit.save()
     return jsonify({"msg": "Unit created successfully", "unit": new_unit.to_dict()}), 201
 
+@units_bp.route("/units/import", methods=["POST"])
+@permission_required("manage_units", "create")
+def import_units():
+    """Create or update units from an uploaded .xlsx/.csv (multipart field 'file'), keyed by code
+
+    Returns a per-row report; dry_run=true validates without writing.
+    """
+    upload = request.files.get("file")
+    if not upload or not upload.filename:
+        return jsonify({"msg": "Missing file"}), 400
+    dry_run = request.args.get("dry_run", "").lower() in ("1", "true", "yes")
+    try:
+        rows = UnitImportService.read_rows(upload.stream, upload.filename)
+    except UnitImportError as e:
+        return jsonify({"msg": str(e)}), 400
+    except Exception:
+        return jsonify({"msg": "The file could not be read"}), 400
+    return json_response(UnitImportService.import_rows(rows, dry_run=dry_run))
+
 @units_bp.route("/units", methods=["GET"])
 @permission_required("manage_units", "view")
+@conditional_get("units")
 def get_units():
-    units = Unit.query.all()
-    return jsonify([unit.to_dict() for unit in units]), 200
+    return unit_serializer.response()
+
+@units_bp.route("/units/search", methods=["GET"])
+@permission_required("manage_units", "view")
+@conditional_get("units")
+def search_units():
+    """Units filtered by type, status, price and area ranges and free text (q), with facet counts"""
+    bounds = {name: request.args.get(name, type=float) for name in ("min_price", "max_price", "min_area", "max_area")}
+    if any(request.args.get(name) and bounds[name] is None for name in bounds):
+        return jsonify({"msg": "Invalid price or area bound"}), 400
+    sort = request.args.get("sort")
+    if sort and sort not in SEARCH_SORTS:
+        return jsonify({"msg": f"sort must be one of: {', '.join(SEARCH_SORTS)}"}), 400
+    offset = request.args.get("offset", 0, type=int)
+    limit = request.args.get("limit", 50, type=int)
+    if offset < 0 or limit < 1:
+        return jsonify({"msg": "offset and limit must be non-negative and positive"}), 400
+
+    result = UnitSearchService.search(
+        text=request.args.get("q", "").strip() or None,
+        types=_list_arg("type"),
+        statuses=_list_arg("status"),
+        sort=sort,
+        offset=offset,
+        limit=min(limit, SEARCH_MAX_LIMIT),
+        **bounds
+    )
+    return json_response(result)
+
+@units_bp.route("/units/availability", methods=["GET"])
+@permission_required("manage_units", "view")
+@conditional_get("units", "unit_occupancy")
+def get_available_units():
+    """Units free over [start_date, end_date); without end_date, free from start_date on (for a sale)"""
+    try:
+        start_date = datetime.strptime(request.args["start_date"], "%Y-%m-%d").date()
+        end_date = datetime.strptime(request.args["end_date"], "%Y-%m-%d").date() if request.args.get("end_date") else None
+    except KeyError:
+        return jsonify({"msg": "Missing required parameter: start_date"}), 400
+    except ValueError:
+        return jsonify({"msg": "Invalid date format"}), 400
+    if end_date and end_date <= start_date:
+        return jsonify({"msg": "end_date must be after start_date"}), 400
+
+    statement = unit_serializer.select().where(OccupancyService.unoccupied(start_date, end_date))
+    if request.args.get("type"):
+        statement = statement.where(Unit.type == request.args["type"])
+    return unit_serializer.response(statement.order_by(Unit.code))
+
+@units_bp.route("/units/<int:unit_id>/occupancy", methods=["GET"])
+@permission_required("manage_units", "view")
+@conditional_get("unit_occupancy")
+def get_unit_occupancy(unit_id):
+    """The sale and lease intervals of a unit, in date order"""
+    occupancies = UnitOccupancy.query.filter_by(unit_id=unit_id).order_by(UnitOccupancy.start_date).all()
+    return jsonify([occupancy.to_dict() for occupancy in occupancies]), 200
 
 @units_bp.route("/units/<int:unit_id>", methods=["GET"])
 @permission_required("manage_units", "view")
+@conditional_get("units")
 def get_unit(unit_id):
     unit = Unit.query.get(unit_id)
     if not unit:
@@ -0,0 +1,74 @@
+import sys
+import os
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.models import (
+    db, Sale, RentalPayment, Expense, FinishingWorkExpense, CommissionSettlementRun, CashierBalance
+)
+from src.services.ledger_service import LedgerService, CASH
+from flask import Flask
+
+app = Flask(__name__)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'mysql+pymysql://acc_user:acc_pass@db:3306/acc_db')
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+db.init_app(app)
+
+# Source documents and the id column their journal entries are keyed on
+SOURCE_IDS = {
+    'sale': Sale.id,
+    'rental_payment': RentalPayment.id,
+    'expense': Expense.id,
+    'finishing_work_expense': FinishingWorkExpense.id,
+    'commission_settlement': CommissionSettlementRun.id,
+}
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Post the journal entries of all existing documents (idempotent) and rebuild the account balances"
+    )
+    parser.add_argument('--chunk-size', type=int, default=500, help="Documents per chunk and per commit")
+    parser.add_argument('--opening-cash', action='store_true',
+                        help="Post the difference between the cashier balance and the ledger cash as an opening balance")
+    return parser.parse_args(argv)
+
+def backfill_ledger(args):
+    with app.app_context():
+        LedgerService.ensure_chart()
+        for source_type, id_column in SOURCE_IDS.items():
+            posted, last_id = 0, 0
+            while True:
+                ids = list(db.session.execute(
+                    db.select(id_column).where(id_column > last_id).order_by(id_column).limit(args.chunk_size)
+                ).scalars())
+                if not ids:
+                    break
+                LedgerService.sync(source_type, ids)
+                db.session.commit()
+                posted += len(ids)
+                last_id = ids[-1]
+            print(f"{source_type}: {posted} documents synced")
+
+        LedgerService.rebuild_balances()
+        if args.opening_cash:
+            LedgerService.remove('opening_balance', [0])
+            db.session.commit()
+            ledger_cash = next(account['balance'] for account in LedgerService.account_balances()
+                               if account['code'] == CASH)
+            difference = round(float(CashierBalance.get_current_balance()) - ledger_cash, 2)
+            if difference:
+                LedgerService.post_opening_cash(difference)
+            print(f"opening cash balance: {difference}")
+
+        ledger_cash = next(account['balance'] for account in LedgerService.account_balances()
+                           if account['code'] == CASH)
+        print(f"ledger cash: {ledger_cash}, cashier balance: {round(float(CashierBalance.get_current_balance()), 2)}")
+        trial_balance = LedgerService.trial_balance()
+    print(f"trial balance: debit {trial_balance['total_debit']}, credit {trial_balance['total_credit']}")
+    return trial_balance
+
+if __name__ == '__main__':
+    trial_balance = backfill_ledger(parse_args(sys.argv[1:]))
+    sys.exit(0 if trial_balance['balanced'] else 1)
@@ -0,0 +1,90 @@
+import sys
+import os
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.models import db, Sale, Unit, User, Role
+from flask import Flask
+
+app = Flask(__name__)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('BENCHMARK_DATABASE_URL', 'sqlite://')
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+db.init_app(app)
+
+def seed(row_count):
+    """Insert row_count sales (with units and two users) into an empty database"""
+    db.create_all()
+    role = Role(name='Benchmark')
+    db.session.add(role)
+    db.session.flush()
+    users = [
+        User(username=f'bench{i}', email=f'bench{i}@example.com', password_hash='-',
+             first_name='Bench', last_name=str(i), role_id=role.id)
+        for i in range(2)
+    ]
+    db.session.add_all(users)
+    db.session.flush()
+
+    breakdown = {
+        'base_amount': 1000000.0,
+        'unit_type': 'شقة',
+        'applied_rules': [
+            {'rule_id': 1, 'rule_name_ar': 'عمولة الشركة', 'rule_name_en': 'Company Commission',
+             'rule_type': 'commission', 'calculation_type': 'percentage', 'value': 3.0,
+             'calculated_amount': 30000.0, 'base_amount': 1000000.0},
+            {'rule_id': 4, 'rule_name_ar': 'ضريبة القيمة المضافة', 'rule_name_en': 'VAT Tax',
+             'rule_type': 'tax', 'calculation_type': 'percentage', 'value': 14.0,
+             'calculated_amount': 140000.0, 'base_amount': 1000000.0},
+        ],
+        'totals': {'company_commission': 30000.0, 'total_taxes': 140000.0, 'net_company_revenue': -110000.0},
+    }
+    for i in range(row_count):
+        unit = Unit(code=f'B-{i}', type='شقة', price=1000000, area_sqm=120, status='مباعة')
+        db.session.add(unit)
+        db.session.flush()
+        sale = Sale(
+            unit_id=unit.id, client_name=f'Client {i}', sale_date=date(2025, 1, 1) + timedelta(days=i % 365),
+            sale_price=1000000, salesperson_id=users[0].id, sales_manager_id=users[1].id,
+            company_commission=30000, salesperson_commission=10000, sales_manager_commission=5000,
+            total_taxes=140000, net_company_revenue=-110000
+        )
+        sale.set_calculation_breakdown(breakdown)
+        db.session.add(sale)
+    db.session.commit()
+
+def time_call(fn, repeat):
+    """Best wall-clock time of fn over repeat runs"""
+    best = None
+    for _ in range(repeat):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def run_benchmark(row_count=10000, repeat=3):
+    from src.routes.sales import sale_serializer
+    from src.utils.serialization import json_response
+
+    with app.app_context():
+        seed(row_count)
+
+        def to_dict_path():
+            return app.json.dumps([sale.to_dict() for sale in Sale.query.all()])
+
+        def serializer_path():
+            return json_response(sale_serializer.fetch()).get_data()
+
+        baseline = time_call(to_dict_path, repeat)
+        compiled = time_call(serializer_path, repeat)
+        print(f"rows:                {row_count}")
+        print(f"to_dict + jsonify:   {baseline * 1000:.1f} ms")
+        print(f"ModelSerializer:     {compiled * 1000:.1f} ms")
+        print(f"speedup:             {baseline / compiled:.1f}x")
+
+if __name__ == '__main__':
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,73 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.models import db, FinancialSetting
+from src.services.calculation_engine import CalculationEngine, CalculationPlan, SettingsRuleSource
+from flask import Flask
+
+app = Flask(__name__)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'mysql+pymysql://acc_user:acc_pass@db:3306/acc_db')
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+db.init_app(app)
+
+SALE_PRICES = [0, 1, 999.99, 250000, 1234567.89, 15000000]
+UNIT_TYPES = list(SettingsRuleSource.UNIT_TYPE_KEYS) + ['غير معروف']
+PARTICIPANTS = [(1, None), (1, 2), (None, None)]
+
+def settings_formula(sale_price, unit_type, salesperson_id, sales_manager_id):
+    """Sale totals as computed from FinancialSetting keys before the calculation engine"""
+    vat_rate = FinancialSetting.get_value('VAT_RATE', 0.14)
+    sales_tax_rate = FinancialSetting.get_value('SALES_TAX_RATE', 0.05)
+    admin_discount_rate = FinancialSetting.get_value('ADMIN_DISCOUNT_PERCENTAGE', 0.05)
+    key = SettingsRuleSource.UNIT_TYPE_KEYS.get(unit_type, SettingsRuleSource.DEFAULT_UNIT_TYPE_KEY)
+
+    company_commission = sale_price * FinancialSetting.get_value(f'COMPANY_COMMISSION_{key}', 0.02)
+    salesperson_commission = (sale_price * FinancialSetting.get_value(f'SALESPERSON_COMMISSION_{key}', 0.005)
+                              if salesperson_id else 0)
+    sales_manager_commission = (sale_price * FinancialSetting.get_value('SALES_MANAGER_COMMISSION', 0.003)
+                                if sales_manager_id else 0)
+    after_admin_discount = company_commission * (1 - admin_discount_rate)
+    total_taxes = after_admin_discount * vat_rate + after_admin_discount * sales_tax_rate
+    return {
+        'company_commission': company_commission,
+        'salesperson_commission': salesperson_commission,
+        'sales_manager_commission': sales_manager_commission,
+        'total_taxes': total_taxes,
+        'net_company_revenue': after_admin_discount - total_taxes,
+    }
+
+def check_calculation_parity():
+    with app.app_context():
+        plan = CalculationPlan(SettingsRuleSource.load_rules())
+        failures = 0
+        for unit_type in UNIT_TYPES:
+            for sale_price in SALE_PRICES:
+                for salesperson_id, sales_manager_id in PARTICIPANTS:
+                    participants = [name for name, user_id in (('salesperson', salesperson_id),
+                                                               ('sales_manager', sales_manager_id)) if user_id]
+                    totals = plan.evaluate(sale_price, unit_type, participants)['totals']
+                    expected = settings_formula(sale_price, unit_type, salesperson_id, sales_manager_id)
+                    # Compare before rounding so half-piastre ties do not count as mismatches
+                    mismatched = {key: (totals[key], value) for key, value in expected.items()
+                                  if abs(totals[key] - value) > 0.0001}
+                    if mismatched:
+                        failures += 1
+                        print(f"MISMATCH  {unit_type} {sale_price}: {mismatched}")
+        print(f"settings source: {failures} mismatches")
+
+        # create, update and preview all call CalculationEngine.calculate_sale; make sure the cached
+        # plan gives the same result as a freshly compiled one for the configured source
+        fresh = CalculationPlan(CalculationEngine.get_source().load_rules())
+        cached = CalculationEngine.get_plan()
+        for unit_type in UNIT_TYPES:
+            for sale_price in SALE_PRICES:
+                if fresh.evaluate(sale_price, unit_type) != cached.evaluate(sale_price, unit_type):
+                    failures += 1
+                    print(f"CACHE MISMATCH  {unit_type} {sale_price}")
+        return failures
+
+if __name__ == '__main__':
+    sys.exit(1 if check_calculation_parity() else 0)
@@ -0,0 +1,110 @@
+import sys
+import os
+import random
+import argparse
+from decimal import Decimal
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.services.calculation_engine import CalculationPlan
+from src.services.fixed_point import (
+    np, to_piastres, to_rate_units, percentage_piastres, percentage_piastres_batch, decimal_percentage
+)
+
+# Rates used by the default settings rules and a few awkward ones
+RATES = [0, 0.3, 0.5, 1.5, 2, 5, 14, 12.3456, 100]
+
+def random_price(rng):
+    """Sale prices up to 100M with piastres, plus exact half-piastre ties"""
+    price = Decimal(rng.randint(0, 10_000_000_000)) / 100
+    if rng.random() < 0.2:
+        price += Decimal('0.005')
+    return price
+
+def check_scalar(rng, samples):
+    failures = 0
+    for _ in range(samples):
+        price, rate = random_price(rng), rng.choice(RATES)
+        got = percentage_piastres(to_piastres(price), to_rate_units(rate))
+        expected = int(decimal_percentage(price, rate) * 100)
+        if got != expected:
+            failures += 1
+            print(f"SCALAR MISMATCH  {price} x {rate}%: {got} != {expected}")
+    return failures
+
+def check_batch(rng, samples):
+    failures = 0
+    prices = [to_piastres(random_price(rng)) for _ in range(samples)]
+    for rate in RATES:
+        rate_units = to_rate_units(rate)
+        batch = percentage_piastres_batch(prices, rate_units)
+        for price, got in zip(prices, batch):
+            expected = percentage_piastres(price, rate_units)
+            if int(got) != expected:
+                failures += 1
+                print(f"BATCH MISMATCH  {price} x {rate}%: {got} != {expected}")
+    return failures
+
+def decimal_totals(rules, sale_price, unit_type, participants):
+    """Reference totals: every rule amount quantized once, then summed as Decimal"""
+    plan = CalculationPlan(rules)
+    totals = dict.fromkeys(['company_commission', 'salesperson_commission', 'sales_manager_commission',
+                            'total_taxes', 'total_fees', 'total_discounts'], Decimal(0))
+    for node in plan.nodes:
+        if not node.total_key or not node.applies(unit_type, participants):
+            continue
+        if node.rule['calculation_type'] == 'percentage':
+            amount = decimal_percentage(sale_price, node.rule['value'])
+        else:
+            amount = Decimal(str(node.rule['value'])).quantize(Decimal('0.01'))
+        totals[node.total_key] += amount
+    totals['net_company_revenue'] = (totals['company_commission'] - totals['total_taxes'] -
+                                     totals['total_fees'] + totals['total_discounts'])
+    return totals
+
+def check_plan(rng, samples):
+    """Fixed-point plan totals (scalar and batch) against the Decimal reference"""
+    rules = [
+        {'id': -1, 'name_ar': 'عمولة الشركة', 'name_en': 'Company commission', 'rule_type': 'commission',
+         'calculation_type': 'percentage', 'value': 2.0, 'unit_type_filter': None, 'order_index': 1},
+        {'id': -2, 'name_ar': 'عمولة البائع', 'name_en': 'Salesperson commission', 'rule_type': 'commission',
+         'calculation_type': 'percentage', 'value': 0.5, 'unit_type_filter': None, 'order_index': 2,
+         'requires': 'salesperson'},
+        {'id': -3, 'name_ar': 'ضريبة', 'name_en': 'Tax', 'rule_type': 'tax',
+         'calculation_type': 'percentage', 'value': 0.3705, 'unit_type_filter': None, 'order_index': 3},
+        {'id': -4, 'name_ar': 'رسوم', 'name_en': 'Fee', 'rule_type': 'fee',
+         'calculation_type': 'fixed_amount', 'value': 150.255, 'unit_type_filter': None, 'order_index': 4},
+    ]
+    plan = CalculationPlan(rules, fixed_point=True)
+    failures = 0
+    prices = [random_price(rng) for _ in range(samples)]
+    for participants in (['salesperson'], []):
+        batch = plan.evaluate_totals_batch(prices, 'شقة', participants)
+        for index, price in enumerate(prices):
+            expected = decimal_totals(rules, price, 'شقة', participants)
+            totals = plan.evaluate(price, 'شقة', participants)['totals']
+            for key, value in expected.items():
+                if to_piastres(totals[key]) != int(value * 100):
+                    failures += 1
+                    print(f"PLAN MISMATCH  {price} {key}: {totals[key]} != {value}")
+                if batch is not None and int(batch[key][index]) != int(value * 100):
+                    failures += 1
+                    print(f"PLAN BATCH MISMATCH  {price} {key}: {batch[key][index]} != {value}")
+    return failures
+
+def check_fixed_point(seed, samples):
+    rng = random.Random(seed)
+    failures = check_scalar(rng, samples)
+    if np is None:
+        print("numpy not installed: batch checks use the plain Python fallback")
+    failures += check_batch(rng, samples)
+    failures += check_plan(rng, samples // 10 or 1)
+    print(f"seed {seed}: {failures} mismatches")
+    return failures
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Property checks for fixed-point calculation arithmetic")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--samples', type=int, default=20000)
+    args = parser.parse_args()
+    sys.exit(1 if check_fixed_point(args.seed, args.samples) else 0)
@@ -0,0 +1,92 @@
+import sys
+import os
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.models import db, Sale, SaleTaxLine, Expense, RentalPayment, FinishingWorkExpense, CashierTransaction
+from flask import Flask
+
+app = Flask(__name__)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'mysql+pymysql://acc_user:acc_pass@db:3306/acc_db')
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+db.init_app(app)
+
+START_DATE = date(2025, 1, 1)
+END_DATE = date(2025, 12, 31)
+
+def report_queries():
+    """Representative query shapes issued by the report and write routes, with the table each one
+    must read through an index and the indexes that may serve it"""
+    return [
+        ('sales by date range', 'sales', ('ix_sales_sale_date',),
+         Sale.query.filter(Sale.sale_date >= START_DATE, Sale.sale_date <= END_DATE)),
+        ('expenses by date range', 'expenses', ('ix_expenses_expense_date',),
+         Expense.query.filter(Expense.expense_date >= START_DATE, Expense.expense_date <= END_DATE)),
+        ('expenses by category and date range', 'expenses', ('ix_expenses_category_date',),
+         Expense.query.filter(Expense.category_id == 1,
+                              Expense.expense_date >= START_DATE, Expense.expense_date <= END_DATE)),
+        ('rental payments by date range', 'rental_payments', ('ix_rental_payments_payment_date',),
+         RentalPayment.query.filter(RentalPayment.payment_date >= START_DATE,
+                                    RentalPayment.payment_date <= END_DATE)),
+        ('finishing work expenses by date range', 'finishing_work_expenses',
+         ('ix_finishing_work_expenses_expense_date',),
+         FinishingWorkExpense.query.filter(FinishingWorkExpense.expense_date >= START_DATE,
+                                           FinishingWorkExpense.expense_date <= END_DATE)),
+        ('cashier transactions by date range', 'cashier_transactions',
+         ('ix_cashier_transactions_date', 'ix_cashier_transactions_rollup'),
+         CashierTransaction.query.filter(CashierTransaction.transaction_date >= datetime(2025, 1, 1),
+                                         CashierTransaction.transaction_date < datetime(2026, 1, 1))),
+        ('cashier transactions by type and date range', 'cashier_transactions',
+         ('ix_cashier_transactions_type_date',),
+         CashierTransaction.query.filter(CashierTransaction.transaction_type == 'sale_revenue',
+                                         CashierTransaction.transaction_date >= datetime(2025, 1, 1),
+                                         CashierTransaction.transaction_date < datetime(2026, 1, 1))),
+        ('cashier transaction by reference', 'cashier_transactions', ('ix_cashier_transactions_reference',),
+         CashierTransaction.query.filter_by(reference_id=1, transaction_type='sale_revenue')),
+        ('tax lines of sales in a date range', 'sales', ('ix_sales_sale_date',),
+         SaleTaxLine.query.join(Sale, Sale.id == SaleTaxLine.sale_id)
+         .filter(Sale.sale_date >= START_DATE, Sale.sale_date <= END_DATE)),
+        ('tax lines of sales in a date range', 'sale_tax_lines', ('ix_sale_tax_lines_sale',),
+         SaleTaxLine.query.join(Sale, Sale.id == SaleTaxLine.sale_id)
+         .filter(Sale.sale_date >= START_DATE, Sale.sale_date <= END_DATE)),
+    ]
+
+def plan_keys(sql, table_name):
+    """(index used to read table_name or None, plan rows for the table)"""
+    dialect = db.engine.dialect.name
+    if dialect == 'mysql':
+        rows = [dict(row) for row in db.session.execute(db.text(f'EXPLAIN {sql}')).mappings()
+                if row['table'] == table_name]
+        # 'ALL' is a table scan and 'index' a full scan of an index: neither narrows the rows read
+        used = [row['key'] for row in rows if row['key'] and row['type'] not in ('ALL', 'index')]
+        return (used[0] if used else None), rows
+    if dialect == 'sqlite':
+        rows = [dict(row) for row in db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}')).mappings()
+                if row['detail'].split(' ')[1:2] == [table_name]]
+        used = [row['detail'].split(' INDEX ')[1].split(' ')[0] for row in rows
+                if row['detail'].startswith('SEARCH ') and ' INDEX ' in row['detail']]
+        return (used[0] if used else None), rows
+    raise RuntimeError(f'Unsupported database dialect: {dialect}')
+
+def check_query_plans():
+    """
+    EXPLAIN each report query and fail unless the planner reads the table through one of the
+    expected indexes. Run manually or from a deploy job against a database with representative
+    data: on near-empty MySQL tables the optimizer may prefer a scan regardless of the indexes.
+    """
+    with app.app_context():
+        failures = 0
+        for label, table_name, expected_keys, query in report_queries():
+            sql = str(query.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+            key, rows = plan_keys(sql, table_name)
+            if key in expected_keys:
+                print(f"ok         {label} ({table_name}): {key}")
+            else:
+                failures += 1
+                print(f"WRONG PLAN {label} ({table_name}): expected {' or '.join(expected_keys)}, got {rows}")
+        return failures
+
+if __name__ == '__main__':
+    sys.exit(1 if check_query_plans() else 0)
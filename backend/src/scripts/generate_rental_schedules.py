@@ -0,0 +1,34 @@
+import sys
+import os
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.models import db
+from src.services.rental_service import RentalService, SCHEDULE_CHUNK_SIZE
+from flask import Flask
+
+app = Flask(__name__)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'mysql+pymysql://acc_user:acc_pass@db:3306/acc_db')
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+db.init_app(app)
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Fill the missing scheduled payments of running leases (nightly)")
+    parser.add_argument('--from-date', type=lambda value: datetime.strptime(value, '%Y-%m-%d').date(),
+                        help="First due date to fill, YYYY-MM-DD (default today)")
+    parser.add_argument('--chunk-size', type=int, default=SCHEDULE_CHUNK_SIZE, help="Leases per chunk and per commit")
+    return parser.parse_args(argv)
+
+def generate_rental_schedules(args):
+    with app.app_context():
+        result = RentalService.generate_missing(args.from_date, args.chunk_size)
+    print(f"{result['payments']} payments scheduled for {result['rentals']} leases")
+    if result['skipped']:
+        print(f"skipped (unknown payment frequency): {', '.join(map(str, result['skipped']))}")
+    return result
+
+if __name__ == '__main__':
+    generate_rental_schedules(parse_args(sys.argv[1:]))
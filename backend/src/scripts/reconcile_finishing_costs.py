@@ -0,0 +1,40 @@
+import sys
+import os
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.models import db
+from src.services.finishing_work_service import FinishingWorkService
+from flask import Flask
+
+app = Flask(__name__)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'mysql+pymysql://acc_user:acc_pass@db:3306/acc_db')
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+db.init_app(app)
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Verify finishing_works.actual_cost against the sum of each project's expenses"
+    )
+    parser.add_argument('--fix', action='store_true', help="Overwrite mismatching totals with the expense sums")
+    return parser.parse_args(argv)
+
+def reconcile_finishing_costs(args):
+    with app.app_context():
+        mismatches = FinishingWorkService.reconcile(fix=args.fix)
+    for row in mismatches:
+        print(f"project {row['id']}: actual_cost {row['actual_cost']} != expenses {row['expenses_total']} "
+              f"(difference {row['difference']})")
+    if not mismatches:
+        print("All finishing-work totals match their expenses")
+    elif args.fix:
+        print(f"{len(mismatches)} totals corrected")
+    return mismatches
+
+if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
+    mismatches = reconcile_finishing_costs(args)
+    # Non-zero exit when a check-only run finds drift, for cron alerts
+    sys.exit(1 if mismatches and not args.fix else 0)
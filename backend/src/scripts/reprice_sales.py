@@ -0,0 +1,50 @@
+import sys
+import os
+import json
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.models import db
+from src.services.repricing_service import RepricingService, REPRICE_CHUNK_SIZE
+from flask import Flask
+
+app = Flask(__name__)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'mysql+pymysql://acc_user:acc_pass@db:3306/acc_db')
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+db.init_app(app)
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Recalculate sales affected by a calculation rule change")
+    parser.add_argument('--rule-id', type=int, required=True, help="Edited calculation rule")
+    parser.add_argument('--apply', action='store_true', help="Write new totals and compensating cashier transactions")
+    parser.add_argument('--user-id', type=int, help="User recorded on the cashier transactions (required with --apply)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument('--chunk-size', type=int, default=REPRICE_CHUNK_SIZE, help="Sales per chunk and per commit")
+    parser.add_argument('--report', help="Write the full diff report as JSON to this file")
+    return parser.parse_args(argv)
+
+def reprice_sales(args):
+    with app.app_context():
+        report = RepricingService.reprice(
+            args.rule_id, apply=args.apply, workers=args.workers,
+            user_id=args.user_id, chunk_size=args.chunk_size
+        )
+
+    for change in report['changes']:
+        old_net = change['old_totals']['net_company_revenue']
+        new_net = change['new_totals']['net_company_revenue']
+        print(f"sale {change['sale_id']:>8}  net {old_net:>15,.2f} -> {new_net:>15,.2f}  ({change['net_delta']:+,.2f})")
+    print(f"{'applied' if report['applied'] else 'dry run'}: "
+          f"{report['sales_changed']} of {report['sales_checked']} sales change")
+    for column, delta in report['total_deltas'].items():
+        print(f"  {column:<26} {delta:+,.2f}")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as report_file:
+            json.dump(report, report_file, ensure_ascii=False, indent=2)
+    return report
+
+if __name__ == '__main__':
+    reprice_sales(parse_args(sys.argv[1:]))
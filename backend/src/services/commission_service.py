@@ -0,0 +1,241 @@
+from datetime import date, datetime
+from decimal import Decimal
+from src.models import (
+    db, Sale, Unit, User, CashierBalance, CashierTransaction, CommissionAccrual, CommissionSettlementRun
+)
+from src.models.commissions import COMMISSION_PAYMENT_TYPES
+from src.services.ledger_service import LedgerService
+
+ROLE_NAMES_AR = {'salesperson': 'البائع', 'sales_manager': 'مدير المبيعات'}
+
+class CommissionService:
+    """Commission accruals written at sale time and paid out in settlement runs"""
+
+    @staticmethod
+    def sync_accruals(sale_ids, removed=False):
+        """
+        Bring the accruals of the given sales in line with their current commission columns
+
+        Unpaid accruals are replaced; settled ones are left alone and any difference against them
+        becomes a new (possibly negative) accrual dated today, so it lands in the next run.
+        Does not commit.
+
+        Args:
+            sale_ids: Sales to synchronize
+            removed: The sales are being deleted; their target commissions are zero
+        """
+        sale_ids = list(sale_ids)
+        if not sale_ids:
+            return 0
+
+        targets = {}
+        sale_dates = {}
+        if not removed:
+            for sale_id, sale_date, salesperson_id, salesperson_amount, sales_manager_id, sales_manager_amount in \
+                    db.session.execute(db.select(
+                        Sale.id, Sale.sale_date, Sale.salesperson_id, Sale.salesperson_commission,
+                        Sale.sales_manager_id, Sale.sales_manager_commission
+                    ).where(Sale.id.in_(sale_ids))):
+                sale_dates[sale_id] = sale_date
+                for role, user_id, amount in (('salesperson', salesperson_id, salesperson_amount),
+                                              ('sales_manager', sales_manager_id, sales_manager_amount)):
+                    if user_id and amount:
+                        targets[(sale_id, role, user_id)] = Decimal(str(amount))
+
+        settled = {
+            (sale_id, role, user_id): Decimal(str(amount))
+            for sale_id, role, user_id, amount in db.session.execute(
+                db.select(CommissionAccrual.sale_id, CommissionAccrual.role, CommissionAccrual.user_id,
+                          db.func.sum(CommissionAccrual.amount))
+                .where(CommissionAccrual.sale_id.in_(sale_ids), CommissionAccrual.settlement_run_id.isnot(None))
+                .group_by(CommissionAccrual.sale_id, CommissionAccrual.role, CommissionAccrual.user_id)
+            )
+        }
+
+        db.session.execute(
+            db.delete(CommissionAccrual)
+            .where(CommissionAccrual.sale_id.in_(sale_ids), CommissionAccrual.settlement_run_id.is_(None))
+            .execution_options(synchronize_session=False)
+        )
+
+        today = date.today()
+        accruals = []
+        for key in targets.keys() | settled.keys():
+            amount = targets.get(key, Decimal(0)) - settled.get(key, Decimal(0))
+            if not amount:
+                continue
+            sale_id, role, user_id = key
+            adjustment = key in settled
+            if removed:
+                notes = f"استرداد عمولة البيع المحذوف {sale_id}"
+            elif adjustment:
+                notes = f"فرق عمولة بعد تعديل البيع {sale_id}"
+            else:
+                notes = None
+            accruals.append({
+                'sale_id': None if removed else sale_id,
+                'user_id': user_id,
+                'role': role,
+                'amount': amount,
+                'accrual_date': today if adjustment else sale_dates[sale_id],
+                'notes': notes,
+            })
+        if removed:
+            # Settled accruals outlive the sale; detach them before it is deleted
+            db.session.execute(
+                db.update(CommissionAccrual).where(CommissionAccrual.sale_id.in_(sale_ids))
+                .values(sale_id=None).execution_options(synchronize_session=False)
+            )
+        if accruals:
+            db.session.execute(db.insert(CommissionAccrual), accruals)
+        return len(accruals)
+
+    @staticmethod
+    def unpaid_filters(period_end=None, user_ids=None):
+        filters = [CommissionAccrual.settlement_run_id.is_(None)]
+        if period_end:
+            filters.append(CommissionAccrual.accrual_date <= period_end)
+        if user_ids:
+            filters.append(CommissionAccrual.user_id.in_(user_ids))
+        return filters
+
+    @staticmethod
+    def grouped_balances(*filters):
+        """Accrual totals per payee and role, one GROUP BY over the matching accruals"""
+        rows = db.session.execute(
+            db.select(
+                CommissionAccrual.user_id, CommissionAccrual.role,
+                db.func.sum(CommissionAccrual.amount).label('amount'),
+                db.func.count(CommissionAccrual.id).label('accrual_count'),
+                (User.first_name + ' ' + User.last_name).label('user_name'),
+            )
+            .join(User, User.id == CommissionAccrual.user_id)
+            .where(*filters)
+            .group_by(CommissionAccrual.user_id, CommissionAccrual.role, User.first_name, User.last_name)
+            .order_by(CommissionAccrual.user_id, CommissionAccrual.role)
+        ).mappings()
+        return [
+            {'user_id': row['user_id'], 'user_name': row['user_name'], 'role': row['role'],
+             'amount': Decimal(str(row['amount'] or 0)), 'accrual_count': row['accrual_count']}
+            for row in rows
+        ]
+
+    @staticmethod
+    def unpaid_balances(period_end=None, user_ids=None):
+        """Unpaid commission per payee and role, up to period_end"""
+        return CommissionService.grouped_balances(*CommissionService.unpaid_filters(period_end, user_ids))
+
+    @staticmethod
+    def run_settlement(user_id, period_end=None, user_ids=None, dry_run=False, notes=None):
+        """
+        Pay out every unpaid accrual up to period_end in one settlement run
+
+        Payees whose balance is zero or negative (clawbacks larger than new commissions) are
+        carried over to the next run. Accruals are claimed with one UPDATE, totals come from
+        one grouped query, and the cashier transactions are inserted in one bulk statement.
+
+        Args:
+            user_id: User recorded on the run and the cashier transactions
+            period_end: Settle accruals dated up to this date (default today)
+            user_ids: Limit the run to these payees
+            dry_run: Only return the payouts the run would make
+
+        Returns:
+            dict: {'run': run dict or None, 'payouts': [...], 'total_amount': float}
+
+        Raises:
+            ValueError: When there is nothing to pay
+        """
+        period_end = period_end or date.today()
+        if dry_run:
+            payouts = [payout for payout in CommissionService.unpaid_balances(period_end, user_ids)
+                       if payout['amount'] > 0]
+            return CommissionService.run_result(None, payouts)
+
+        run = CommissionSettlementRun(period_end=period_end, status='completed', user_id=user_id, notes=notes)
+        db.session.add(run)
+        db.session.flush()
+
+        # Claim first and total afterwards, so accruals written meanwhile are either in both or in neither
+        db.session.execute(
+            db.update(CommissionAccrual)
+            .where(*CommissionService.unpaid_filters(period_end, user_ids))
+            .values(settlement_run_id=run.id)
+            .execution_options(synchronize_session=False)
+        )
+        payouts = []
+        for balance in CommissionService.grouped_balances(CommissionAccrual.settlement_run_id == run.id):
+            if balance['amount'] > 0:
+                payouts.append(balance)
+            else:
+                db.session.execute(
+                    db.update(CommissionAccrual)
+                    .where(CommissionAccrual.settlement_run_id == run.id,
+                           CommissionAccrual.user_id == balance['user_id'],
+                           CommissionAccrual.role == balance['role'])
+                    .values(settlement_run_id=None)
+                    .execution_options(synchronize_session=False)
+                )
+        if not payouts:
+            db.session.rollback()
+            raise ValueError("No unpaid commissions to settle")
+
+        now = datetime.utcnow()
+        db.session.execute(db.insert(CashierTransaction), [
+            {'transaction_date': now, 'amount': payout['amount'],
+             'transaction_type': COMMISSION_PAYMENT_TYPES[payout['role']], 'reference_id': run.id,
+             'user_id': user_id,
+             'notes': f"صرف عمولة {ROLE_NAMES_AR[payout['role']]} {payout['user_name']} - دفعة تسوية {run.id}"}
+            for payout in payouts
+        ])
+
+        total_amount = sum(payout['amount'] for payout in payouts)
+        run.total_amount = total_amount
+        run.payee_count = len(payouts)
+        run.accrual_count = sum(payout['accrual_count'] for payout in payouts)
+        LedgerService.sync('commission_settlement', [run.id])
+        # update_balance commits the run, the claimed accruals and the cashier transactions together
+        CashierBalance.update_balance(Decimal(str(CashierBalance.get_current_balance())) - total_amount)
+        return CommissionService.run_result(run, payouts)
+
+    @staticmethod
+    def run_result(run, payouts):
+        return {
+            'run': run.to_dict() if run else None,
+            'payouts': [{**payout, 'amount': float(payout['amount'])} for payout in payouts],
+            'total_amount': float(sum(payout['amount'] for payout in payouts)),
+        }
+
+    @staticmethod
+    def payout_statements(run_id):
+        """Per-payee statements of a run: the payout and the sale accruals it covers"""
+        statements = {
+            (payout['user_id'], payout['role']): {**payout, 'amount': float(payout['amount']), 'accruals': []}
+            for payout in CommissionService.grouped_balances(CommissionAccrual.settlement_run_id == run_id)
+        }
+        rows = db.session.execute(
+            db.select(
+                CommissionAccrual.id, CommissionAccrual.user_id, CommissionAccrual.role,
+                CommissionAccrual.sale_id, CommissionAccrual.amount, CommissionAccrual.accrual_date,
+                CommissionAccrual.notes, Sale.client_name, Sale.sale_date, Sale.sale_price,
+                Unit.code.label('unit_code'),
+            )
+            .outerjoin(Sale, Sale.id == CommissionAccrual.sale_id)
+            .outerjoin(Unit, Unit.id == Sale.unit_id)
+            .where(CommissionAccrual.settlement_run_id == run_id)
+            .order_by(CommissionAccrual.user_id, CommissionAccrual.role, CommissionAccrual.accrual_date,
+                      CommissionAccrual.id)
+        ).mappings()
+        for row in rows:
+            statements[(row['user_id'], row['role'])]['accruals'].append({
+                'id': row['id'],
+                'sale_id': row['sale_id'],
+                'unit_code': row['unit_code'],
+                'client_name': row['client_name'],
+                'sale_date': row['sale_date'].isoformat() if row['sale_date'] else None,
+                'sale_price': float(row['sale_price']) if row['sale_price'] is not None else None,
+                'accrual_date': row['accrual_date'].isoformat(),
+                'amount': float(row['amount']),
+                'notes': row['notes'],
+            })
+        return list(statements.values())
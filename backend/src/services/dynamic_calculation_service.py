@@ -1,12 +1,13 @@
 from src.models.dynamic_calculations import CalculationRule
 from src.models.units import Unit
-from decimal import Decimal
+from src.services.calculation_engine import CalculationEngine
 
 class DynamicCalculationService:
     """خدمة الحسابات الديناميكية للعمولات والضرائب"""
     
     @staticmethod
-    def calculate_sale_amounts(sale_price, unit_id, salesperson_id=None, sales_manager_id=None):
+    def calculate_sale_amounts(sale_price, unit_id, salesperson_id=None, sales_manager_id=None, snapshot_rules=False,
+                               previous=None):
         """
         حساب جميع المبالغ المتعلقة بالمبيعة بناءً على القواعد الديناميكية
         
@@ -15,6 +16,8 @@ class DynamicCalculationService:
             unit_id: معرف الوحدة
             salesperson_id: معرف البائع
             sales_manager_id: معرف مدير المبيعات
+            snapshot_rules: حفظ لقطة ثابتة من القواعد الحالية وإرجاع معرفها في rule_set_id
+            previous: نتيجة معاينة سابقة (plan_hash و inputs و node_values) لإعادة حساب القواعد المتأثرة فقط
             
         Returns:
             dict: قاموس يحتوي على جميع الحسابات المفصلة
@@ -25,86 +28,9 @@ class DynamicCalculationService:
         if not unit:
             raise ValueError("Unit not found")
         
-        unit_type = unit.type
-        base_amount = Decimal(str(sale_price))
-        
-        # الحصول على جميع القواعد النشطة للمبيعات
-        rules = CalculationRule.query.filter_by(
-            applies_to='sales',
-            is_active=True
-        ).order_by(CalculationRule.order_index).all()
-        
-        # تصفية القواعد حسب نوع الوحدة
-        applicable_rules = []
-        for rule in rules:
-            unit_type_filter = rule.get_unit_type_filter()
-            if not unit_type_filter or unit_type in unit_type_filter:
-                applicable_rules.append(rule)
-        
-        # تنفيذ الحسابات
-        calculations = {
-            'base_amount': float(base_amount),
-            'unit_type': unit_type,
-            'applied_rules': [],
-            'totals': {
-                'company_commission': 0,
-                'salesperson_commission': 0,
-                'sales_manager_commission': 0,
-                'total_taxes': 0,
-                'total_fees': 0,
-                'total_discounts': 0,
-                'net_company_revenue': 0
-            }
-        }
-        
-        current_amount = base_amount
-        
-        for rule in applicable_rules:
-            calculated_amount = Decimal(str(rule.calculate_amount(current_amount)))
-            
-            rule_calculation = {
-                'rule_id': rule.id,
-                'rule_name_ar': rule.name_ar,
-                'rule_name_en': rule.name_en,
-                'rule_type': rule.rule_type,
-                'calculation_type': rule.calculation_type,
-                'value': float(rule.value),
-                'calculated_amount': float(calculated_amount),
-                'base_amount': float(current_amount)
-            }
-            
-            calculations['applied_rules'].append(rule_calculation)
-            
-            # تجميع المبالغ حسب نوع القاعدة
-            if rule.rule_type == 'commission':
-                # تحديد نوع العمولة بناءً على اسم القاعدة
-                if 'شركة' in rule.name_ar or 'company' in rule.name_en.lower():
-                    calculations['totals']['company_commission'] += float(calculated_amount)
-                elif 'بائع' in rule.name_ar or 'salesperson' in rule.name_en.lower():
-                    calculations['totals']['salesperson_commission'] += float(calculated_amount)
-                elif 'مدير' in rule.name_ar or 'manager' in rule.name_en.lower():
-                    calculations['totals']['sales_manager_commission'] += float(calculated_amount)
-                else:
-                    calculations['totals']['company_commission'] += float(calculated_amount)
-            
-            elif rule.rule_type == 'tax':
-                calculations['totals']['total_taxes'] += float(calculated_amount)
-            
-            elif rule.rule_type == 'fee':
-                calculations['totals']['total_fees'] += float(calculated_amount)
-            
-            elif rule.rule_type == 'discount':
-                calculations['totals']['total_discounts'] += float(calculated_amount)
-        
-        # حساب صافي إيرادات الشركة
-        calculations['totals']['net_company_revenue'] = (
-            calculations['totals']['company_commission'] - 
-            calculations['totals']['total_taxes'] - 
-            calculations['totals']['total_fees'] + 
-            calculations['totals']['total_discounts']
+        return CalculationEngine.calculate_sale(
+            sale_price, unit.type, salesperson_id, sales_manager_id, snapshot_rules, previous
         )
-        
-        return calculations
     
     @staticmethod
     def get_default_calculation_rules():
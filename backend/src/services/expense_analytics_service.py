@@ -0,0 +1,143 @@
+from datetime import date
+from src.models import db, Expense, ExpenseCategory, User
+from src.utils.db_utils import month_bucket
+from src.utils.serialization import ModelSerializer
+
+ANALYTICS_DIMENSIONS = ('category', 'user')
+DRILL_DOWN_MAX_LIMIT = 1000
+
+expense_serializer = ModelSerializer(
+    Expense,
+    extra_columns={
+        "category_name_ar": ExpenseCategory.name_ar,
+        "category_name_en": ExpenseCategory.name_en,
+        "user_name": User.first_name + " " + User.last_name,
+    },
+    joins=[
+        (ExpenseCategory, ExpenseCategory.id == Expense.category_id),
+        (User, User.id == Expense.user_id),
+    ],
+)
+
+def _dimension_column(dimension):
+    return Expense.category_id if dimension == 'category' else Expense.user_id
+
+def _month_range(month):
+    """[first day, first day of the next month) of a 'YYYY-MM' month"""
+    year, month_number = (int(part) for part in month.split('-'))
+    start = date(year, month_number, 1)
+    return start, date(year + month_number // 12, month_number % 12 + 1, 1)
+
+class ExpenseAnalyticsService:
+    """Expense totals by category (or user) and month, aggregated in SQL"""
+
+    @staticmethod
+    def expense_filters(start_date=None, end_date=None, category_id=None):
+        filters = []
+        if start_date:
+            filters.append(Expense.expense_date >= start_date)
+        if end_date:
+            filters.append(Expense.expense_date <= end_date)
+        if category_id:
+            filters.append(Expense.category_id == category_id)
+        return filters
+
+    @staticmethod
+    def _grouped_cells(dimension, filters):
+        """
+        [(dimension id or None, month or None, total, count)] including subtotals
+
+        On MySQL a single GROUP BY ... WITH ROLLUP returns the cells, the per-id subtotals
+        (month None) and the grand total (both None). Elsewhere the cells are grouped in SQL and
+        the rollup rows added in Python.
+        """
+        key = _dimension_column(dimension)
+        month = month_bucket(Expense.expense_date)
+        statement = db.select(key, month, db.func.sum(Expense.amount), db.func.count(Expense.id)) \
+            .where(*filters).group_by(key, month)
+        if db.session.get_bind().dialect.name in ('mysql', 'mariadb'):
+            # Rendered straight after GROUP BY: the statement has no ORDER BY or LIMIT
+            return [tuple(row) for row in db.session.execute(statement.suffix_with('WITH ROLLUP'))]
+
+        cells = [tuple(row) for row in db.session.execute(statement)]
+        rollup = {}
+        for key_id, _, total, count in cells:
+            for rollup_key in (key_id, None):
+                subtotal, subcount = rollup.get(rollup_key, (0, 0))
+                rollup[rollup_key] = (subtotal + total, subcount + count)
+        if not cells:
+            rollup[None] = (0, 0)
+        return cells + [(key_id, None, total, count) for key_id, (total, count) in rollup.items()]
+
+    @staticmethod
+    def totals(dimension='category', start_date=None, end_date=None, category_id=None):
+        """
+        Totals by dimension × month with row, column and grand totals
+
+        Returns:
+            dict: {'dimension', 'months', 'rows': [{'id', names..., 'months': {month: {'total', 'count'}},
+                   'total', 'count'}], 'month_totals', 'total', 'count'}
+        """
+        filters = ExpenseAnalyticsService.expense_filters(start_date, end_date, category_id)
+        rows, month_totals, grand = {}, {}, {'total': 0.0, 'count': 0}
+        for key_id, month, total, count in ExpenseAnalyticsService._grouped_cells(dimension, filters):
+            cell = {'total': float(total or 0), 'count': count}
+            if key_id is None and month is None:
+                grand = cell
+            elif key_id is None:
+                # WITH ROLLUP only emits month subtotals per id; column totals are summed below
+                continue
+            elif month is None:
+                rows.setdefault(key_id, {'id': key_id, 'months': {}}).update(cell)
+            else:
+                rows.setdefault(key_id, {'id': key_id, 'months': {}})['months'][month] = cell
+                month_total = month_totals.setdefault(month, {'total': 0.0, 'count': 0})
+                month_total['total'] += cell['total']
+                month_total['count'] += count
+
+        if rows and dimension == 'category':
+            names = db.session.execute(
+                db.select(ExpenseCategory.id, ExpenseCategory.name_ar, ExpenseCategory.name_en)
+                .where(ExpenseCategory.id.in_(list(rows)))
+            )
+            for key_id, name_ar, name_en in names:
+                rows[key_id].update(name_ar=name_ar, name_en=name_en)
+        elif rows:
+            names = db.session.execute(
+                db.select(User.id, User.first_name + " " + User.last_name).where(User.id.in_(list(rows)))
+            )
+            for key_id, name in names:
+                rows[key_id]['name'] = name
+
+        return {
+            'dimension': dimension,
+            'months': sorted(month_totals),
+            'rows': sorted(rows.values(), key=lambda row: -row.get('total', 0)),
+            'month_totals': {month: month_totals[month] for month in sorted(month_totals)},
+            **grand,
+        }
+
+    @staticmethod
+    def drill_down(dimension, key_id, month, start_date=None, end_date=None, category_id=None,
+                   after_id=0, limit=100):
+        """
+        The expense rows behind one cell, in id order, paged with after_id/limit
+
+        The month is turned into a date range so the (category_id, expense_date) index applies.
+
+        Returns:
+            dict: {'rows', 'next_after_id' (None on the last page)}
+        """
+        month_start, month_end = _month_range(month)
+        filters = ExpenseAnalyticsService.expense_filters(start_date, end_date, category_id) + [
+            _dimension_column(dimension) == key_id,
+            Expense.expense_date >= month_start,
+            Expense.expense_date < month_end,
+            Expense.id > after_id,
+        ]
+        limit = min(limit, DRILL_DOWN_MAX_LIMIT)
+        rows = expense_serializer.fetch(
+            expense_serializer.select().where(*filters).order_by(Expense.id).limit(limit + 1)
+        )
+        next_after_id = rows[limit - 1]['id'] if len(rows) > limit else None
+        return {'rows': rows[:limit], 'next_after_id': next_after_id}
@@ -0,0 +1,106 @@
+from datetime import date
+from decimal import Decimal
+from src.models import db, FinishingWork, FinishingWorkExpense, Unit
+
+class FinishingWorkService:
+    """Denormalized finishing-work costs: incremental actual_cost, budget variance and reconciliation"""
+
+    @staticmethod
+    def apply_cost_delta(finishing_work, delta):
+        """
+        Add delta to the project's actual_cost with one atomic UPDATE (actual_cost = actual_cost + delta)
+
+        Runs in the caller's transaction, next to the expense write, so concurrent expense writes
+        cannot lose each other's updates. Does not commit.
+        """
+        delta = Decimal(str(delta))
+        if not delta:
+            return
+        db.session.execute(
+            db.update(FinishingWork).where(FinishingWork.id == finishing_work.id)
+            .values(actual_cost=db.func.coalesce(FinishingWork.actual_cost, 0) + delta)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.expire(finishing_work, ['actual_cost'])
+
+    @staticmethod
+    def budget_variance(status=None, as_of=None):
+        """
+        Budget against actual cost per project, from the finishing_works rows only
+
+        The burn rate is the actual cost per week elapsed since the start (up to the end date,
+        if the project has ended); the projection extends it over the planned duration.
+        """
+        as_of = as_of or date.today()
+        statement = db.select(
+            FinishingWork.id, FinishingWork.project_name_ar, FinishingWork.project_name_en,
+            FinishingWork.status, FinishingWork.start_date, FinishingWork.end_date,
+            FinishingWork.budget, FinishingWork.actual_cost, Unit.code.label('unit_code')
+        ).outerjoin(Unit, Unit.id == FinishingWork.unit_id).order_by(FinishingWork.id)
+        if status:
+            statement = statement.where(FinishingWork.status == status)
+
+        rows = []
+        for row in db.session.execute(statement).mappings():
+            budget = float(row['budget'] or 0)
+            actual = float(row['actual_cost'] or 0)
+            elapsed_until = min(as_of, row['end_date']) if row['end_date'] else as_of
+            weeks_elapsed = max((elapsed_until - row['start_date']).days, 0) / 7
+            burn_rate = actual / weeks_elapsed if weeks_elapsed else None
+            projected = None
+            if burn_rate is not None and row['end_date'] and row['end_date'] > row['start_date']:
+                projected = round(burn_rate * (row['end_date'] - row['start_date']).days / 7, 2)
+            rows.append({
+                'id': row['id'],
+                'project_name_ar': row['project_name_ar'],
+                'project_name_en': row['project_name_en'],
+                'unit_code': row['unit_code'],
+                'status': row['status'],
+                'start_date': row['start_date'].isoformat(),
+                'end_date': row['end_date'].isoformat() if row['end_date'] else None,
+                'budget': budget,
+                'actual_cost': actual,
+                'variance': round(budget - actual, 2),
+                'percent_used': round(actual / budget * 100, 2) if budget else None,
+                'weeks_elapsed': round(weeks_elapsed, 2),
+                'burn_rate_per_week': round(burn_rate, 2) if burn_rate is not None else None,
+                'projected_cost': projected,
+                'over_budget': actual > budget,
+            })
+        return rows
+
+    @staticmethod
+    def reconcile(fix=False):
+        """
+        Compare every actual_cost with the sum of its expenses in one grouped query
+
+        Args:
+            fix: Overwrite the mismatching totals with the expense sums (and commit)
+
+        Returns:
+            list: [{'id', 'actual_cost', 'expenses_total', 'difference'}] of the mismatches
+        """
+        expenses_total = db.func.coalesce(db.func.sum(FinishingWorkExpense.amount), 0)
+        actual_cost = db.func.coalesce(FinishingWork.actual_cost, 0)
+        rows = db.session.execute(
+            db.select(FinishingWork.id, actual_cost.label('actual_cost'), expenses_total.label('expenses_total'))
+            .outerjoin(FinishingWorkExpense, FinishingWorkExpense.finishing_work_id == FinishingWork.id)
+            .group_by(FinishingWork.id, FinishingWork.actual_cost)
+            .having(actual_cost != expenses_total)
+            .order_by(FinishingWork.id)
+        ).all()
+        mismatches = [
+            {'id': row.id, 'actual_cost': Decimal(str(row.actual_cost)), 'expenses_total': Decimal(str(row.expenses_total)),
+             'difference': Decimal(str(row.actual_cost)) - Decimal(str(row.expenses_total))}
+            for row in rows
+        ]
+        if fix and mismatches:
+            db.session.execute(
+                db.update(FinishingWork).where(FinishingWork.id.in_([row['id'] for row in mismatches]))
+                .values(actual_cost=db.select(db.func.coalesce(db.func.sum(FinishingWorkExpense.amount), 0))
+                        .where(FinishingWorkExpense.finishing_work_id == FinishingWork.id)
+                        .scalar_subquery())
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+        return mismatches
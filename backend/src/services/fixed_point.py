@@ -0,0 +1,58 @@
+from decimal import Decimal, ROUND_HALF_EVEN
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; batch helpers fall back to plain Python
+    np = None
+
+# المبالغ بالقرش (1/100 جنيه) كأعداد صحيحة
+PIASTRES_PER_POUND = 100
+# النسب المئوية بأربع خانات عشرية كما في CalculationRule.value (Numeric(10, 4))
+RATE_SCALE = 10000
+# 100 للنسبة المئوية × مقياس النسبة
+PERCENT_DIVISOR = 100 * RATE_SCALE
+
+PIASTRE = Decimal('0.01')
+
+def div_round_half_even(numerator, denominator):
+    """Integer division rounded half to even (banker's rounding); denominator must be positive"""
+    quotient, remainder = divmod(numerator, denominator)
+    twice = 2 * remainder
+    if twice > denominator or (twice == denominator and quotient % 2):
+        quotient += 1
+    return quotient
+
+def to_piastres(amount):
+    """Convert an amount in pounds (float, int, str or Decimal) to integer piastres, half to even"""
+    return int(Decimal(str(amount)).quantize(PIASTRE, rounding=ROUND_HALF_EVEN) * PIASTRES_PER_POUND)
+
+def from_piastres(piastres):
+    """Integer piastres to a float amount in pounds (exact to two decimals)"""
+    return piastres / PIASTRES_PER_POUND
+
+def to_rate_units(percent):
+    """Convert a percentage (e.g. 14 or 0.5) to integer units of 1/10000 %"""
+    return int(Decimal(str(percent)).quantize(Decimal(1) / RATE_SCALE, rounding=ROUND_HALF_EVEN) * RATE_SCALE)
+
+def percentage_piastres(amount_piastres, rate_units):
+    """rate% of an amount, both as integers, rounded once to the piastre"""
+    return div_round_half_even(amount_piastres * rate_units, PERCENT_DIVISOR)
+
+def percentage_piastres_batch(amounts_piastres, rate_units):
+    """Vectorized percentage_piastres over an int64 array of amounts"""
+    if np is None:
+        return [percentage_piastres(amount, rate_units) for amount in amounts_piastres]
+    products = np.asarray(amounts_piastres, dtype=np.int64) * np.int64(rate_units)
+    quotients, remainders = np.divmod(products, PERCENT_DIVISOR)
+    twice = 2 * remainders
+    round_up = (twice > PERCENT_DIVISOR) | ((twice == PERCENT_DIVISOR) & (quotients % 2 == 1))
+    return quotients + round_up.astype(np.int64)
+
+def decimal_percentage(amount, percent):
+    """Decimal reference for percentage_piastres: rate% of amount quantized half to even
+
+    The amount is first quantized to the piastre and the rate to 1/10000 %, as in the integer path.
+    """
+    amount = Decimal(str(amount)).quantize(PIASTRE, rounding=ROUND_HALF_EVEN)
+    percent = Decimal(str(percent)).quantize(Decimal(1) / RATE_SCALE, rounding=ROUND_HALF_EVEN)
+    return (amount * percent / 100).quantize(PIASTRE, rounding=ROUND_HALF_EVEN)
@@ -1,8 +1,9 @@
 from src.models import (
     db, User, Role, Permission, RolePermission, 
-    FinancialSetting, ExpenseCategory, Template
+    FinancialSetting, ExpenseCategory, Template, TableVersion
 )
 from src.services.dynamic_calculation_service import DynamicCalculationService
+from src.services.ledger_service import LedgerService
 import json
 
 def initialize_default_data():
@@ -236,5 +237,11 @@ def initialize_default_data():
     # Initialize default calculation rules
     DynamicCalculationService.initialize_default_rules()
     
+    # Create the default chart of accounts
+    LedgerService.ensure_chart()
+    
+    # Register every table with the version registry used for conditional GETs
+    TableVersion.ensure_registered()
+    
     print("Default data initialized successfully!")
 
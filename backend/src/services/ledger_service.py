@@ -0,0 +1,365 @@
+from datetime import date, datetime
+from decimal import Decimal
+from src.models import (
+    db, Account, JournalEntry, JournalLine, AccountBalanceMonthly, Sale, Unit, Expense, Rental, RentalPayment,
+    FinishingWork, FinishingWorkExpense, CommissionSettlementRun
+)
+from src.models.ledger import CHART_OF_ACCOUNTS, DEBIT_NORMAL_TYPES
+from src.models.rentals import PAYMENT_STATUS_PAID
+from src.services.calculation_service import CalculationService
+from src.utils.db_utils import upsert_increment
+
+CASH = '1000'
+COMMISSIONS_PAYABLE = '2100'
+FINISHING_PAYABLE = '2200'
+OPENING_EQUITY = '3000'
+SALES_REVENUE = '4000'
+SALES_DISCOUNTS = '4010'
+RENTAL_INCOME = '4100'
+GENERAL_EXPENSES = '5000'
+FINISHING_COSTS = '5100'
+COMMISSIONS_EXPENSE = '5200'
+SALES_TAXES = '5300'
+SALES_FEES = '5400'
+
+def _amount(value):
+    return Decimal(str(value or 0))
+
+def _line(code, amount):
+    """(code, debit, credit) of a signed amount: positive debits the account, negative credits it"""
+    return (code, amount, Decimal(0)) if amount > 0 else (code, Decimal(0), -amount)
+
+def _entry(entry_date, description, *amounts):
+    """Journal entry values from (code, signed amount) pairs, skipping zero amounts"""
+    return {
+        'entry_date': entry_date,
+        'description': description,
+        'lines': [_line(code, amount) for code, amount in amounts if amount],
+    }
+
+def _sale_entries(sale_ids):
+    """
+    Company commission as revenue, net revenue into the cashier, taxes and fees (or discounts)
+    for the difference, and the salesperson and manager commissions accrued as payable
+
+    Cash is debited with what the cashier books for the sale (abs of the net revenue), so the
+    cash account keeps tracking the cashier balance.
+    """
+    rows = db.session.execute(
+        db.select(Sale.id, Sale.sale_date, Sale.client_name, Unit.code, Sale.company_commission,
+                  Sale.salesperson_commission, Sale.sales_manager_commission, Sale.total_taxes,
+                  Sale.net_company_revenue)
+        .join(Unit, Unit.id == Sale.unit_id).where(Sale.id.in_(sale_ids))
+    ).all()
+    entries = {}
+    for sale_id, sale_date, client_name, unit_code, company, salesperson, manager, taxes, net in rows:
+        company, taxes = _amount(company), _amount(taxes)
+        cash = _amount(CalculationService.calculate_cashier_impact('sale_revenue', _amount(net)))
+        commissions = _amount(salesperson) + _amount(manager)
+        fees = company - taxes - cash  # fees less discounts
+        entries[sale_id] = _entry(
+            sale_date, f"بيع الوحدة {unit_code} للعميل {client_name}",
+            (CASH, cash), (SALES_REVENUE, -company), (SALES_TAXES, taxes),
+            (SALES_FEES if fees > 0 else SALES_DISCOUNTS, fees),
+            (COMMISSIONS_EXPENSE, commissions), (COMMISSIONS_PAYABLE, -commissions),
+        )
+    return entries
+
+def _rental_payment_entries(payment_ids):
+    """Paid rent into the cashier; unpaid payments have no entry"""
+    rows = db.session.execute(
+        db.select(RentalPayment.id, RentalPayment.payment_date, RentalPayment.amount, Rental.tenant_name, Unit.code)
+        .join(Rental, Rental.id == RentalPayment.rental_id).join(Unit, Unit.id == Rental.unit_id)
+        .where(RentalPayment.id.in_(payment_ids), RentalPayment.status == PAYMENT_STATUS_PAID)
+    ).all()
+    return {
+        payment_id: _entry(payment_date, f"إيجار الوحدة {unit_code} من {tenant_name}",
+                           (CASH, _amount(amount)), (RENTAL_INCOME, -_amount(amount)))
+        for payment_id, payment_date, amount, tenant_name, unit_code in rows
+    }
+
+def _expense_entries(expense_ids):
+    rows = db.session.execute(
+        db.select(Expense.id, Expense.expense_date, Expense.amount, Expense.description_ar)
+        .where(Expense.id.in_(expense_ids))
+    ).all()
+    return {
+        expense_id: _entry(expense_date, f"مصروف: {description}",
+                           (GENERAL_EXPENSES, _amount(amount)), (CASH, -_amount(amount)))
+        for expense_id, expense_date, amount, description in rows
+    }
+
+def _finishing_expense_entries(expense_ids):
+    """Finishing costs accrued as payable: the cashier does not book finishing work expenses"""
+    rows = db.session.execute(
+        db.select(FinishingWorkExpense.id, FinishingWorkExpense.expense_date, FinishingWorkExpense.amount,
+                  FinishingWork.project_name_ar)
+        .join(FinishingWork, FinishingWork.id == FinishingWorkExpense.finishing_work_id)
+        .where(FinishingWorkExpense.id.in_(expense_ids))
+    ).all()
+    return {
+        expense_id: _entry(expense_date, f"مصروف تشطيب لمشروع {project_name}",
+                           (FINISHING_COSTS, _amount(amount)), (FINISHING_PAYABLE, -_amount(amount)))
+        for expense_id, expense_date, amount, project_name in rows
+    }
+
+def _settlement_entries(run_ids):
+    """Commission payouts out of the cashier; an 'opening' run settled commissions paid outside the system"""
+    rows = db.session.execute(
+        db.select(CommissionSettlementRun.id, CommissionSettlementRun.status, CommissionSettlementRun.period_end,
+                  CommissionSettlementRun.created_at, CommissionSettlementRun.total_amount)
+        .where(CommissionSettlementRun.id.in_(run_ids))
+    ).all()
+    entries = {}
+    for run_id, status, period_end, created_at, total_amount in rows:
+        opening = status == 'opening'
+        entries[run_id] = _entry(
+            period_end if opening else created_at.date(), f"تسوية عمولات - دفعة {run_id}",
+            (COMMISSIONS_PAYABLE, _amount(total_amount)),
+            (OPENING_EQUITY if opening else CASH, -_amount(total_amount)),
+        )
+    return entries
+
+# نوع المستند المصدر ودالة بناء قيوده من صفوفه
+SOURCE_BUILDERS = {
+    'sale': _sale_entries,
+    'rental_payment': _rental_payment_entries,
+    'expense': _expense_entries,
+    'finishing_work_expense': _finishing_expense_entries,
+    'commission_settlement': _settlement_entries,
+}
+
+def _month_range_filters(start_month=None, end_month=None):
+    filters = []
+    if start_month:
+        filters.append(AccountBalanceMonthly.month >= start_month)
+    if end_month:
+        filters.append(AccountBalanceMonthly.month <= end_month)
+    return filters
+
+class LedgerService:
+    """Double-entry journal fed by the source documents, with maintained monthly account balances"""
+
+    @staticmethod
+    def ensure_chart():
+        """Create the accounts of the default chart that do not exist yet"""
+        existing = set(db.session.execute(db.select(Account.code)).scalars())
+        missing = [
+            Account(code=code, name_ar=name_ar, name_en=name_en, account_type=account_type)
+            for code, name_ar, name_en, account_type in CHART_OF_ACCOUNTS if code not in existing
+        ]
+        if missing:
+            db.session.add_all(missing)
+            db.session.commit()
+
+    @staticmethod
+    def account_ids():
+        """{account code: id}"""
+        return dict(db.session.execute(db.select(Account.code, Account.id)).all())
+
+    @staticmethod
+    def sync(source_type, source_ids):
+        """
+        Make the journal match the current state of the given source documents
+
+        Each document has at most one entry, rebuilt from its row: created, replaced when the
+        document changed, dropped when it no longer exists (or no longer posts, like an unpaid
+        rent payment). Runs in the caller's transaction; does not commit.
+        """
+        source_ids = sorted(set(source_ids))
+        if not source_ids:
+            return
+        LedgerService.replace_entries(source_type, source_ids, SOURCE_BUILDERS[source_type](source_ids))
+
+    @staticmethod
+    def remove(source_type, source_ids):
+        """Drop the entries of documents being deleted, before the rows go away"""
+        source_ids = sorted(set(source_ids))
+        if source_ids:
+            LedgerService.replace_entries(source_type, source_ids, {})
+
+    @staticmethod
+    def replace_entries(source_type, source_ids, entries):
+        """
+        Swap the entries of the given documents for new ones with bulk statements
+
+        The old lines are subtracted from and the new ones added to the monthly balances in one
+        upsert, so the balances stay equal to the sum of the lines.
+
+        Args:
+            entries: {source id: {'entry_date', 'description', 'lines': [(account code, debit, credit)]}}
+        """
+        deltas = {}
+
+        def add_delta(account_id, entry_date, debit, credit):
+            delta = deltas.setdefault((account_id, entry_date.replace(day=1)), [Decimal(0), Decimal(0)])
+            delta[0] += _amount(debit)
+            delta[1] += _amount(credit)
+
+        old_entry_ids = list(db.session.execute(
+            db.select(JournalEntry.id)
+            .where(JournalEntry.source_type == source_type, JournalEntry.source_id.in_(source_ids))
+        ).scalars())
+        if old_entry_ids:
+            old_lines = db.session.execute(
+                db.select(JournalLine.account_id, JournalLine.entry_date,
+                          db.func.sum(JournalLine.debit), db.func.sum(JournalLine.credit))
+                .where(JournalLine.entry_id.in_(old_entry_ids))
+                .group_by(JournalLine.account_id, JournalLine.entry_date)
+            ).all()
+            for account_id, entry_date, debit, credit in old_lines:
+                add_delta(account_id, entry_date, -_amount(debit), -_amount(credit))
+            db.session.execute(db.delete(JournalLine).where(JournalLine.entry_id.in_(old_entry_ids)))
+            db.session.execute(db.delete(JournalEntry).where(JournalEntry.id.in_(old_entry_ids)))
+
+        entries = {source_id: entry for source_id, entry in entries.items() if entry['lines']}
+        if entries:
+            for source_id, entry in entries.items():
+                debits = sum(debit for _, debit, _ in entry['lines'])
+                credits = sum(credit for _, _, credit in entry['lines'])
+                if debits != credits:
+                    raise ValueError(f"Unbalanced journal entry for {source_type} {source_id}: {debits} != {credits}")
+
+            now = datetime.utcnow()
+            db.session.execute(db.insert(JournalEntry), [
+                {'entry_date': entry['entry_date'], 'source_type': source_type, 'source_id': source_id,
+                 'description': entry['description'], 'created_at': now, 'updated_at': now}
+                for source_id, entry in entries.items()
+            ])
+            entry_ids = dict(db.session.execute(
+                db.select(JournalEntry.source_id, JournalEntry.id)
+                .where(JournalEntry.source_type == source_type, JournalEntry.source_id.in_(list(entries)))
+            ).all())
+            accounts = LedgerService.account_ids()
+            lines = []
+            for source_id, entry in entries.items():
+                for code, debit, credit in entry['lines']:
+                    lines.append({'entry_id': entry_ids[source_id], 'account_id': accounts[code],
+                                  'entry_date': entry['entry_date'], 'debit': debit, 'credit': credit,
+                                  'created_at': now, 'updated_at': now})
+                    add_delta(accounts[code], entry['entry_date'], debit, credit)
+            db.session.execute(db.insert(JournalLine), lines)
+
+        upsert_increment(AccountBalanceMonthly, AccountBalanceMonthly.KEY_COLUMNS,
+                         AccountBalanceMonthly.INCREMENT_COLUMNS, [
+            {'account_id': account_id, 'month': month, 'debit': debit, 'credit': credit}
+            for (account_id, month), (debit, credit) in deltas.items() if debit or credit
+        ])
+
+    @staticmethod
+    def post_opening_cash(amount, entry_date=None):
+        """Record the cashier balance held before the ledger started, against opening equity (commits)"""
+        amount = _amount(amount)
+        LedgerService.replace_entries('opening_balance', [0], {0: _entry(
+            entry_date or date.today(), "رصيد الخزنة الافتتاحي", (CASH, amount), (OPENING_EQUITY, -amount)
+        )})
+        db.session.commit()
+
+    @staticmethod
+    def rebuild_balances():
+        """Recompute the monthly balances from the journal lines (commits)"""
+        db.session.execute(db.delete(AccountBalanceMonthly))
+        rows = {}
+        for account_id, entry_date, debit, credit in db.session.execute(
+            db.select(JournalLine.account_id, JournalLine.entry_date,
+                      db.func.sum(JournalLine.debit), db.func.sum(JournalLine.credit))
+            .group_by(JournalLine.account_id, JournalLine.entry_date)
+        ):
+            row = rows.setdefault((account_id, entry_date.replace(day=1)), [Decimal(0), Decimal(0)])
+            row[0] += _amount(debit)
+            row[1] += _amount(credit)
+        upsert_increment(AccountBalanceMonthly, AccountBalanceMonthly.KEY_COLUMNS,
+                         AccountBalanceMonthly.INCREMENT_COLUMNS, [
+            {'account_id': account_id, 'month': month, 'debit': debit, 'credit': credit}
+            for (account_id, month), (debit, credit) in rows.items()
+        ])
+        db.session.commit()
+
+    @staticmethod
+    def account_balances(start_month=None, end_month=None):
+        """
+        Every account with its debit and credit totals over the months, from the monthly table
+
+        Returns:
+            list: [{'id', 'code', 'name_ar', 'name_en', 'account_type', 'debit', 'credit', 'balance'}]
+            ordered by code; balance is signed by the account's normal side
+        """
+        totals = db.select(
+            AccountBalanceMonthly.account_id,
+            db.func.sum(AccountBalanceMonthly.debit).label('debit'),
+            db.func.sum(AccountBalanceMonthly.credit).label('credit'),
+        ).where(*_month_range_filters(start_month, end_month)) \
+            .group_by(AccountBalanceMonthly.account_id).subquery()
+        rows = db.session.execute(
+            db.select(Account.id, Account.code, Account.name_ar, Account.name_en, Account.account_type,
+                      totals.c.debit, totals.c.credit)
+            .outerjoin(totals, totals.c.account_id == Account.id).order_by(Account.code)
+        ).mappings()
+        accounts = []
+        for row in rows:
+            debit, credit = float(row['debit'] or 0), float(row['credit'] or 0)
+            balance = debit - credit if row['account_type'] in DEBIT_NORMAL_TYPES else credit - debit
+            accounts.append({
+                'id': row['id'], 'code': row['code'], 'name_ar': row['name_ar'], 'name_en': row['name_en'],
+                'account_type': row['account_type'], 'debit': round(debit, 2), 'credit': round(credit, 2),
+                'balance': round(balance, 2),
+            })
+        return accounts
+
+    @staticmethod
+    def trial_balance(as_of_month=None):
+        """Net balance of every account up to a month, on its debit or credit side"""
+        accounts = LedgerService.account_balances(end_month=as_of_month)
+        for account in accounts:
+            net = round(account['debit'] - account['credit'], 2)
+            account['debit'], account['credit'] = max(net, 0), max(-net, 0)
+        total_debit = round(sum(account['debit'] for account in accounts), 2)
+        total_credit = round(sum(account['credit'] for account in accounts), 2)
+        return {
+            'as_of': as_of_month.strftime('%Y-%m') if as_of_month else None,
+            'accounts': accounts,
+            'total_debit': total_debit,
+            'total_credit': total_credit,
+            'balanced': total_debit == total_credit,
+        }
+
+    @staticmethod
+    def income_statement(start_month=None, end_month=None):
+        """Revenue and expense accounts over a month range and the net income"""
+        accounts = LedgerService.account_balances(start_month, end_month)
+        revenue = [account for account in accounts if account['account_type'] == 'revenue']
+        expenses = [account for account in accounts if account['account_type'] == 'expense']
+        total_revenue = round(sum(account['balance'] for account in revenue), 2)
+        total_expenses = round(sum(account['balance'] for account in expenses), 2)
+        return {
+            'start_month': start_month.strftime('%Y-%m') if start_month else None,
+            'end_month': end_month.strftime('%Y-%m') if end_month else None,
+            'revenue': revenue,
+            'expenses': expenses,
+            'total_revenue': total_revenue,
+            'total_expenses': total_expenses,
+            'net_income': round(total_revenue - total_expenses, 2),
+        }
+
+    @staticmethod
+    def balance_sheet(as_of_month=None):
+        """Assets, liabilities and equity up to a month; the cumulative net income is shown under equity"""
+        accounts = LedgerService.account_balances(end_month=as_of_month)
+        by_type = {account_type: [account for account in accounts if account['account_type'] == account_type]
+                   for account_type in ('asset', 'liability', 'equity', 'revenue', 'expense')}
+        earnings = round(sum(account['balance'] for account in by_type['revenue']) -
+                         sum(account['balance'] for account in by_type['expense']), 2)
+        total_assets = round(sum(account['balance'] for account in by_type['asset']), 2)
+        total_liabilities = round(sum(account['balance'] for account in by_type['liability']), 2)
+        total_equity = round(sum(account['balance'] for account in by_type['equity']) + earnings, 2)
+        return {
+            'as_of': as_of_month.strftime('%Y-%m') if as_of_month else None,
+            'assets': by_type['asset'],
+            'liabilities': by_type['liability'],
+            'equity': by_type['equity'],
+            'retained_earnings': earnings,
+            'total_assets': total_assets,
+            'total_liabilities': total_liabilities,
+            'total_equity': total_equity,
+            'balanced': total_assets == round(total_liabilities + total_equity, 2),
+        }
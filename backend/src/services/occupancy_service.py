@@ -0,0 +1,120 @@
+from datetime import date, datetime
+from src.models import db, Unit, UnitOccupancy
+from src.models.units import UNIT_STATUS_AVAILABLE, UNIT_STATUS_SOLD, UNIT_STATUS_RENTED, OPEN_END_DATE
+
+# Statuses owned by the occupancy intervals; any other (manually set) status is left alone
+MANAGED_UNIT_STATUSES = (UNIT_STATUS_AVAILABLE, UNIT_STATUS_SOLD, UNIT_STATUS_RENTED)
+
+class OccupancyConflict(ValueError):
+    """The requested interval overlaps an existing occupancy of the unit"""
+
+    def __init__(self, occupancy):
+        self.occupancy = occupancy
+        super().__init__(
+            f"Unit is already occupied ({occupancy.kind} #{occupancy.reference_id}) "
+            f"from {occupancy.start_date.isoformat()}"
+            + ("" if occupancy.end_date == OPEN_END_DATE else f" to {occupancy.end_date.isoformat()}")
+        )
+
+class OccupancyService:
+    """Unit occupancy intervals kept by the sales and rentals routes, and the unit status derived from them"""
+
+    @staticmethod
+    def overlapping(start_date, end_date=None):
+        """Condition on UnitOccupancy for intervals overlapping [start_date, end_date)"""
+        return db.and_(UnitOccupancy.start_date < (end_date or OPEN_END_DATE),
+                       UnitOccupancy.end_date > start_date)
+
+    @staticmethod
+    def find_conflict(unit_id, start_date, end_date=None, exclude=None):
+        """
+        First occupancy of the unit overlapping [start_date, end_date), or None
+
+        The unit row is locked (FOR UPDATE) for the rest of the transaction, so two requests
+        cannot both book the same free interval.
+
+        Args:
+            exclude: (kind, reference_id) of the occupancy being moved, ignored in the check
+        """
+        db.session.execute(db.select(Unit.id).where(Unit.id == unit_id).with_for_update())
+        query = UnitOccupancy.query.filter(UnitOccupancy.unit_id == unit_id,
+                                           OccupancyService.overlapping(start_date, end_date))
+        if exclude:
+            query = query.filter(db.not_(db.and_(UnitOccupancy.kind == exclude[0],
+                                                 UnitOccupancy.reference_id == exclude[1])))
+        return query.order_by(UnitOccupancy.start_date).first()
+
+    @staticmethod
+    def occupy(unit_id, kind, reference_id, start_date, end_date=None):
+        """
+        Record (or move) the occupancy of a sale or rental and refresh the statuses of the units
+        involved. Does not commit.
+
+        Raises:
+            OccupancyConflict: The interval overlaps another sale or rental of the unit
+        """
+        conflict = OccupancyService.find_conflict(unit_id, start_date, end_date, exclude=(kind, reference_id))
+        if conflict:
+            raise OccupancyConflict(conflict)
+
+        occupancy = UnitOccupancy.query.filter_by(kind=kind, reference_id=reference_id).first()
+        unit_ids = {unit_id}
+        if occupancy:
+            unit_ids.add(occupancy.unit_id)
+        else:
+            occupancy = UnitOccupancy(kind=kind, reference_id=reference_id)
+            db.session.add(occupancy)
+        occupancy.unit_id = unit_id
+        occupancy.start_date = start_date
+        occupancy.end_date = end_date or OPEN_END_DATE
+        db.session.flush()
+        OccupancyService.sync_unit_status(unit_ids)
+        return occupancy
+
+    @staticmethod
+    def release(kind, reference_id):
+        """Drop the occupancy of a deleted sale or rental and free its unit. Does not commit."""
+        occupancy = UnitOccupancy.query.filter_by(kind=kind, reference_id=reference_id).first()
+        if occupancy:
+            unit_id = occupancy.unit_id
+            db.session.delete(occupancy)
+            db.session.flush()
+            OccupancyService.sync_unit_status([unit_id])
+
+    @staticmethod
+    def sync_unit_status(unit_ids=None, as_of=None):
+        """
+        Set the status of units from their occupancy on as_of (default today) in one UPDATE:
+        sold, rented or available. Units with a manually set other status are skipped.
+
+        Returns:
+            int: Number of units updated
+        """
+        as_of = as_of or date.today()
+        current = db.select(UnitOccupancy.id).where(
+            UnitOccupancy.unit_id == Unit.id, UnitOccupancy.start_date <= as_of, UnitOccupancy.end_date > as_of
+        )
+        status = db.case(
+            (current.where(UnitOccupancy.kind == 'sale').exists(), UNIT_STATUS_SOLD),
+            (current.where(UnitOccupancy.kind == 'rental').exists(), UNIT_STATUS_RENTED),
+            else_=UNIT_STATUS_AVAILABLE
+        )
+        statement = db.update(Unit).where(Unit.status.in_(MANAGED_UNIT_STATUSES), Unit.status != status)
+        if unit_ids is not None:
+            statement = statement.where(Unit.id.in_(list(unit_ids)))
+        result = db.session.execute(statement.values(status=status, updated_at=datetime.utcnow()).execution_options(synchronize_session=False))
+        return result.rowcount
+
+    @staticmethod
+    def run_status_job(as_of=None):
+        """Scheduled job: leases start and end with the calendar, so re-derive every unit's status"""
+        updated = OccupancyService.sync_unit_status(as_of=as_of)
+        db.session.commit()
+        return updated
+
+    @staticmethod
+    def unoccupied(start_date, end_date=None):
+        """Condition on Unit: no occupancy overlaps [start_date, end_date)"""
+        return ~db.select(UnitOccupancy.id).where(
+            UnitOccupancy.unit_id == Unit.id, OccupancyService.overlapping(start_date, end_date)
+        ).exists()
@@ -0,0 +1,302 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from src.models import (
+    db, ClosedPeriod, ClosedPeriodExpense, Sale, RentalPayment, Expense, FinishingWorkExpense, CashierTransaction
+)
+from src.models.rentals import PAYMENT_STATUS_PAID
+from src.utils.date_utils import add_months
+from src.utils.db_utils import month_bucket
+
+class PeriodClosed(ValueError):
+    """A write dated in a closed accounting period"""
+
+    def __init__(self, closed_through):
+        super().__init__(f"Accounting period is closed through {closed_through:%Y-%m}")
+        self.closed_through = closed_through
+
+def _month_key(month):
+    return month.strftime('%Y-%m')
+
+def _empty_summary():
+    summary = {column: Decimal(0) for column in ClosedPeriod.SUMMARY_COLUMNS}
+    summary['sale_count'] = 0
+    summary['expenses_by_category'] = {}
+    return summary
+
+def _date_filters(column, start_date, end_date):
+    filters = []
+    if start_date:
+        filters.append(column >= start_date)
+    if end_date:
+        filters.append(column <= end_date)
+    return filters
+
+class PeriodService:
+    """
+    Month-end close: frozen per-month summaries, and the guard that keeps closed months unchanged
+
+    Months are closed in order and only the last closed month can be reopened, so the closed
+    periods are always every month up to the last closed one.
+    """
+
+    @staticmethod
+    def last_closed_month():
+        """First day of the last closed month, or None"""
+        return db.session.execute(db.select(db.func.max(ClosedPeriod.month))).scalar()
+
+    @staticmethod
+    def closed_through():
+        """Last day of the last closed month, or None"""
+        month = PeriodService.last_closed_month()
+        return add_months(month, 1) - timedelta(days=1) if month else None
+
+    @staticmethod
+    def check_open(*dates):
+        """
+        Raise PeriodClosed if any of the dates falls in a closed month
+
+        Write routes pass the document's old and new dates, so a document can neither be
+        changed inside nor moved into or out of a closed month.
+        """
+        closed_through = PeriodService.closed_through()
+        if closed_through and any(value and value <= closed_through for value in dates):
+            raise PeriodClosed(closed_through)
+
+    @staticmethod
+    def live_summaries(start_date=None, end_date=None):
+        """
+        {'YYYY-MM': summary} computed from the live rows, one grouped query per source table
+
+        A summary holds the ClosedPeriod.SUMMARY_COLUMNS and expenses_by_category
+        ({category id: (total, count)}); months without any activity are absent.
+        """
+        summaries = {}
+
+        def month_summary(month):
+            return summaries.setdefault(month, _empty_summary())
+
+        sale_month = month_bucket(Sale.sale_date)
+        for month, count, volume, company, net, commissions, taxes in db.session.execute(
+            db.select(
+                sale_month, db.func.count(Sale.id), db.func.sum(Sale.sale_price),
+                db.func.sum(Sale.company_commission), db.func.sum(Sale.net_company_revenue),
+                db.func.sum(db.func.coalesce(Sale.salesperson_commission, 0) +
+                            db.func.coalesce(Sale.sales_manager_commission, 0)),
+                db.func.sum(Sale.total_taxes),
+            ).where(*_date_filters(Sale.sale_date, start_date, end_date)).group_by(sale_month)
+        ):
+            month_summary(month).update(
+                sale_count=count, sales_volume=Decimal(str(volume or 0)),
+                company_commission=Decimal(str(company or 0)), net_company_revenue=Decimal(str(net or 0)),
+                commissions=Decimal(str(commissions or 0)), total_taxes=Decimal(str(taxes or 0)),
+            )
+
+        rent_month = month_bucket(RentalPayment.payment_date)
+        for month, total in db.session.execute(
+            db.select(rent_month, db.func.sum(RentalPayment.amount))
+            .where(RentalPayment.status == PAYMENT_STATUS_PAID,
+                   *_date_filters(RentalPayment.payment_date, start_date, end_date))
+            .group_by(rent_month)
+        ):
+            month_summary(month)['rental_income'] = Decimal(str(total or 0))
+
+        expense_month = month_bucket(Expense.expense_date)
+        for month, category_id, total, count in db.session.execute(
+            db.select(expense_month, Expense.category_id, db.func.sum(Expense.amount), db.func.count(Expense.id))
+            .where(*_date_filters(Expense.expense_date, start_date, end_date))
+            .group_by(expense_month, Expense.category_id)
+        ):
+            summary = month_summary(month)
+            summary['expenses_total'] += Decimal(str(total or 0))
+            summary['expenses_by_category'][category_id] = (Decimal(str(total or 0)), count)
+
+        finishing_month = month_bucket(FinishingWorkExpense.expense_date)
+        for month, total in db.session.execute(
+            db.select(finishing_month, db.func.sum(FinishingWorkExpense.amount))
+            .where(*_date_filters(FinishingWorkExpense.expense_date, start_date, end_date))
+            .group_by(finishing_month)
+        ):
+            month_summary(month)['finishing_costs'] = Decimal(str(total or 0))
+        return summaries
+
+    @staticmethod
+    def cashier_balance_before(day):
+        """
+        Cashier balance at the start of a day: the closing balance of the last closed month ending
+        before it, plus only the transactions dated after that month
+        """
+        period = ClosedPeriod.query.filter(ClosedPeriod.month < day.replace(day=1)) \
+            .order_by(ClosedPeriod.month.desc()).first()
+        statement = db.select(db.func.coalesce(db.func.sum(CashierTransaction.signed_amount()), 0)).where(
+            CashierTransaction.transaction_date < datetime.combine(day, datetime.min.time())
+        )
+        if not period:
+            return Decimal(str(db.session.execute(statement).scalar()))
+        after_period = datetime.combine(add_months(period.month, 1), datetime.min.time())
+        rollup = db.session.execute(statement.where(CashierTransaction.transaction_date >= after_period)).scalar()
+        return Decimal(str(period.cashier_closing_balance)) + Decimal(str(rollup))
+
+    @staticmethod
+    def close_month(month, user_id, notes=None):
+        """
+        Close a past month: store its summary and cashier closing balance and block writes dated in it
+
+        Raises:
+            ValueError: The month is not in the past, is already closed, or is not the month after
+                the last closed one
+        """
+        month = month.replace(day=1)
+        if month >= date.today().replace(day=1):
+            raise ValueError("Only past months can be closed")
+        last_closed = PeriodService.last_closed_month()
+        if last_closed and month <= last_closed:
+            raise ValueError(f"{_month_key(month)} is already closed")
+        if last_closed and month != add_months(last_closed, 1):
+            raise ValueError(f"Close {_month_key(add_months(last_closed, 1))} first")
+
+        next_month = add_months(month, 1)
+        summary = PeriodService.live_summaries(month, next_month - timedelta(days=1)).get(
+            _month_key(month), _empty_summary()
+        )
+        closing_balance = db.session.execute(
+            db.select(db.func.coalesce(db.func.sum(CashierTransaction.signed_amount()), 0))
+            .where(CashierTransaction.transaction_date < datetime.combine(next_month, datetime.min.time()))
+        ).scalar()
+
+        period = ClosedPeriod(
+            month=month, cashier_closing_balance=closing_balance, user_id=user_id, notes=notes,
+            **{column: summary[column] for column in ClosedPeriod.SUMMARY_COLUMNS}
+        )
+        db.session.add(period)
+        db.session.flush()
+        if summary['expenses_by_category']:
+            now = datetime.utcnow()
+            db.session.execute(db.insert(ClosedPeriodExpense), [
+                {'period_id': period.id, 'category_id': category_id, 'total': total, 'expense_count': count,
+                 'created_at': now, 'updated_at': now}
+                for category_id, (total, count) in summary['expenses_by_category'].items()
+            ])
+        db.session.commit()
+        return period
+
+    @staticmethod
+    def reopen_last():
+        """Reopen the last closed month, dropping its snapshot; returns the month or None"""
+        period = ClosedPeriod.query.order_by(ClosedPeriod.month.desc()).first()
+        if not period:
+            return None
+        month = period.month
+        db.session.execute(db.delete(ClosedPeriodExpense).where(ClosedPeriodExpense.period_id == period.id))
+        period.delete()
+        return month
+
+    @staticmethod
+    def _snapshots(start_month=None, end_month=None):
+        """{'YYYY-MM': summary} of the closed months in range, with their category rows"""
+        filters = _date_filters(ClosedPeriod.month, start_month, end_month)
+        periods = ClosedPeriod.query.filter(*filters).all()
+        if not periods:
+            return {}
+        categories = {}
+        for period_id, category_id, total, count in db.session.execute(
+            db.select(ClosedPeriodExpense.period_id, ClosedPeriodExpense.category_id,
+                      ClosedPeriodExpense.total, ClosedPeriodExpense.expense_count)
+            .where(ClosedPeriodExpense.period_id.in_([period.id for period in periods]))
+        ):
+            categories.setdefault(period_id, {})[category_id] = (Decimal(str(total)), count)
+        snapshots = {}
+        for period in periods:
+            summary = {column: getattr(period, column) for column in ClosedPeriod.SUMMARY_COLUMNS}
+            summary['expenses_by_category'] = categories.get(period.id, {})
+            summary['cashier_closing_balance'] = period.cashier_closing_balance
+            snapshots[_month_key(period.month)] = summary
+        return snapshots
+
+    @staticmethod
+    def _serialize(summary):
+        data = {column: float(summary[column]) for column in ClosedPeriod.SUMMARY_COLUMNS}
+        data['sale_count'] = int(summary['sale_count'])
+        data['total_revenue'] = round(data['net_company_revenue'] + data['rental_income'], 2)
+        data['total_expenses'] = round(data['expenses_total'] + data['finishing_costs'], 2)
+        data['net_profit_loss'] = round(data['total_revenue'] - data['total_expenses'], 2)
+        data['expenses_by_category'] = [
+            {'category_id': category_id, 'total': float(total), 'count': count}
+            for category_id, (total, count) in sorted(summary['expenses_by_category'].items())
+        ]
+        return data
+
+    @staticmethod
+    def _add(target, summary):
+        for column in ClosedPeriod.SUMMARY_COLUMNS:
+            target[column] += summary[column]
+        for category_id, (total, count) in summary['expenses_by_category'].items():
+            old_total, old_count = target['expenses_by_category'].get(category_id, (Decimal(0), 0))
+            target['expenses_by_category'][category_id] = (old_total + total, old_count + count)
+
+    @staticmethod
+    def monthly_summary(start_month, end_month):
+        """
+        One summary per month: closed months read from their snapshot, only the open months
+        (after the last closed one, or before the first) computed from the live rows
+
+        Returns:
+            dict: {'months': [{'month', 'closed', summary..., 'cashier_closing_balance'}], 'totals'}
+        """
+        months = []
+        month = start_month.replace(day=1)
+        while month <= end_month:
+            months.append(_month_key(month))
+            month = add_months(month, 1)
+
+        snapshots = PeriodService._snapshots(start_month, end_month)
+        open_months = [month for month in months if month not in snapshots]
+        live = {}
+        if open_months:
+            first = datetime.strptime(open_months[0], '%Y-%m').date()
+            last = add_months(datetime.strptime(open_months[-1], '%Y-%m').date(), 1) - timedelta(days=1)
+            live = PeriodService.live_summaries(first, last)
+
+        rows, totals = [], _empty_summary()
+        for month in months:
+            summary = snapshots.get(month) or live.get(month) or _empty_summary()
+            PeriodService._add(totals, summary)
+            closing_balance = summary.get('cashier_closing_balance')
+            rows.append({
+                'month': month,
+                'closed': month in snapshots,
+                **PeriodService._serialize(summary),
+                'cashier_closing_balance': float(closing_balance) if closing_balance is not None else None,
+            })
+        return {'months': rows, 'totals': PeriodService._serialize(totals)}
+
+    @staticmethod
+    def totals(start_date=None, end_date=None):
+        """
+        Summary over a date range: the closed months lying wholly inside it from their snapshots,
+        the remaining head and tail of the range from the live rows
+        """
+        first_whole = start_date.replace(day=1) if start_date else None
+        if start_date and start_date.day != 1:
+            first_whole = add_months(first_whole, 1)
+        last_whole = add_months((end_date + timedelta(days=1)).replace(day=1), -1) if end_date else None
+        snapshots = PeriodService._snapshots(first_whole, last_whole)
+
+        total = _empty_summary()
+        if not snapshots:
+            PeriodService._add_live(total, start_date, end_date)
+            return PeriodService._serialize(total)
+        for summary in snapshots.values():
+            PeriodService._add(total, summary)
+        # Closed months are contiguous, so the live rows are only needed around them
+        first_closed = datetime.strptime(min(snapshots), '%Y-%m').date()
+        after_closed = add_months(datetime.strptime(max(snapshots), '%Y-%m').date(), 1)
+        if not start_date or start_date < first_closed:
+            PeriodService._add_live(total, start_date, first_closed - timedelta(days=1))
+        if not end_date or end_date >= after_closed:
+            PeriodService._add_live(total, after_closed, end_date)
+        return PeriodService._serialize(total)
+
+    @staticmethod
+    def _add_live(target, start_date, end_date):
+        for summary in PeriodService.live_summaries(start_date, end_date).values():
+            PeriodService._add(target, summary)
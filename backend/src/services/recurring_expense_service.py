@@ -0,0 +1,120 @@
+from datetime import date, datetime
+from decimal import Decimal
+from src.models import (
+    db, Expense, RecurringExpense, RecurringExpensePosting, CashierBalance, CashierTransaction
+)
+from src.models.expenses import RECURRENCE_MONTHS
+from src.services.calculation_service import CalculationService
+from src.services.ledger_service import LedgerService
+from src.services.period_service import PeriodService
+from src.utils.date_utils import add_months
+
+class RecurringExpenseService:
+    """Batch posting of recurring expense templates, idempotent per (template, period)"""
+
+    @staticmethod
+    def occurrences(template, as_of):
+        """Due dates of a template up to as_of (and its end date), anchored on the start day"""
+        months = RECURRENCE_MONTHS[template.cadence]
+        last = min(as_of, template.end_date) if template.end_date else as_of
+        dates = []
+        index = 0
+        due = template.start_date
+        while due <= last:
+            dates.append(due)
+            index += 1
+            due = add_months(template.start_date, index * months)
+        return dates
+
+    @staticmethod
+    def due_postings(as_of=None, template_ids=None):
+        """
+        [(template, due date, period key)] not posted yet, for the active templates
+
+        The posted periods of all templates are read in one query. Occurrences in closed
+        accounting periods are not posted any more.
+        """
+        as_of = as_of or date.today()
+        query = RecurringExpense.query.filter(RecurringExpense.is_active.is_(True),
+                                              RecurringExpense.start_date <= as_of)
+        if template_ids is not None:
+            query = query.filter(RecurringExpense.id.in_(template_ids))
+        templates = query.order_by(RecurringExpense.id).all()
+        if not templates:
+            return []
+        posted = set(db.session.execute(
+            db.select(RecurringExpensePosting.template_id, RecurringExpensePosting.period_key)
+            .where(RecurringExpensePosting.template_id.in_([template.id for template in templates]))
+        ).all())
+
+        closed_through = PeriodService.closed_through()
+        due = []
+        for template in templates:
+            for due_date in RecurringExpenseService.occurrences(template, as_of):
+                period_key = due_date.strftime('%Y-%m')
+                if closed_through and due_date <= closed_through:
+                    continue
+                if (template.id, period_key) not in posted:
+                    due.append((template, due_date, period_key))
+        return due
+
+    @staticmethod
+    def post_due(as_of=None, template_ids=None, dry_run=False):
+        """
+        Post every due, unposted occurrence in one transaction: the Expense rows, their
+        expense_payment cashier transactions (one bulk insert), the posting keys (one bulk
+        insert), their journal entries and a single net cashier balance update
+
+        Missed periods are caught up. A period whose expense was later deleted stays posted.
+
+        Returns:
+            dict: {'posted': count, 'total_amount': float, 'postings': [...]}
+        """
+        due = RecurringExpenseService.due_postings(as_of, template_ids)
+        postings = [
+            {'template_id': template.id, 'period_key': period_key, 'expense_date': due_date.isoformat(),
+             'description_ar': template.description_ar, 'amount': float(template.amount)}
+            for template, due_date, period_key in due
+        ]
+        total_amount = sum((Decimal(template.amount) for template, _, _ in due), Decimal(0))
+        result = {'posted': len(due), 'total_amount': float(total_amount), 'dry_run': dry_run, 'postings': postings}
+        if dry_run or not due:
+            return result
+
+        expenses = [
+            Expense(description_ar=template.description_ar, description_en=template.description_en,
+                    amount=template.amount, expense_date=due_date, category_id=template.category_id,
+                    user_id=template.user_id, notes=f"مصروف متكرر - {period_key}")
+            for template, due_date, period_key in due
+        ]
+        db.session.add_all(expenses)
+        db.session.flush()
+
+        now = datetime.utcnow()
+        db.session.execute(db.insert(RecurringExpensePosting), [
+            {'template_id': template.id, 'period_key': period_key, 'expense_id': expense.id,
+             'created_at': now, 'updated_at': now}
+            for (template, _, period_key), expense in zip(due, expenses)
+        ])
+        db.session.execute(db.insert(CashierTransaction), [
+            {'transaction_date': now, 'amount': expense.amount, 'transaction_type': 'expense_payment',
+             'reference_id': expense.id, 'user_id': expense.user_id,
+             'notes': f"دفع مصروف: {expense.description_ar}"}
+            for expense in expenses
+        ])
+        LedgerService.sync('expense', [expense.id for expense in expenses])
+        cashier_impact = sum(
+            Decimal(str(CalculationService.calculate_cashier_impact('expense_payment', Decimal(expense.amount))))
+            for expense in expenses
+        )
+        # update_balance commits the expenses, postings, transactions and journal entries together
+        CashierBalance.update_balance(Decimal(str(CashierBalance.get_current_balance())) + cashier_impact)
+        for posting, expense in zip(postings, expenses):
+            posting['expense_id'] = expense.id
+        return result
+
+    @staticmethod
+    def run_posting_job(as_of=None):
+        """Scheduled job: post the due occurrences of all templates"""
+        result = RecurringExpenseService.post_due(as_of)
+        return {'posted': result['posted'], 'total_amount': result['total_amount']}
@@ -0,0 +1,280 @@
+from bisect import bisect_left
+from datetime import date, datetime, timedelta
+from src.models import (
+    db, Rental, RentalPayment, RentalArrears, Unit, FinancialSetting, CashierBalance, CashierTransaction
+)
+from src.models.rentals import (
+    PAYMENT_STATUS_PAID, PAYMENT_STATUS_DUE, PAYMENT_STATUS_OVERDUE, PAYMENT_FREQUENCY_MONTHS
+)
+from src.services.calculation_service import CalculationService
+from src.services.ledger_service import LedgerService
+from src.utils.date_utils import add_months
+
+SCHEDULE_CHUNK_SIZE = 500
+
+# Aging buckets as (key, first day past due, last day past due or None)
+AGING_BUCKETS = (('0_30', 0, 30), ('31_60', 31, 60), ('61_90', 61, 90), ('over_90', 91, None))
+
+class RentalService:
+    """Rental payment schedules and their cashier postings"""
+
+    @staticmethod
+    def due_periods(start_date, end_date, payment_frequency):
+        """
+        [(due_date, next_due_date)] for every payment period of a lease
+
+        Each period is paid in advance on its first day, anchored on the lease start day;
+        a period starting on or after end_date is not due (a lease always has its first period).
+
+        Raises:
+            ValueError: For an unknown payment frequency
+        """
+        months = PAYMENT_FREQUENCY_MONTHS.get(payment_frequency)
+        if months is None:
+            raise ValueError(f"Unknown payment frequency: {payment_frequency}")
+        periods = []
+        due = start_date
+        index = 0
+        while index == 0 or due < end_date:
+            index += 1
+            next_due = add_months(start_date, index * months)
+            periods.append((due, next_due))
+            due = next_due
+        return periods
+
+    @staticmethod
+    def missing_payments(rental, kept_dates, from_date):
+        """Scheduled payment rows for the periods from from_date on that no kept payment falls in"""
+        kept_dates = sorted(kept_dates)
+        rows = []
+        for due, next_due in RentalService.due_periods(rental.start_date, rental.end_date,
+                                                       rental.payment_frequency):
+            if due < from_date:
+                continue
+            position = bisect_left(kept_dates, due)
+            if position < len(kept_dates) and kept_dates[position] < next_due:
+                continue  # الفترة مغطاة بدفعة موجودة
+            rows.append({'rental_id': rental.id, 'payment_date': due, 'amount': rental.rent_amount,
+                         'status': PAYMENT_STATUS_DUE})
+        return rows
+
+    @staticmethod
+    def _replaceable_payments(*filters):
+        """Unpaid payments without a cashier posting, i.e. rows the schedule owns"""
+        posted = db.select(CashierTransaction.id).where(
+            CashierTransaction.reference_id == RentalPayment.id,
+            CashierTransaction.transaction_type == 'rental_income'
+        ).exists()
+        return db.delete(RentalPayment).where(
+            RentalPayment.status != PAYMENT_STATUS_PAID, ~posted, *filters
+        ).execution_options(synchronize_session=False)
+
+    @staticmethod
+    def regenerate_schedule(rental, from_date=None):
+        """
+        Replace the unpaid payments of a rental from from_date on with its current schedule
+
+        Paid payments are kept and cover their period. Unpaid rows are deleted and the missing
+        periods are inserted in one bulk statement. Does not commit.
+
+        Args:
+            rental: The Rental (flushed, with its current dates, amount and frequency)
+            from_date: First day to regenerate (default today; the lease start for a new rental)
+
+        Returns:
+            int: Number of payment rows inserted
+        """
+        from_date = from_date or date.today()
+        db.session.execute(RentalService._replaceable_payments(
+            RentalPayment.rental_id == rental.id, RentalPayment.payment_date >= from_date
+        ))
+        kept_dates = db.session.execute(
+            db.select(RentalPayment.payment_date).where(RentalPayment.rental_id == rental.id)
+        ).scalars().all()
+        rows = RentalService.missing_payments(rental, kept_dates, from_date)
+        if rows:
+            db.session.execute(db.insert(RentalPayment), rows)
+        return len(rows)
+
+    @staticmethod
+    def generate_missing(from_date=None, chunk_size=SCHEDULE_CHUNK_SIZE):
+        """
+        Fill the missing scheduled payments of every running lease, from from_date on
+
+        Idempotent, for nightly runs: leases are read in id-keyset chunks, with one query for
+        the chunk's existing payment dates, one bulk insert and one commit per chunk.
+
+        Returns:
+            dict: {'rentals': leases checked, 'payments': rows inserted, 'skipped': [rental ids]}
+        """
+        from_date = from_date or date.today()
+        result = {'rentals': 0, 'payments': 0, 'skipped': []}
+        last_id = 0
+        while True:
+            rentals = Rental.query.filter(Rental.id > last_id, Rental.end_date > from_date) \
+                .order_by(Rental.id).limit(chunk_size).all()
+            if not rentals:
+                return result
+            last_id = rentals[-1].id
+            kept = {}
+            for rental_id, payment_date in db.session.execute(
+                db.select(RentalPayment.rental_id, RentalPayment.payment_date)
+                .where(RentalPayment.rental_id.in_([rental.id for rental in rentals]))
+            ):
+                kept.setdefault(rental_id, []).append(payment_date)
+            rows = []
+            for rental in rentals:
+                try:
+                    rows.extend(RentalService.missing_payments(rental, kept.get(rental.id, []), from_date))
+                except ValueError:
+                    result['skipped'].append(rental.id)
+            if rows:
+                db.session.execute(db.insert(RentalPayment), rows)
+            db.session.commit()
+            result['rentals'] += len(rentals)
+            result['payments'] += len(rows)
+
+    @staticmethod
+    def post_payment(payment, user_id, removed=False):
+        """
+        Make the cashier reflect a payment: a rental_income transaction exists exactly while
+        the payment is paid, for its amount. Adjusts the cashier balance by the difference.
+
+        Args:
+            removed: The payment is being deleted; withdraw its posting
+        """
+        transaction = CashierTransaction.query.filter_by(
+            reference_id=payment.id, transaction_type='rental_income'
+        ).first()
+        previous_impact = CalculationService.calculate_cashier_impact(
+            'rental_income', float(transaction.amount)
+        ) if transaction else 0
+        paid = not removed and payment.status == PAYMENT_STATUS_PAID
+        new_impact = CalculationService.calculate_cashier_impact(
+            'rental_income', float(payment.amount)
+        ) if paid else 0
+
+        rental = payment.rental
+        if paid and transaction:
+            if float(transaction.amount) != float(payment.amount):
+                transaction.amount = payment.amount
+                transaction.transaction_date = datetime.utcnow()
+                transaction.notes = f"تحديث إيراد إيجار الوحدة {rental.unit.code} من {rental.tenant_name}"
+        elif paid:
+            db.session.add(CashierTransaction(
+                transaction_date=datetime.utcnow(),
+                amount=payment.amount,
+                transaction_type='rental_income',
+                reference_id=payment.id,
+                notes=f"إيراد إيجار الوحدة {rental.unit.code} من {rental.tenant_name}",
+                user_id=user_id
+            ))
+        elif transaction:
+            db.session.delete(transaction)
+
+        if removed:
+            LedgerService.remove('rental_payment', [payment.id])
+        else:
+            LedgerService.sync('rental_payment', [payment.id])
+        if new_impact != previous_impact:
+            CashierBalance.update_balance(CashierBalance.get_current_balance() - previous_impact + new_impact)
+
+    @staticmethod
+    def mark_overdue(as_of=None):
+        """
+        Flip due payments past their date (plus the RENT_GRACE_DAYS setting) to overdue
+
+        One set-based UPDATE over ix_rental_payments_status_date; does not commit.
+
+        Returns:
+            int: Number of payments marked overdue
+        """
+        as_of = as_of or date.today()
+        grace_days = int(FinancialSetting.get_value('RENT_GRACE_DAYS', 0) or 0)
+        result = db.session.execute(
+            db.update(RentalPayment)
+            .where(RentalPayment.status == PAYMENT_STATUS_DUE,
+                   RentalPayment.payment_date < as_of - timedelta(days=grace_days))
+            .values(status=PAYMENT_STATUS_OVERDUE)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+
+    @staticmethod
+    def refresh_arrears(rental_ids=None):
+        """
+        Rebuild the per-lease arrears summary from the overdue payments, for all leases or only
+        the given ones: one DELETE and one INSERT ... SELECT. Does not commit.
+        """
+        clear = db.delete(RentalArrears)
+        filters = [RentalPayment.status == PAYMENT_STATUS_OVERDUE]
+        if rental_ids is not None:
+            clear = clear.where(RentalArrears.rental_id.in_(rental_ids))
+            filters.append(RentalPayment.rental_id.in_(rental_ids))
+        db.session.execute(clear.execution_options(synchronize_session=False))
+
+        now = db.literal(datetime.utcnow(), db.DateTime)
+        summary = db.select(
+            RentalPayment.rental_id, Rental.tenant_name, Rental.unit_id,
+            db.func.count(RentalPayment.id), db.func.sum(RentalPayment.amount),
+            db.func.min(RentalPayment.payment_date), now, now
+        ).join(Rental, Rental.id == RentalPayment.rental_id).where(*filters).group_by(
+            RentalPayment.rental_id, Rental.tenant_name, Rental.unit_id
+        )
+        db.session.execute(db.insert(RentalArrears).from_select(
+            ['rental_id', 'tenant_name', 'unit_id', 'overdue_count', 'overdue_amount', 'oldest_due_date',
+             'created_at', 'updated_at'],
+            summary
+        ))
+
+    @staticmethod
+    def run_overdue_job(as_of=None):
+        """Scheduled job: mark overdue payments and rebuild the arrears summary in one transaction"""
+        marked = RentalService.mark_overdue(as_of)
+        RentalService.refresh_arrears()
+        db.session.commit()
+        return marked
+
+    @staticmethod
+    def aging(as_of=None, by_rental=False):
+        """
+        Unpaid amounts past due, summed per aging bucket in SQL
+
+        Bucket bounds are turned into payment_date comparisons, so the same query runs on MySQL
+        and SQLite and keeps using the (status, payment_date) index.
+
+        Args:
+            by_rental: One row per lease instead of a single total row
+        """
+        as_of = as_of or date.today()
+        columns = []
+        for key, first_day, last_day in AGING_BUCKETS:
+            conditions = [RentalPayment.payment_date <= as_of - timedelta(days=first_day)]
+            if last_day is not None:
+                conditions.append(RentalPayment.payment_date >= as_of - timedelta(days=last_day))
+            columns.append(db.func.coalesce(db.func.sum(
+                db.case((db.and_(*conditions), RentalPayment.amount), else_=0)
+            ), 0).label(key))
+        columns.append(db.func.coalesce(db.func.sum(RentalPayment.amount), 0).label('total'))
+        columns.append(db.func.count(RentalPayment.id).label('payment_count'))
+
+        group_columns = [RentalPayment.rental_id, Rental.tenant_name, Unit.code.label('unit_code')] if by_rental else []
+        statement = db.select(*group_columns, *columns).where(
+            RentalPayment.status.in_([PAYMENT_STATUS_DUE, PAYMENT_STATUS_OVERDUE]),
+            RentalPayment.payment_date < as_of
+        )
+        if by_rental:
+            statement = statement.join(Rental, Rental.id == RentalPayment.rental_id) \
+                .join(Unit, Unit.id == Rental.unit_id) \
+                .group_by(RentalPayment.rental_id, Rental.tenant_name, Unit.code) \
+                .order_by(db.desc('total'))
+
+        rows = []
+        for row in db.session.execute(statement).mappings():
+            item = {key: float(row[key]) for key, _, _ in AGING_BUCKETS}
+            item['total'] = float(row['total'])
+            item['payment_count'] = row['payment_count']
+            if by_rental:
+                item.update(rental_id=row['rental_id'], tenant_name=row['tenant_name'], unit_code=row['unit_code'])
+            rows.append(item)
+        return rows
@@ -0,0 +1,235 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+from src.models import (
+    db, Sale, SaleCalculationLine, SaleTaxLine, SalesPerformanceMonthly, Unit, CalculationRule, CashierBalance, CashierTransaction
+)
+from src.services.calculation_engine import CalculationEngine
+from src.services.calculation_service import CalculationService
+from src.services.fixed_point import to_piastres
+from src.services.commission_service import CommissionService
+from src.services.ledger_service import LedgerService
+from src.services.period_service import PeriodService
+
+REPRICE_CHUNK_SIZE = 500
+
+# Sale columns holding calculated totals (fees and discounts only live in the breakdown)
+SALE_TOTAL_COLUMNS = ['company_commission', 'salesperson_commission', 'sales_manager_commission',
+                      'total_taxes', 'net_company_revenue']
+
+def _participants(salesperson_id, sales_manager_id):
+    return [name for name, user_id in (('salesperson', salesperson_id),
+                                       ('sales_manager', sales_manager_id)) if user_id]
+
+def _screen_unchanged(plan, rows):
+    """Ids of the rows whose totals the plan leaves unchanged, computed in vectorized batches
+
+    Only fixed-point plans support batch totals; rows are grouped by unit type and participants
+    so each group is one NumPy pass. Groups the plan cannot batch are left for full evaluation.
+    """
+    groups = {}
+    for row in rows:
+        unit_type, salesperson_id, sales_manager_id = row[2:5]
+        groups.setdefault((unit_type, bool(salesperson_id), bool(sales_manager_id)), []).append(row)
+
+    unchanged = set()
+    for (unit_type, has_salesperson, has_sales_manager), group in groups.items():
+        participants = _participants(has_salesperson, has_sales_manager)
+        totals = plan.evaluate_totals_batch([row[1] for row in group], unit_type, participants)
+        if totals is None:
+            continue
+        for index, row in enumerate(group):
+            old_piastres = [to_piastres(value or 0) for value in row[5:]]
+            if all(int(totals[column][index]) == old for column, old in zip(SALE_TOTAL_COLUMNS, old_piastres)):
+                unchanged.add(row[0])
+    return unchanged
+
+def _reprice_chunk(plan, rows):
+    """Re-run the plan for one chunk of sale rows and return the sales whose totals change
+
+    Runs inside pool workers, so it only touches the picklable plan and plain row tuples.
+    """
+    unchanged = _screen_unchanged(plan, rows)
+    changes = []
+    for sale_id, sale_price, unit_type, salesperson_id, sales_manager_id, *old_values in rows:
+        if sale_id in unchanged:
+            continue
+        calculations = plan.evaluate(sale_price, unit_type, _participants(salesperson_id, sales_manager_id))
+        old_totals = {column: float(value or 0) for column, value in zip(SALE_TOTAL_COLUMNS, old_values)}
+        new_totals = {column: round(calculations['totals'][column], 2) for column in SALE_TOTAL_COLUMNS}
+        if any(abs(new_totals[column] - old_totals[column]) >= 0.005 for column in SALE_TOTAL_COLUMNS):
+            changes.append({
+                'sale_id': sale_id,
+                'unit_type': unit_type,
+                'old_totals': old_totals,
+                'new_totals': new_totals,
+                'net_delta': round(new_totals['net_company_revenue'] - old_totals['net_company_revenue'], 2),
+                # The cashier books sale revenue as abs(net), so the correction follows that, not the net
+                'cashier_delta': round(
+                    CalculationService.calculate_cashier_impact('sale_revenue', new_totals['net_company_revenue']) -
+                    CalculationService.calculate_cashier_impact('sale_revenue', old_totals['net_company_revenue']), 2
+                ),
+                'calculations': calculations
+            })
+    return changes
+
+class RepricingService:
+    """Recalculate existing sales against the current calculation rules"""
+
+    @staticmethod
+    def affected_sales_query(rule):
+        """SELECT of the sales a rule can apply to, by its applies_to and unit_type_filter;
+        sales in closed accounting periods keep their totals"""
+        statement = db.select(
+            Sale.id, Sale.sale_price, Unit.type, Sale.salesperson_id, Sale.sales_manager_id,
+            *[getattr(Sale, column) for column in SALE_TOTAL_COLUMNS]
+        ).join(Unit, Unit.id == Sale.unit_id)
+        closed_through = PeriodService.closed_through()
+        if closed_through:
+            statement = statement.where(Sale.sale_date > closed_through)
+        if rule.applies_to not in ('sales', 'all'):
+            return statement.where(db.false())
+        unit_types = rule.get_unit_type_filter()
+        if unit_types:
+            statement = statement.where(Unit.type.in_(unit_types))
+        return statement
+
+    @staticmethod
+    def iter_chunks(statement, chunk_size=REPRICE_CHUNK_SIZE):
+        """Stream the statement's rows in sale id order, one keyset page at a time"""
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                statement.where(Sale.id > last_id).order_by(Sale.id).limit(chunk_size)
+            ).all()
+            if not rows:
+                return
+            yield [tuple(row) for row in rows]
+            last_id = rows[-1][0]
+
+    @staticmethod
+    def apply_changes(changes, rule_set_id, user_id):
+        """Write one chunk of changes: sale totals, calculation and tax lines, compensating cashier
+        transactions, commission accruals and the cashier balance, committed together"""
+        if not changes:
+            return 0
+        sale_ids = [change['sale_id'] for change in changes]
+        db.session.execute(db.update(Sale), [
+            {'id': change['sale_id'], 'rule_set_id': rule_set_id, **change['new_totals']}
+            for change in changes
+        ])
+        db.session.execute(db.delete(SaleCalculationLine).where(SaleCalculationLine.sale_id.in_(sale_ids)))
+        lines = [
+            {'sale_id': change['sale_id'], 'line_index': line.line_index, 'rule_id': line.rule_id,
+             'base_amount': line.base_amount, 'amount': line.amount}
+            for change in changes
+            for line in SaleCalculationLine.from_breakdown(change['calculations'])
+        ]
+        if lines:
+            db.session.execute(db.insert(SaleCalculationLine), lines)
+        db.session.execute(db.delete(SaleTaxLine).where(SaleTaxLine.sale_id.in_(sale_ids)))
+        tax_lines = [
+            {'sale_id': change['sale_id'], **values}
+            for change in changes
+            for values in SaleTaxLine.values_from_breakdown(change['calculations'])
+        ]
+        if tax_lines:
+            db.session.execute(db.insert(SaleTaxLine), tax_lines)
+
+        now = datetime.utcnow()
+        adjustments = [
+            {'transaction_date': now, 'amount': change['cashier_delta'], 'transaction_type': 'sale_revenue_adjustment',
+             'reference_id': change['sale_id'], 'user_id': user_id,
+             'notes': f"تسوية إيراد البيع {change['sale_id']} بعد تعديل قواعد الحساب"}
+            for change in changes if change['cashier_delta']
+        ]
+        if adjustments:
+            db.session.execute(db.insert(CashierTransaction), adjustments)
+        CommissionService.sync_accruals(sale_ids)
+        RepricingService.record_performance(changes)
+        LedgerService.sync('sale', sale_ids)
+        balance_delta = sum(adjustment['amount'] for adjustment in adjustments)
+        # update_balance commits the whole chunk
+        CashierBalance.update_balance(CashierBalance.get_current_balance() + balance_delta)
+        return len(changes)
+
+    @staticmethod
+    def record_performance(changes):
+        """Move the commission totals of the leaderboard aggregate from old to new totals"""
+        changes_by_id = {change['sale_id']: change for change in changes}
+        before, after = {}, {}
+        for sale_id, sale_date, sale_price, salesperson_id, sales_manager_id in db.session.execute(
+            db.select(Sale.id, Sale.sale_date, Sale.sale_price, Sale.salesperson_id, Sale.sales_manager_id)
+            .where(Sale.id.in_(list(changes_by_id)))
+        ):
+            for totals, contributions in ((changes_by_id[sale_id]['old_totals'], before),
+                                          (changes_by_id[sale_id]['new_totals'], after)):
+                for key, value in SalesPerformanceMonthly.contributions(
+                    sale_date, sale_price, salesperson_id, totals['salesperson_commission'],
+                    sales_manager_id, totals['sales_manager_commission']
+                ).items():
+                    current = contributions.get(key, (0, 0, 0))
+                    contributions[key] = tuple(a + b for a, b in zip(current, value))
+        SalesPerformanceMonthly.record_change(before, after)
+
+    @staticmethod
+    def reprice(rule_id, apply=False, workers=1, user_id=None, chunk_size=REPRICE_CHUNK_SIZE):
+        """
+        Recalculate the sales affected by a rule with the current active rules
+
+        Args:
+            rule_id: The edited CalculationRule
+            apply: Write the new totals and compensating cashier transactions (dry run otherwise)
+            workers: Number of worker processes (1 computes in-process)
+            user_id: User recorded on the cashier transactions (required with apply)
+            chunk_size: Sales per chunk (one worker task and one commit per chunk)
+
+        Returns:
+            dict: Summary of the diff and the list of changed sales
+        """
+        rule = CalculationRule.query.get(rule_id)
+        if not rule:
+            raise ValueError("Calculation rule not found")
+        if apply and not user_id:
+            raise ValueError("user_id is required to apply changes")
+
+        plan = CalculationEngine.get_plan(snapshot_rules=apply)
+        if apply:
+            db.session.commit()
+        chunks = RepricingService.iter_chunks(RepricingService.affected_sales_query(rule), chunk_size)
+
+        report = {
+            'rule_id': rule_id,
+            'rule_set_id': plan.rule_set_id,
+            'applied': apply,
+            'sales_checked': 0,
+            'sales_changed': 0,
+            'total_deltas': dict.fromkeys(SALE_TOTAL_COLUMNS, 0.0),
+            'changes': []
+        }
+
+        def collect(chunk, changes):
+            report['sales_checked'] += len(chunk)
+            report['sales_changed'] += len(changes)
+            for change in changes:
+                for column in SALE_TOTAL_COLUMNS:
+                    report['total_deltas'][column] += change['new_totals'][column] - change['old_totals'][column]
+                report['changes'].append({key: value for key, value in change.items() if key != 'calculations'})
+            if apply:
+                RepricingService.apply_changes(changes, plan.rule_set_id, user_id)
+
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                # Keep only a window of chunks in flight so memory stays bounded
+                while True:
+                    window = list(islice(chunks, workers * 2))
+                    if not window:
+                        break
+                    for chunk, changes in zip(window, executor.map(_reprice_chunk, [plan] * len(window), window)):
+                        collect(chunk, changes)
+        else:
+            for chunk in chunks:
+                collect(chunk, _reprice_chunk(plan, chunk))
+
+        report['total_deltas'] = {column: round(delta, 2) for column, delta in report['total_deltas'].items()}
+        return report
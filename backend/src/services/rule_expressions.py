@@ -0,0 +1,183 @@
+import ast
+import operator
+
+# المتغيرات المتاحة دائماً في التعبيرات
+BUILTIN_NAMES = ('price', 'base')
+
+_BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+}
+
+_UNARY_OPERATORS = {
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+}
+
+_COMPARE_OPERATORS = {
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+}
+
+def _pct(amount, rate):
+    """rate% of amount"""
+    return amount * rate / 100
+
+def _tiers(amount, *bands):
+    """Marginal tiers: tiers(amount, limit1, rate1, limit2, rate2, ..., last_rate)
+
+    Each rate (in %) applies to the part of amount up to its limit; the last rate applies above
+    the last limit. tiers(price, 5000000, 2, 1.5) is 2% up to 5M, then 1.5%.
+    """
+    total = 0
+    lower = 0
+    for index in range(0, len(bands) - 1, 2):
+        limit, rate = bands[index], bands[index + 1]
+        if amount <= lower:
+            return total
+        total += (min(amount, limit) - lower) * rate / 100
+        lower = limit
+    if amount > lower:
+        total += (amount - lower) * bands[-1] / 100
+    return total
+
+def _clamp(value, low, high):
+    return max(low, min(value, high))
+
+FUNCTIONS = {
+    'min': (min, 2, None),
+    'max': (max, 2, None),
+    'abs': (abs, 1, 1),
+    'round': (round, 1, 2),
+    'pct': (_pct, 2, 2),
+    'clamp': (_clamp, 3, 3),
+    'tiers': (_tiers, 2, None),
+}
+
+class RuleExpressionError(ValueError):
+    """تعبير قاعدة غير صالح"""
+
+class CompiledExpression:
+    """تعبير مجمع إلى دالة واحدة تستقبل قاموس القيم (price و base ونتائج القواعد الأخرى)"""
+
+    def __init__(self, source, function, names):
+        self.source = source
+        self.function = function
+        self.names = frozenset(names)
+        # أكواد القواعد التي يعتمد عليها التعبير
+        self.references = frozenset(name for name in names if name not in BUILTIN_NAMES)
+
+    def __call__(self, values):
+        return self.function(values)
+
+def _compile_node(node, names):
+    """Turn one whitelisted AST node into a closure over the values dict"""
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        value = node.value
+        return lambda values: value
+
+    if isinstance(node, ast.Name):
+        name = node.id
+        names.add(name)
+        return lambda values: values.get(name, 0)
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+        op = _BINARY_OPERATORS[type(node.op)]
+        left = _compile_node(node.left, names)
+        right = _compile_node(node.right, names)
+        if op is operator.truediv:
+            # القسمة على صفر تعطي صفراً بدلاً من إيقاف الحساب
+            return lambda values: (lambda divisor: left(values) / divisor if divisor else 0)(right(values))
+        return lambda values: op(left(values), right(values))
+
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPERATORS:
+        op = _UNARY_OPERATORS[type(node.op)]
+        operand = _compile_node(node.operand, names)
+        return lambda values: op(operand(values))
+
+    if isinstance(node, ast.Compare) and len(node.ops) == 1 and type(node.ops[0]) in _COMPARE_OPERATORS:
+        op = _COMPARE_OPERATORS[type(node.ops[0])]
+        left = _compile_node(node.left, names)
+        right = _compile_node(node.comparators[0], names)
+        return lambda values: op(left(values), right(values))
+
+    if isinstance(node, ast.IfExp):
+        test = _compile_node(node.test, names)
+        body = _compile_node(node.body, names)
+        orelse = _compile_node(node.orelse, names)
+        return lambda values: body(values) if test(values) else orelse(values)
+
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+        if node.func.id not in FUNCTIONS:
+            raise RuleExpressionError(f"Unknown function: {node.func.id}")
+        function, min_args, max_args = FUNCTIONS[node.func.id]
+        if len(node.args) < min_args or (max_args is not None and len(node.args) > max_args):
+            raise RuleExpressionError(f"Wrong number of arguments for {node.func.id}")
+        arguments = [_compile_node(argument, names) for argument in node.args]
+        return lambda values: function(*[argument(values) for argument in arguments])
+
+    raise RuleExpressionError(f"Unsupported syntax: {ast.dump(node)[:60]}")
+
+def compile_expression(source):
+    """
+    تحليل وتجميع تعبير قاعدة مرة واحدة
+
+    يدعم الأرقام، + - * /، المقارنات، x if شرط else y، الدوال min و max و abs و round
+    و pct و clamp و tiers، والمتغيرات price و base وأكواد القواعد الأخرى.
+
+    Raises:
+        RuleExpressionError: عند وجود خطأ في الصياغة أو استخدام غير مسموح
+    """
+    if not source or not source.strip():
+        raise RuleExpressionError("Expression is empty")
+    try:
+        tree = ast.parse(source.strip(), mode='eval')
+    except SyntaxError as e:
+        raise RuleExpressionError(f"Invalid expression: {e.msg}")
+    names = set()
+    function = _compile_node(tree.body, names)
+    return CompiledExpression(source, function, names)
+
+def order_rules(rules, references):
+    """
+    ترتيب القواعد طوبولوجياً بحيث تحسب كل قاعدة بعد القواعد التي تعتمد عليها
+
+    Args:
+        rules: قائمة القواعد مرتبة حسب order_index
+        references: {فهرس القاعدة: مجموعة أكواد القواعد التي تعتمد عليها}
+
+    Raises:
+        RuleExpressionError: عند الإشارة إلى كود غير موجود أو وجود اعتماد دائري
+    """
+    index_by_code = {rule['code']: index for index, rule in enumerate(rules) if rule.get('code')}
+    dependencies = {}
+    for index, codes in references.items():
+        unknown = sorted(code for code in codes if code not in index_by_code)
+        if unknown:
+            raise RuleExpressionError(f"Unknown rule reference: {', '.join(unknown)}")
+        dependencies[index] = {index_by_code[code] for code in codes}
+
+    ordered = []
+    state = {}  # 1 = قيد الزيارة، 2 = تمت
+
+    def visit(index):
+        if state.get(index) == 2:
+            return
+        if state.get(index) == 1:
+            raise RuleExpressionError(f"Circular rule reference involving: {rules[index].get('code')}")
+        state[index] = 1
+        for dependency in sorted(dependencies.get(index, ())):
+            visit(dependency)
+        state[index] = 2
+        ordered.append(index)
+
+    # الحفاظ على order_index قدر الإمكان
+    for index in range(len(rules)):
+        visit(index)
+    return [rules[index] for index in ordered]
@@ -0,0 +1,72 @@
+import logging
+import os
+import threading
+from src.models import db
+
+logger = logging.getLogger(__name__)
+
+class Scheduler:
+    """
+    Minimal in-process scheduler: each job runs in its own daemon thread, every interval_seconds,
+    inside an application context.
+
+    Every gunicorn worker starts its own scheduler, so jobs must be idempotent; on MySQL a named
+    lock (GET_LOCK) additionally keeps a job from running in two workers at once.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.jobs = []
+        self._stop = threading.Event()
+
+    @staticmethod
+    def enabled(app):
+        """Off in tests and when SCHEDULER_ENABLED is false"""
+        if app.config.get('TESTING'):
+            return False
+        return os.getenv('SCHEDULER_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+
+    def add_job(self, name, func, interval_seconds, first_delay=60):
+        self.jobs.append((name, func, interval_seconds, first_delay))
+
+    def start(self):
+        for job in self.jobs:
+            threading.Thread(target=self._loop, args=job, name=f"scheduler-{job[0]}", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self, name, func, interval_seconds, first_delay):
+        delay = first_delay
+        while not self._stop.wait(delay):
+            self.run_job(name, func)
+            delay = interval_seconds
+
+    def run_job(self, name, func):
+        """Run one job now; errors are logged and rolled back so the next run starts clean"""
+        with self.app.app_context():
+            if db.engine.dialect.name not in ('mysql', 'mariadb'):
+                self._run(name, func)
+                return
+            # The named lock belongs to a connection, so it is held on one outside the session,
+            # whose connection goes back to the pool on every commit
+            with db.engine.connect() as lock_connection:
+                lock = {'name': f"job:{name}"}
+                if lock_connection.execute(db.text("SELECT GET_LOCK(:name, 0)"), lock).scalar() != 1:
+                    logger.info("Scheduled job %s is running elsewhere, skipped", name)
+                    return
+                try:
+                    self._run(name, func)
+                finally:
+                    lock_connection.execute(db.text("SELECT RELEASE_LOCK(:name)"), lock)
+
+    @staticmethod
+    def _run(name, func):
+        try:
+            result = func()
+            logger.info("Scheduled job %s done: %s", name, result)
+        except Exception:
+            db.session.rollback()
+            logger.exception("Scheduled job %s failed", name)
+        finally:
+            db.session.remove()
@@ -0,0 +1,124 @@
+import csv
+import io
+from decimal import Decimal
+from openpyxl import Workbook
+from src.models import db, Sale, SaleTaxLine
+from src.utils.db_utils import month_bucket
+
+TAX_REPORT_PERIODS = ('month', 'quarter', 'year')
+TAX_EXPORT_FORMATS = ('xlsx', 'csv')
+
+# أعمدة ملف الإقرار: (المفتاح، العنوان)
+EXPORT_COLUMNS = [
+    ('period', 'الفترة'),
+    ('rule_id', 'رقم القاعدة'),
+    ('rule_name_ar', 'الضريبة'),
+    ('rule_name_en', 'Tax'),
+    ('calculation_type', 'نوع الحساب'),
+    ('rate', 'النسبة / القيمة'),
+    ('sale_count', 'عدد المبيعات'),
+    ('taxable_amount', 'الوعاء الضريبي'),
+    ('tax_amount', 'قيمة الضريبة'),
+]
+
+def _period_key(month, period):
+    """'YYYY-MM' month folded into its reporting period: 'YYYY-MM', 'YYYY-Qn' or 'YYYY'"""
+    if period == 'month':
+        return month
+    year, month_number = month.split('-')
+    if period == 'quarter':
+        return f"{year}-Q{(int(month_number) - 1) // 3 + 1}"
+    return year
+
+class TaxReportService:
+    """Tax liability by tax rule and period, aggregated in SQL from the persisted sale tax lines"""
+
+    @staticmethod
+    def summary(start_date=None, end_date=None, period='quarter'):
+        """
+        Tax and taxable amounts per (period, tax rule, rate)
+
+        One grouped query by rule and month over the sales in range (ix_sales_sale_date joined to
+        ix_sale_tax_lines_sale); months are folded into quarters or years afterwards.
+
+        Returns:
+            dict: {'period', 'start_date', 'end_date', 'rows': [{'period', 'rule_id', 'rule_name_ar',
+                   'rule_name_en', 'calculation_type', 'rate', 'sale_count', 'taxable_amount',
+                   'tax_amount'}], 'period_totals': {period: tax amount}, 'rule_totals': [row without
+                   period], 'total_tax'}
+        """
+        month = month_bucket(Sale.sale_date)
+        rule_columns = (SaleTaxLine.rule_id, SaleTaxLine.rule_name_ar, SaleTaxLine.rule_name_en,
+                        SaleTaxLine.calculation_type, SaleTaxLine.rate)
+        statement = db.select(
+            month, *rule_columns, db.func.count(db.distinct(SaleTaxLine.sale_id)),
+            db.func.sum(SaleTaxLine.base_amount), db.func.sum(SaleTaxLine.amount)
+        ).join(Sale, Sale.id == SaleTaxLine.sale_id).group_by(month, *rule_columns)
+        if start_date:
+            statement = statement.where(Sale.sale_date >= start_date)
+        if end_date:
+            statement = statement.where(Sale.sale_date <= end_date)
+
+        rows = {}
+        for sale_month, rule_id, name_ar, name_en, calculation_type, rate, sale_count, taxable, tax in \
+                db.session.execute(statement):
+            key = (_period_key(sale_month, period), rule_id, name_ar, name_en, calculation_type, Decimal(str(rate)))
+            row = rows.setdefault(key, {'sale_count': 0, 'taxable_amount': Decimal(0), 'tax_amount': Decimal(0)})
+            row['sale_count'] += sale_count
+            row['taxable_amount'] += Decimal(str(taxable or 0))
+            row['tax_amount'] += Decimal(str(tax or 0))
+
+        def serialize(period_key, rule_key, row):
+            rule_id, name_ar, name_en, calculation_type, rate = rule_key
+            return {
+                'period': period_key, 'rule_id': rule_id, 'rule_name_ar': name_ar, 'rule_name_en': name_en,
+                'calculation_type': calculation_type, 'rate': float(rate), 'sale_count': row['sale_count'],
+                'taxable_amount': float(row['taxable_amount']), 'tax_amount': float(row['tax_amount']),
+            }
+
+        report_rows, period_totals, rule_totals = [], {}, {}
+        for key in sorted(rows, key=lambda key: (key[0], key[1] or 0, key[5])):
+            period_key, rule_key, row = key[0], key[1:], rows[key]
+            period_totals[period_key] = period_totals.get(period_key, Decimal(0)) + row['tax_amount']
+            rule_total = rule_totals.setdefault(
+                rule_key, {'sale_count': 0, 'taxable_amount': Decimal(0), 'tax_amount': Decimal(0)}
+            )
+            for column in rule_total:
+                rule_total[column] += row[column]
+            report_rows.append(serialize(period_key, rule_key, row))
+        return {
+            'period': period,
+            'start_date': start_date.isoformat() if start_date else None,
+            'end_date': end_date.isoformat() if end_date else None,
+            'rows': report_rows,
+            'period_totals': {key: float(total) for key, total in period_totals.items()},
+            # Per rule over the whole range; taxable amounts are not added across rules sharing a base
+            'rule_totals': [serialize(None, rule_key, total) for rule_key, total in sorted(
+                rule_totals.items(), key=lambda item: (item[0][0] or 0, item[0][4])
+            )],
+            'total_tax': float(sum(period_totals.values(), Decimal(0))),
+        }
+
+    @staticmethod
+    def export(report, file_format='xlsx'):
+        """The report rows, a total line per rule and the total tax as an .xlsx or UTF-8 (BOM) .csv
+        file in a BytesIO"""
+        lines = [[label for _, label in EXPORT_COLUMNS]]
+        lines += [[row[key] for key, _ in EXPORT_COLUMNS] for row in report['rows']]
+        lines += [[row[key] for key, _ in EXPORT_COLUMNS] for row in
+                  ({**total, 'period': 'الإجمالي'} for total in report['rule_totals'])]
+        lines.append(['إجمالي الضرائب'] + [None] * (len(EXPORT_COLUMNS) - 2) + [report['total_tax']])
+
+        buffer = io.BytesIO()
+        if file_format == 'csv':
+            text = io.TextIOWrapper(buffer, encoding='utf-8-sig', newline='')
+            csv.writer(text).writerows(lines)
+            text.detach()
+        else:
+            workbook = Workbook(write_only=True)
+            sheet = workbook.create_sheet('الإقرار الضريبي')
+            for line in lines:
+                sheet.append(line)
+            workbook.save(buffer)
+        buffer.seek(0)
+        return buffer
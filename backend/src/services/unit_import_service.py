@@ -0,0 +1,152 @@
+import csv
+import io
+from decimal import Decimal, InvalidOperation
+from openpyxl import load_workbook
+from src.models import db, Unit
+from src.models.units import UNIT_STATUS_AVAILABLE
+from src.utils.db_utils import upsert
+
+IMPORT_CHUNK_SIZE = 500
+IMPORT_MAX_ROWS = 20000
+
+# Accepted headers per unit column: the API field name or the Arabic label of the units export
+IMPORT_COLUMNS = {
+    'code': ('code', 'كود الوحدة'),
+    'type': ('type', 'نوع الوحدة'),
+    'price': ('price', 'السعر'),
+    'area_sqm': ('area_sqm', 'المساحة'),
+    'address': ('address', 'العنوان'),
+    'description_ar': ('description_ar', 'الوصف'),
+    'description_en': ('description_en',),
+    'status': ('status', 'الحالة'),
+}
+HEADER_ALIASES = {alias: name for name, aliases in IMPORT_COLUMNS.items() for alias in aliases}
+
+class UnitImportError(ValueError):
+    """The file as a whole cannot be imported (format, headers, size)"""
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+def _decimal(value):
+    """Decimal from a cell, or None; raises InvalidOperation for non-numbers"""
+    if _blank(value):
+        return None
+    return Decimal(str(value).strip().replace(',', ''))
+
+class UnitImportService:
+    """Bulk create/update of units from a spreadsheet, keyed by unit code"""
+
+    @staticmethod
+    def read_rows(stream, filename):
+        """
+        (row number, {column: value}) for the data rows of an .xlsx or .csv file
+
+        Raises:
+            UnitImportError: Unknown format, no code column or too many rows
+        """
+        extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+        if extension == 'xlsx':
+            sheet = load_workbook(stream, read_only=True, data_only=True).active
+            records = sheet.iter_rows(values_only=True)
+        elif extension == 'csv':
+            records = csv.reader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+        else:
+            raise UnitImportError("Unsupported file type, expected .xlsx or .csv")
+
+        header = next(records, None) or ()
+        columns = [HEADER_ALIASES.get(str(cell).strip()) if cell is not None else None for cell in header]
+        if 'code' not in columns:
+            raise UnitImportError("The file has no unit code column ('code' or 'كود الوحدة')")
+
+        rows = []
+        for number, record in enumerate(records, start=2):
+            values = {name: value for name, value in zip(columns, record) if name}
+            if all(_blank(value) for value in values.values()):
+                continue
+            rows.append((number, values))
+            if len(rows) > IMPORT_MAX_ROWS:
+                raise UnitImportError(f"Too many rows, at most {IMPORT_MAX_ROWS} units per import")
+        return rows
+
+    @staticmethod
+    def validate(values, existing):
+        """
+        Clean one row against the unit it updates (or None for a new unit)
+
+        Returns:
+            tuple: (unit column dict or None, [error messages])
+        """
+        errors = []
+        invalid = set()
+        unit = {}
+        for name in ('type', 'address', 'description_ar', 'description_en', 'status'):
+            value = values.get(name)
+            unit[name] = None if _blank(value) else str(value).strip()
+        for name in ('price', 'area_sqm'):
+            try:
+                unit[name] = _decimal(values.get(name))
+            except InvalidOperation:
+                unit[name] = None
+                invalid.add(name)
+                errors.append(f"{name} must be a number")
+                continue
+            if unit[name] is not None and unit[name] < 0:
+                errors.append(f"{name} must not be negative")
+
+        if existing is None:
+            for name in ('type', 'price'):
+                if unit[name] is None and name not in invalid:
+                    errors.append(f"{name} is required for a new unit")
+            unit['status'] = unit['status'] or UNIT_STATUS_AVAILABLE
+        else:
+            # Empty cells keep the current value
+            for name, value in unit.items():
+                if value is None:
+                    unit[name] = existing[name]
+        return (None if errors else unit), errors
+
+    @staticmethod
+    def import_rows(rows, dry_run=False):
+        """
+        Validate all rows in one pass, resolve existing codes with IN lookups and upsert the
+        valid rows in chunks of IMPORT_CHUNK_SIZE, in one transaction
+
+        Rows with errors are reported and skipped; the other rows are still imported.
+
+        Returns:
+            dict: {'summary': {'created', 'updated', 'failed'}, 'rows': [per-row results]}
+        """
+        codes = {str(values['code']).strip() for _, values in rows if not _blank(values.get('code'))}
+        existing = {}
+        code_list = list(codes)
+        for start in range(0, len(code_list), IMPORT_CHUNK_SIZE):
+            for unit in db.session.execute(
+                db.select(*Unit.__table__.columns).where(Unit.code.in_(code_list[start:start + IMPORT_CHUNK_SIZE]))
+            ).mappings():
+                existing[unit['code']] = unit
+
+        results, upserts, seen = [], [], set()
+        summary = {'created': 0, 'updated': 0, 'failed': 0}
+        for number, values in rows:
+            code = None if _blank(values.get('code')) else str(values['code']).strip()
+            if code is None:
+                unit, errors = None, ["code is required"]
+            elif code in seen:
+                unit, errors = None, [f"duplicate code {code} in the file"]
+            else:
+                seen.add(code)
+                unit, errors = UnitImportService.validate(values, existing.get(code))
+            if errors:
+                summary['failed'] += 1
+                results.append({'row': number, 'code': code, 'action': 'error', 'errors': errors})
+                continue
+            action = 'updated' if code in existing else 'created'
+            summary[action] += 1
+            results.append({'row': number, 'code': code, 'action': action})
+            upserts.append({'code': code, **unit})
+
+        if upserts and not dry_run:
+            upsert(Unit, ['code'], [name for name in IMPORT_COLUMNS if name != 'code'], upserts, chunk_size=IMPORT_CHUNK_SIZE)
+            db.session.commit()
+        return {'summary': summary, 'dry_run': dry_run, 'rows': results}
@@ -0,0 +1,125 @@
+import re
+from sqlalchemy.dialects import mysql
+from src.models import db, Unit
+from src.utils.serialization import ModelSerializer
+
+# FULLTEXT index over the searchable text columns, built WITH PARSER ngram by migration 0011 on MySQL
+FULLTEXT_INDEX_NAME = 'ft_units_search'
+FULLTEXT_COLUMNS = ('code', 'address', 'description_ar', 'description_en')
+
+# Shorter terms yield no ngram tokens (innodb ngram_token_size defaults to 2)
+NGRAM_TOKEN_SIZE = 2
+
+SEARCH_SORTS = {
+    'code': Unit.code.asc(),
+    'price': Unit.price.asc(),
+    '-price': Unit.price.desc(),
+    'area_sqm': Unit.area_sqm.asc(),
+    '-area_sqm': Unit.area_sqm.desc(),
+    'created_at': Unit.created_at.asc(),
+    '-created_at': Unit.created_at.desc(),
+}
+
+unit_serializer = ModelSerializer(Unit)
+
+# {engine url: whether the FULLTEXT index exists}; checked once per process
+_fulltext_available = {}
+
+def _search_terms(text):
+    """Words of the query, without the characters boolean-mode MATCH treats as operators"""
+    return [term for term in re.sub(r'[+\-<>()~*"@]', ' ', text).split() if term]
+
+class UnitSearchService:
+    """Filtered, full-text unit search with facet counts"""
+
+    @staticmethod
+    def fulltext_enabled():
+        engine = db.engine
+        key = str(engine.url)
+        if key not in _fulltext_available:
+            _fulltext_available[key] = engine.dialect.name in ('mysql', 'mariadb') and any(
+                index['name'] == FULLTEXT_INDEX_NAME for index in db.inspect(engine).get_indexes('units')
+            )
+        return _fulltext_available[key]
+
+    @staticmethod
+    def text_condition(text):
+        """
+        Condition matching every word of text in code/address/descriptions, with its relevance
+        score (None without FULLTEXT)
+
+        MATCH ... AGAINST in boolean mode when the ngram FULLTEXT index exists, each word as a
+        required phrase so Arabic words match without stemming; LIKE otherwise (SQLite, or
+        words shorter than an ngram token).
+
+        Returns:
+            tuple: (condition or None, score expression or None)
+        """
+        terms = _search_terms(text)
+        if not terms:
+            return None, None
+        if UnitSearchService.fulltext_enabled() and all(len(term) >= NGRAM_TOKEN_SIZE for term in terms):
+            match = mysql.match(*[getattr(Unit, name) for name in FULLTEXT_COLUMNS],
+                                against=" ".join(f'+"{term}"' for term in terms)).in_boolean_mode()
+            return match > 0, match
+        return db.and_(*[
+            db.or_(*[getattr(Unit, name).contains(term, autoescape=True) for name in FULLTEXT_COLUMNS])
+            for term in terms
+        ]), None
+
+    @staticmethod
+    def search(text=None, types=None, statuses=None, min_price=None, max_price=None,
+               min_area=None, max_area=None, sort=None, offset=0, limit=50):
+        """
+        One page of matching units, the total and the facet counts per type and status
+
+        Facets follow the faceted-navigation convention: the type counts apply every filter but
+        the type one, the status counts every filter but the status one. Both come from a single
+        GROUP BY type, status over the other filters.
+
+        Returns:
+            dict: {'total', 'items', 'facets': {'type': {...}, 'status': {...}}}
+        """
+        filters = []
+        if min_price is not None:
+            filters.append(Unit.price >= min_price)
+        if max_price is not None:
+            filters.append(Unit.price <= max_price)
+        if min_area is not None:
+            filters.append(Unit.area_sqm >= min_area)
+        if max_area is not None:
+            filters.append(Unit.area_sqm <= max_area)
+        condition, score = UnitSearchService.text_condition(text) if text else (None, None)
+        if condition is not None:
+            filters.append(condition)
+
+        facet_rows = db.session.execute(
+            db.select(Unit.type, Unit.status, db.func.count(Unit.id)).where(*filters).group_by(Unit.type, Unit.status)
+        ).all()
+        type_facets, status_facets, total = {}, {}, 0
+        for unit_type, status, count in facet_rows:
+            type_ok = not types or unit_type in types
+            status_ok = not statuses or status in statuses
+            if status_ok:
+                type_facets[unit_type] = type_facets.get(unit_type, 0) + count
+            if type_ok:
+                status_facets[status] = status_facets.get(status, 0) + count
+            if type_ok and status_ok:
+                total += count
+
+        if types:
+            filters.append(Unit.type.in_(types))
+        if statuses:
+            filters.append(Unit.status.in_(statuses))
+        if sort:
+            order_by = [SEARCH_SORTS[sort]]
+        elif score is not None:
+            order_by = [score.desc()]
+        else:
+            order_by = [SEARCH_SORTS['code']]
+        statement = unit_serializer.select().where(*filters).order_by(*order_by, Unit.id).offset(offset).limit(limit)
+        return {
+            'total': total,
+            'items': unit_serializer.fetch(statement),
+            'facets': {'type': type_facets, 'status': status_facets},
+        }
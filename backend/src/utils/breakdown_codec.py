@@ -0,0 +1,15 @@
+import zlib
+import orjson
+
+# Format marker and version byte for packed breakdowns
+PACKED_BREAKDOWN_MAGIC = b'CB1'
+
+def pack_breakdown(breakdown):
+    """Pack a calculation breakdown dict into compact bytes for archival"""
+    return PACKED_BREAKDOWN_MAGIC + zlib.compress(orjson.dumps(breakdown), 9)
+
+def unpack_breakdown(packed):
+    """Restore a breakdown dict packed by pack_breakdown"""
+    if not packed or not packed.startswith(PACKED_BREAKDOWN_MAGIC):
+        raise ValueError("Not a packed calculation breakdown")
+    return orjson.loads(zlib.decompress(packed[len(PACKED_BREAKDOWN_MAGIC):]))
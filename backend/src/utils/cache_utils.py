@@ -0,0 +1,32 @@
+import hashlib
+from functools import wraps
+from flask import request, make_response
+from src.models import TableVersion
+
+def conditional_get(*table_names):
+    """Decorator adding a weak ETag derived from table versions and answering 304 while they are unchanged
+
+    table_names must cover every table the response body reads from, including joined ones.
+    """
+    def wrapper(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            versions = TableVersion.get_versions(table_names)
+            if versions is None:
+                return fn(*args, **kwargs)
+
+            version_key = ",".join(f"{name}={versions[name]}" for name in sorted(versions))
+            etag = hashlib.sha1(version_key.encode()).hexdigest()[:20]
+
+            if request.if_none_match.contains_weak(etag):
+                response = make_response("", 304)
+            else:
+                response = make_response(fn(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
+        return decorator
+    return wrapper
@@ -0,0 +1,8 @@
+from calendar import monthrange
+from datetime import date
+
+def add_months(start, months):
+    """Same day of month, months later; clamped to the last day of shorter months"""
+    month_index = start.month - 1 + months
+    year, month = start.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(start.day, monthrange(year, month)[1]))
@@ -0,0 +1,84 @@
+from datetime import datetime
+from sqlalchemy.dialects import mysql, sqlite, postgresql
+from src.models import db, TableVersion
+
+def _upsert(model, key_columns, rows, updates):
+    """
+    Run one INSERT ... ON DUPLICATE KEY UPDATE (MySQL) or ON CONFLICT DO UPDATE (SQLite, PostgreSQL)
+    for all rows in the current session transaction
+
+    Args:
+        updates: Callable (table, inserted) -> {column name: update expression}, where inserted
+            refers to the row that failed to insert
+    """
+    table = model.__table__
+    now = datetime.utcnow()
+    rows = [{**row, 'created_at': now, 'updated_at': now} for row in rows]
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('mysql', 'mariadb'):
+        statement = mysql.insert(table)
+        statement = statement.on_duplicate_key_update(updated_at=now, **updates(table, statement.inserted))
+    elif dialect in ('sqlite', 'postgresql'):
+        statement = (sqlite if dialect == 'sqlite' else postgresql).insert(table)
+        statement = statement.on_conflict_do_update(index_elements=list(key_columns),
+                                                    set_={'updated_at': now, **updates(table, statement.excluded)})
+    else:
+        raise NotImplementedError(f"upsert does not support {dialect}")
+
+    db.session.execute(statement, rows)
+    # Core statements skip the ORM hooks that bump table versions
+    TableVersion.bump(table.name)
+
+def upsert_increment(model, key_columns, increment_columns, rows):
+    """
+    Insert rows, or add their increment columns onto the existing rows with the same key
+
+    One statement for all rows, executed in the current session transaction. key_columns must be
+    covered by a unique constraint.
+
+    Args:
+        model: Mapped model class (a BaseModel; created_at/updated_at are filled in)
+        key_columns: Names of the columns identifying a row
+        increment_columns: Names of the columns to add to
+        rows: List of dicts holding the key and increment columns
+    """
+    if not rows:
+        return
+    _upsert(model, key_columns, rows, lambda table, inserted: {
+        name: table.c[name] + inserted[name] for name in increment_columns
+    })
+
+def upsert(model, key_columns, update_columns, rows, chunk_size=500):
+    """
+    Insert rows, or overwrite update_columns of the existing rows with the same key
+
+    One statement per chunk of rows, executed in the current session transaction. key_columns
+    must be covered by a unique constraint and every row must carry the same columns.
+
+    Args:
+        model: Mapped model class (a BaseModel; created_at/updated_at are filled in)
+        key_columns: Names of the columns identifying a row
+        update_columns: Names of the columns taken from the new row on a duplicate key
+        rows: List of dicts holding the key and update columns
+    """
+    for start in range(0, len(rows), chunk_size):
+        _upsert(model, key_columns, rows[start:start + chunk_size], lambda table, inserted: {
+            name: inserted[name] for name in update_columns
+        })
+
+def month_bucket(column):
+    """
+    'YYYY-MM' of a date column, in the current database's dialect
+
+    Args:
+        column: Date or datetime column expression
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('mysql', 'mariadb'):
+        return db.func.date_format(column, '%Y-%m')
+    if dialect == 'sqlite':
+        return db.func.strftime('%Y-%m', column)
+    if dialect == 'postgresql':
+        return db.func.to_char(column, 'YYYY-MM')
+    raise NotImplementedError(f"month_bucket does not support {dialect}")
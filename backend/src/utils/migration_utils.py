@@ -0,0 +1,44 @@
+from alembic import op
+import sqlalchemy as sa
+
+def _inspector():
+    return sa.inspect(op.get_bind())
+
+def has_table(table_name):
+    """Check whether a table exists in the live database"""
+    return _inspector().has_table(table_name)
+
+def has_column(table_name, column_name):
+    """Check whether a column exists on a table"""
+    if not has_table(table_name):
+        return False
+    return any(column['name'] == column_name for column in _inspector().get_columns(table_name))
+
+def has_index(table_name, index_name):
+    """Check whether an index exists on a table"""
+    if not has_table(table_name):
+        return False
+    return any(index['name'] == index_name for index in _inspector().get_indexes(table_name))
+
+def create_index_if_missing(index_name, table_name, columns, **kwargs):
+    """Create an index unless create_all() or an earlier run already built it"""
+    if has_table(table_name) and not has_index(table_name, index_name):
+        op.create_index(index_name, table_name, columns, **kwargs)
+
+def drop_index_if_exists(index_name, table_name):
+    """Drop an index if it is present"""
+    if has_index(table_name, index_name):
+        op.drop_index(index_name, table_name=table_name)
+
+def add_column_if_missing(table_name, column):
+    """Add a column unless it already exists"""
+    if has_table(table_name) and not has_column(table_name, column.name):
+        # Batch mode lets SQLite add columns that carry a foreign key
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.add_column(column)
+
+def drop_column_if_exists(table_name, column_name):
+    """Drop a column if it is present"""
+    if has_column(table_name, column_name):
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.drop_column(column_name)
@@ -0,0 +1,71 @@
+from decimal import Decimal
+import orjson
+from flask import Response
+from src.models import db
+
+def _encode_default(value):
+    """orjson fallback for types it does not handle natively"""
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def _load_json_text(value, empty):
+    """Decode a JSON text column, falling back to an empty value like the model getters do"""
+    if not value:
+        return empty()
+    try:
+        return orjson.loads(value)
+    except orjson.JSONDecodeError:
+        return empty()
+
+def json_response(payload, status=200):
+    """Build a JSON response with orjson; Decimal values are encoded as floats"""
+    return Response(orjson.dumps(payload, default=_encode_default), status=status, mimetype="application/json")
+
+class ModelSerializer:
+    """Serializer compiled once per model for list endpoints
+
+    Selects the model's columns plus any extra (joined) columns as plain tuples and
+    turns each row into a dict with a single zip, instead of loading ORM objects and
+    calling to_dict() per row. Dates, datetimes and Decimals are encoded by orjson.
+    """
+
+    def __init__(self, model, extra_columns=None, joins=(), json_columns=None, exclude=()):
+        self.model = model
+        self.columns = [column for column in model.__table__.columns if column.name not in exclude]
+        self.extra_columns = extra_columns or {}
+        self.joins = joins
+        self.keys = tuple([column.name for column in self.columns] + list(self.extra_columns))
+        # {column name: factory for the empty value}, for TEXT columns holding JSON
+        self.json_columns = tuple((json_columns or {}).items())
+
+    def select(self):
+        """Base SELECT for the serializer; callers add their own filters and ordering"""
+        statement = db.select(
+            *self.columns,
+            *[expression.label(name) for name, expression in self.extra_columns.items()]
+        ).select_from(self.model)
+        for target, onclause in self.joins:
+            statement = statement.outerjoin(target, onclause)
+        return statement
+
+    def dump_rows(self, rows):
+        """Convert result tuples into JSON-ready dicts"""
+        keys = self.keys
+        json_columns = self.json_columns
+        items = []
+        for row in rows:
+            item = dict(zip(keys, row))
+            for key, empty in json_columns:
+                item[key] = _load_json_text(item[key], empty)
+            items.append(item)
+        return items
+
+    def fetch(self, statement=None):
+        """Execute the statement (default: select()) and return JSON-ready dicts"""
+        rows = db.session.execute(self.select() if statement is None else statement)
+        return self.dump_rows(rows)
+
+    def response(self, statement=None, status=200):
+        """Execute the statement and return the rows as a JSON array response"""
+        return json_response(self.fetch(statement), status)